@@ -0,0 +1,134 @@
+"""
+End-to-end benchmark of the FaaS client against the local stand-in server (benchmarks/faas_standin.py).
+
+Each job submits a project with run_models, polls its status with list_projects until it is ready and
+downloads it with download_zip. Jobs run in a thread pool, for every combination of concurrency level
+and data size. The script reports the throughput and the latency of each phase.
+
+Usage:
+    python benchmarks/bench_e2e.py --concurrency 1 4 16 --series 1 20 --rows 120 --jobs 32
+    python benchmarks/bench_e2e.py --latency 0.05 --error-rate 0.02 --download-bytes 5000000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from faas_standin import StandinServer  # noqa: E402
+from synthetic import synthetic_data_list, synthetic_model_spec  # noqa: E402
+
+
+def run_job(job: int, data_list: dict, download_dir: str, poll_interval: float) -> dict:
+    """
+    Submits, polls and downloads one project, returning the seconds spent in each phase or the error
+    """
+    from pyfaas4i.faas import download_zip, list_projects, run_models
+
+    timings = {}
+    try:
+        start = time.perf_counter()
+        project_id = run_models(data_list, "Data", "%Y-%m-%d", synthetic_model_spec(), f"bench_{job}",
+                                get_project_id=True, version_check=False)
+        timings["submit"] = time.perf_counter() - start
+        if project_id is None:
+            raise RuntimeError("The project was not created.")
+
+        start = time.perf_counter()
+        while list_projects(project_id, return_dict=True, version_check=False)[0]["status"] != "success":
+            time.sleep(poll_interval)
+        timings["poll"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        download_zip(project_id, download_dir, f"job_{job}", verbose=False, version_check=False)
+        timings["download"] = time.perf_counter() - start
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    timings["total"] = sum(timings.values())
+    return timings
+
+
+def percentiles(values: list) -> str:
+    if not values:
+        return f"{'-':>19}"
+    values = np.asarray(values) * 1000
+    return f"{np.percentile(values, 50):8.1f} / {np.percentile(values, 95):8.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--series", type=int, nargs="+", default=[1, 20], help="series per project")
+    parser.add_argument("--rows", type=int, default=120, help="rows of each series")
+    parser.add_argument("--jobs", type=int, default=32, help="projects per concurrency level and data size")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added by the server to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 503 response")
+    parser.add_argument("--download-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--polls-until-ready", type=int, default=2)
+    parser.add_argument("--poll-interval", type=float, default=0.01)
+    parser.add_argument("--json", help="path of a file where the results are saved")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pyfaas4i_e2e_") as temp_dir:
+        config_file = os.path.join(temp_dir, "config.json")
+        with open(config_file, "w") as file:
+            json.dump({"auths": {"4intelligence.auth0.com": {"access_token": "standin"}}}, file)
+
+        server = StandinServer(latency=args.latency, error_rate=args.error_rate,
+                               download_bytes=args.download_bytes, polls_until_ready=args.polls_until_ready)
+        os.environ.update(server.environment())
+        os.environ["PYFAAS4I_CONFIG_JSON"] = config_file
+
+        results = []
+        print(f"{'series':>6} {'workers':>7} {'jobs/s':>8} {'errors':>6} | p50 / p95 ms: "
+              f"{'submit':>19} {'poll':>19} {'download':>19} {'total':>19}")
+
+        with server:
+            for n_series in args.series:
+                data_list = synthetic_data_list(n_series, n_columns=5, n_periods=args.rows)
+                for workers in args.concurrency:
+                    start = time.perf_counter()
+                    # The client prints the status of every request, which is not part of the measurement
+                    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as pool:
+                        jobs = list(pool.map(
+                            lambda job: run_job(job, data_list, os.path.join(temp_dir, "downloads"), args.poll_interval),
+                            range(args.jobs),
+                        ))
+                    elapsed = time.perf_counter() - start
+
+                    done = [job for job in jobs if "error" not in job]
+                    row = {
+                        "series": n_series,
+                        "rows": args.rows,
+                        "workers": workers,
+                        "jobs_per_second": len(done) / elapsed,
+                        "errors": len(jobs) - len(done),
+                    }
+                    for phase in ["submit", "poll", "download", "total"]:
+                        values = [job[phase] for job in done]
+                        row[f"{phase}_p50_ms"] = float(np.percentile(values, 50) * 1000) if values else None
+                        row[f"{phase}_p95_ms"] = float(np.percentile(values, 95) * 1000) if values else None
+                    results.append(row)
+
+                    print(f"{n_series:>6} {workers:>7} {row['jobs_per_second']:>8.1f} {row['errors']:>6} | "
+                          + " ".join(percentiles([job[phase] for job in done])
+                                     for phase in ["submit", "poll", "download", "total"]))
+
+        print(f"Server requests: {server.requests}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
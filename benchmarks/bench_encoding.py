@@ -0,0 +1,90 @@
+"""
+Payload size and build time of the two numeric encodings of _build_call: the default one (dataframes rounded
+with round(decimals) and converted to records printed by json.dumps) and compact_numbers=True (shortest text
+at the given decimal places, written from the NumPy arrays).
+
+For each data size, the JSON payload, its gzip compression and the base64 body sent to the API are measured
+from the tracing counters of _build_call, and the time is the best of --repeat runs of _build_call with the
+network calls replaced by a canned response.
+
+Usage:
+    python benchmarks/bench_encoding.py
+    python benchmarks/bench_encoding.py --series 50 --columns 50 --periods 240 --decimals 4 --json encoding.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from synthetic import synthetic_data_list, synthetic_model_spec  # noqa: E402
+from pyfaas4i import tracing  # noqa: E402
+from pyfaas4i.faas import _modellingcalls  # noqa: E402
+from bench_micro import _CannedResponse  # noqa: E402
+
+
+def measure(data_list: dict, compact_numbers: bool, decimals: int, repeat: int) -> dict:
+    """
+    Best build time and payload sizes of _build_call with one of the encodings
+    """
+    model_spec = synthetic_model_spec()
+    times = []
+    counters = {}
+    with mock.patch.object(_modellingcalls, "_get_access_token", return_value="token"), \
+            mock.patch.object(_modellingcalls, "_send", return_value=_CannedResponse()):
+        for _ in range(repeat + 1):
+            spans = []
+            with tracing.capture(spans.append):
+                start = time.perf_counter()
+                _modellingcalls._build_call(data_list, "Data", "%Y-%m-%d", model_spec, "benchmark", {}, False,
+                                            False, "validate", None, None, compact_numbers=compact_numbers,
+                                            decimals=decimals)
+                times.append(time.perf_counter() - start)
+            for span in spans:
+                if span.name == "faas.serialize":
+                    counters["payload_bytes"] = span.attributes["bytes"]
+                if span.name == "faas.compress":
+                    counters["body_bytes"] = span.attributes["bytes_out"]
+
+    return {
+        "ms": round(min(times[1:]) * 1000, 3),
+        "payload_bytes": counters["payload_bytes"],
+        "body_bytes": counters["body_bytes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--periods", type=int, default=240)
+    parser.add_argument("--decimals", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="file where the results are saved")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    results = []
+    print(f"{'series':>8}{'encoding':>10}{'ms':>10}{'payload MB':>12}{'body MB':>10}{'time saved':>12}{'body saved':>12}")
+    for n_series in args.series:
+        data_list = synthetic_data_list(n_series, args.columns, args.periods)
+        default = measure(data_list, False, args.decimals, args.repeat)
+        compact = measure(data_list, True, args.decimals, args.repeat)
+        for name, result in [("json", default), ("compact", compact)]:
+            time_saved = 1 - result["ms"] / default["ms"]
+            body_saved = 1 - result["body_bytes"] / default["body_bytes"]
+            print(f"{n_series:>8}{name:>10}{result['ms']:>10.1f}{result['payload_bytes'] / 1e6:>12.3f}"
+                  f"{result['body_bytes'] / 1e6:>10.3f}{time_saved:>12.1%}{body_saved:>12.1%}")
+            results.append({"series": n_series, "encoding": name, **result})
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Import-time benchmark of the pyfaas4i entry points.
+
+Each entry point is imported in a fresh interpreter several times, and the median import time is
+reported with the heavy dependencies that were loaded by the import. The results are compared with
+the baselines stored in benchmarks/baselines/import_time.json, and the script exits with status 1
+when an entry point is slower than its baseline by more than the tolerance, or loads a heavy
+dependency its baseline did not load.
+
+Usage:
+    python benchmarks/bench_import.py                 # compare with the stored baselines
+    python benchmarks/bench_import.py --update        # store the current results as baselines
+    python benchmarks/bench_import.py --repeat 9 --tolerance 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "import_time.json")
+
+ENTRY_POINTS = [
+    "pyfaas4i",
+    "pyfaas4i.faas",
+    "pyfaas4i.forecastpack",
+    "pyfaas4i.ensemble",
+    "pyfaas4i.collection",
+    "pyfaas4i.reconciliation",
+    "pyfaas4i.serving",
+    "pyfaas4i.warehouse",
+    "pyfaas4i.explore",
+]
+
+HEAVY_MODULES = ["numpy", "pandas", "pyarrow", "requests", "unidecode", "scipy", "plotly"]
+
+# Imports the module in a fresh interpreter, printing the elapsed time and the heavy modules that were loaded
+SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int) -> dict:
+    """
+    Median import time (in milliseconds) of a module over several fresh interpreters
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    code = SNIPPET.format(module=module, heavy=HEAVY_MODULES)
+
+    times, loaded = [], set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"] * 1000)
+        loaded.update(result["loaded"])
+
+    return {"ms": round(statistics.median(times), 1), "loaded": sorted(loaded)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed slowdown relative to the baseline (0.5 is 50%%)")
+    parser.add_argument("--floor", type=float, default=20.0,
+                        help="absolute slack in milliseconds, so very fast imports do not fail on noise")
+    parser.add_argument("--update", action="store_true", help="store the results as the new baselines")
+    args = parser.parse_args()
+
+    results = {module: measure(module, args.repeat) for module in ENTRY_POINTS}
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as file:
+            baselines = json.load(file)
+
+    regressions = []
+    print(f"{'entry point':<26}{'ms':>9}{'baseline':>10}  heavy modules loaded")
+    for module, result in results.items():
+        baseline = baselines.get(module)
+        shown = f"{baseline['ms']:>10.1f}" if baseline else f"{'-':>10}"
+        print(f"{module:<26}{result['ms']:>9.1f}{shown}  {', '.join(result['loaded']) or '-'}")
+
+        if baseline is None:
+            continue
+        limit = baseline["ms"] * (1 + args.tolerance) + args.floor
+        if result["ms"] > limit:
+            regressions.append(f"{module}: {result['ms']:.1f} ms, limit {limit:.1f} ms")
+        new_modules = sorted(set(result["loaded"]) - set(baseline["loaded"]))
+        if new_modules:
+            regressions.append(f"{module}: now loads {', '.join(new_modules)}")
+
+    if args.update:
+        os.makedirs(os.path.dirname(BASELINES), exist_ok=True)
+        with open(BASELINES, "w") as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+        print(f"Baselines saved to {BASELINES}")
+        return
+
+    if regressions:
+        print("\nImport time regressions:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
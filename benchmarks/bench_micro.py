@@ -0,0 +1,238 @@
+"""
+Micro-benchmarks of the CPU-bound stages of the package, with stored baselines.
+
+Stages:
+    build_call        payload building of _build_call (network calls replaced by a canned response),
+                      with its phases reported as build_call:round, :clean_names, :to_dict, :serialize, :compress
+    build_call_compact  the same with compact_numbers=True (no round phase; see bench_encoding.py for the payload sizes)
+    check_model_spec  _check_model_spec, expanding lags 'all' to every column
+    from_json         forecast.readJSON of a forecastpack file
+    refresh           forecast._refresh (selection of the model shown by the forecast object)
+    describe          forecast.describe
+    compare_packs     explore.compare_packs over consecutive vintages
+    model_accuracy    explore.model_accuracy over consecutive vintages
+
+Each stage is run --repeat times after a warm-up and its best time is reported (the run least disturbed
+by other processes, as in timeit), together with its peak memory measured with tracemalloc in a separate
+run. The results are compared with the baselines of the chosen size in benchmarks/baselines/micro.json,
+and the script exits with status 1 when a stage is slower or uses more memory than its baseline by more
+than the thresholds. Time baselines depend on
+the machine, so they should be updated (--update) on the machine where the comparison runs.
+
+Usage:
+    python benchmarks/bench_micro.py --size small
+    python benchmarks/bench_micro.py --size medium --update
+    python benchmarks/bench_micro.py --size large --stages build_call from_json --time-threshold 0.5
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from synthetic import synthetic_data_list, synthetic_model_spec, synthetic_pack, synthetic_vintages, write_pack  # noqa: E402
+from pyfaas4i import tracing  # noqa: E402
+from pyfaas4i.explore import compare_packs, model_accuracy  # noqa: E402
+from pyfaas4i.faas import _modellingcalls  # noqa: E402
+from pyfaas4i.forecastpack import forecast  # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "micro.json")
+
+SIZES = {
+    "small": {"ys": 5, "columns": 20, "periods": 120, "models": 20, "history": 60, "vintages": 6, "spec_columns": 1000},
+    "medium": {"ys": 50, "columns": 50, "periods": 240, "models": 50, "history": 120, "vintages": 12, "spec_columns": 10000},
+    "large": {"ys": 200, "columns": 100, "periods": 240, "models": 100, "history": 240, "vintages": 24, "spec_columns": 50000},
+}
+
+BUILD_CALL_PHASES = ["faas.round", "faas.clean_names", "faas.to_dict", "faas.serialize", "faas.compress"]
+
+
+class _CannedResponse:
+    status_code = 200
+    text = '{"status": 200, "info": {}}'
+    content = text.encode("utf-8")
+
+
+def _build_call_stage(size: dict, temp_dir: str, compact_numbers: bool = False):
+    data_list = synthetic_data_list(size["ys"], size["columns"], size["periods"])
+    model_spec = synthetic_model_spec(lags=[1, 2, 3])
+
+    def run():
+        with mock.patch.object(_modellingcalls, "_get_access_token", return_value="token"), \
+                mock.patch.object(_modellingcalls, "_send", return_value=_CannedResponse()):
+            _modellingcalls._build_call(data_list, "Data", "%Y-%m-%d", model_spec, "benchmark", {},
+                                        False, False, "validate", None, None, compact_numbers=compact_numbers)
+    return run
+
+
+def _build_call_compact_stage(size: dict, temp_dir: str):
+    return _build_call_stage(size, temp_dir, compact_numbers=True)
+
+
+def _check_model_spec_stage(size: dict, temp_dir: str):
+    columns = [f"x_{i}" for i in range(size["spec_columns"])]
+    model_spec = synthetic_model_spec(lags=[1, 2, 3, 6, 12])
+    return lambda: _modellingcalls._check_model_spec(copy.deepcopy(model_spec), columns)
+
+
+def _pack_path(size: dict, temp_dir: str) -> str:
+    path = os.path.join(temp_dir, "pack.json")
+    if not os.path.exists(path):
+        write_pack(path, synthetic_pack(size["models"], size["history"]))
+    return path
+
+
+def _from_json_stage(size: dict, temp_dir: str):
+    path = _pack_path(size, temp_dir)
+    return lambda: forecast.readJSON(path)
+
+
+def _refresh_stage(size: dict, temp_dir: str):
+    pack = forecast.readJSON(_pack_path(size, temp_dir))
+    return lambda: pack._refresh(simplify=True)
+
+
+def _describe_stage(size: dict, temp_dir: str):
+    pack = forecast.readJSON(_pack_path(size, temp_dir))
+    return pack.describe
+
+
+def _vintages(size: dict) -> list:
+    packs = []
+    for raw in synthetic_vintages(size["vintages"], size["models"], size["history"]):
+        pack = forecast()
+        pack.json = raw
+        pack._refresh()
+        packs.append(pack)
+    return packs
+
+
+def _compare_packs_stage(size: dict, temp_dir: str):
+    packs = _vintages(size)
+    return lambda: compare_packs(packs)
+
+
+def _model_accuracy_stage(size: dict, temp_dir: str):
+    packs = _vintages(size)
+    n_steps, _ = packs[-1].steps_and_windows()
+    return lambda: model_accuracy(packs, n_steps=n_steps)
+
+
+STAGES = {
+    "build_call": _build_call_stage,
+    "build_call_compact": _build_call_compact_stage,
+    "check_model_spec": _check_model_spec_stage,
+    "from_json": _from_json_stage,
+    "refresh": _refresh_stage,
+    "describe": _describe_stage,
+    "compare_packs": _compare_packs_stage,
+    "model_accuracy": _model_accuracy_stage,
+}
+
+
+def measure(run, repeat: int) -> dict:
+    """
+    Best time of several runs, the best time of each traced phase and the peak memory of one run
+    """
+    run()
+
+    spans = []
+    times = []
+    with tracing.capture(spans.append):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    phases = {}
+    for span in spans:
+        if span.name in BUILD_CALL_PHASES:
+            phases.setdefault(span.name.split(".", 1)[1], []).append(span.duration)
+
+    return {
+        "ms": round(min(times) * 1000, 3),
+        "peak_mb": round(peak / 2 ** 20, 3),
+        "phases": {name: round(min(values) * 1000, 3) for name, values in phases.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--time-threshold", type=float, default=0.3,
+                        help="allowed slowdown relative to the baseline (0.3 is 30%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.2,
+                        help="allowed increase of the peak memory relative to the baseline")
+    parser.add_argument("--floor-ms", type=float, default=2.0, help="absolute slack in milliseconds")
+    parser.add_argument("--floor-mb", type=float, default=1.0, help="absolute slack in MB")
+    parser.add_argument("--update", action="store_true", help="store the results as the baselines of the size")
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    size = SIZES[args.size]
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as file:
+            baselines = json.load(file)
+    size_baselines = baselines.get(args.size, {})
+
+    results = {}
+    regressions = []
+    print(f"size={args.size} {size}")
+    print(f"{'stage':<26}{'ms':>10}{'baseline':>10}{'peak MB':>10}{'baseline':>10}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in args.stages:
+            result = measure(STAGES[name](size, temp_dir), args.repeat)
+            results[name] = result
+            baseline = size_baselines.get(name)
+
+            shown_ms = f"{baseline['ms']:>10.2f}" if baseline else f"{'-':>10}"
+            shown_mb = f"{baseline['peak_mb']:>10.2f}" if baseline else f"{'-':>10}"
+            print(f"{name:<26}{result['ms']:>10.2f}{shown_ms}{result['peak_mb']:>10.2f}{shown_mb}")
+            for phase, ms in result["phases"].items():
+                base_phase = baseline.get("phases", {}).get(phase) if baseline else None
+                shown = f"{base_phase:>10.2f}" if base_phase is not None else f"{'-':>10}"
+                print(f"  {name}:{phase:<{22 - len(name)}}{ms:>10.2f}{shown}")
+
+            if baseline is None:
+                continue
+            time_limit = baseline["ms"] * (1 + args.time_threshold) + args.floor_ms
+            if result["ms"] > time_limit:
+                regressions.append(f"{name}: {result['ms']:.2f} ms, limit {time_limit:.2f} ms")
+            memory_limit = baseline["peak_mb"] * (1 + args.memory_threshold) + args.floor_mb
+            if result["peak_mb"] > memory_limit:
+                regressions.append(f"{name}: {result['peak_mb']:.2f} MB peak, limit {memory_limit:.2f} MB")
+
+    if args.update:
+        baselines[args.size] = {**size_baselines, **results}
+        os.makedirs(os.path.dirname(BASELINES), exist_ok=True)
+        with open(BASELINES, "w") as file:
+            json.dump(baselines, file, indent=2)
+            file.write("\n")
+        print(f"Baselines of size {args.size} saved to {BASELINES}")
+        return
+
+    if regressions:
+        print("\nRegressions:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Load test of pyfaas4i.serving.ForecastServer.
+
+Builds synthetic forecastpacks in memory, then measures the latency of ForecastServer.query() and the
+latency and throughput of the HTTP API with several concurrent keep-alive clients.
+
+Usage:
+    python benchmarks/bench_serving.py --series 200 --models 50 --requests 20000 --clients 8
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from pyfaas4i.serving import ForecastServer  # noqa: E402
+from synthetic import synthetic_pack  # noqa: E402
+
+
+def percentiles(latencies: list) -> str:
+    values = np.asarray(latencies) * 1e6
+    return f"p50 {np.percentile(values, 50):8.1f} us | p99 {np.percentile(values, 99):8.1f} us"
+
+
+def bench_query(server: ForecastServer, requests: list) -> None:
+    latencies = []
+    for series, model in requests:
+        start = time.perf_counter()
+        server.query(series, model=model)
+        latencies.append(time.perf_counter() - start)
+    print(f"query()         {percentiles(latencies)}")
+
+
+def bench_http(server: ForecastServer, requests: list, clients: int) -> None:
+    httpd = server.start(port=0)
+    host, port = httpd.server_address[:2]
+    shards = [requests[i::clients] for i in range(clients)]
+    latencies = [[] for _ in range(clients)]
+
+    def client(i):
+        connection = http.client.HTTPConnection(host, port)
+        for series, model in shards[i]:
+            path = f"/forecast?series={series}" + (f"&model={model}" if model is not None else "")
+            start = time.perf_counter()
+            connection.request("GET", path)
+            response = connection.getresponse()
+            json.loads(response.read())
+            latencies[i].append(time.perf_counter() - start)
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    httpd.shutdown()
+    httpd.server_close()
+
+    print(f"HTTP ({clients} clients) {percentiles([x for shard in latencies for x in shard])} | "
+          f"{len(requests) / elapsed:,.0f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=200)
+    parser.add_argument("--models", type=int, default=50)
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    packs = {f"series_{i}": synthetic_pack(args.models, 60, args.horizon, seed=i) for i in range(args.series)}
+
+    start = time.perf_counter()
+    server = ForecastServer(packs)
+    print(f"Preloaded {args.series} series x {args.models} models in {time.perf_counter() - start:.2f}s")
+
+    rng = np.random.default_rng(0)
+    series = rng.integers(0, args.series, args.requests)
+    models = rng.integers(-1, args.models, args.requests)
+    requests = [(f"series_{s}", None if m < 0 else int(m)) for s, m in zip(series, models)]
+
+    bench_query(server, requests)
+    bench_http(server, requests, args.clients)
+
+
+if __name__ == "__main__":
+    main()
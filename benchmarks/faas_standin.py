@@ -0,0 +1,273 @@
+"""
+Local stand-in for the FaaS and auth0 APIs, used to benchmark and test the client without the production endpoints.
+
+Implements the routes used by pyfaas4i.faas:
+
+- POST /api/v1/validate: validates the request body (decoding it, so the server pays the same parsing cost)
+- POST /api/v1/projects: creates a project and returns its id
+- GET  /api/v1/projects and /api/v1/projects/<id>: project records and status. A project is reported as
+  'processing' for the first `polls_until_ready` status requests, then as 'success'
+- GET  /api/v1/projects/<id>/download: a zip file with a small forecastpack and a stored file of `download_bytes`
+  incompressible bytes
+- POST /oauth/device/code and /oauth/token: device code and tokens of the auth0 login flow
+
+Latency, error rate and download size are configurable. The client is pointed at the server with the
+environment variables returned by StandinServer.environment().
+
+Usage:
+    python benchmarks/faas_standin.py --port 8080 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import base64
+import gzip
+import http.server
+import io
+import json
+import random
+import threading
+import time
+import uuid
+import zipfile
+from urllib.parse import parse_qs, urlparse
+
+from synthetic import synthetic_pack
+
+
+class StandinServer:
+    """
+    Stand-in FaaS server running in a background thread
+
+    Args:
+        host: address to listen on (Default is '127.0.0.1')
+        port: port to listen on, 0 to choose a free port (Default is 0)
+        latency: seconds added to every response, or a dictionary of seconds per route
+                 ('validate', 'projects', 'status', 'download', 'auth')
+        error_rate: probability of answering any request with a 503 error
+        download_bytes: size of the incompressible file of the zip file returned by the download route
+        polls_until_ready: number of status requests answered with 'processing' before a project is ready
+        seed: seed of the random errors
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency=0.0, error_rate: float = 0.0,
+                 download_bytes: int = 1024 * 1024, polls_until_ready: int = 0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.download_bytes = download_bytes
+        self.polls_until_ready = polls_until_ready
+        self.projects = {}
+        self.requests = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._payload = None
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _StandinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self) -> dict:
+        """
+        Environment variables pointing the client at the stand-in server
+        """
+        return {
+            "PYFAAS4I_MODELLING_URL": f"{self.url}/api/v1",
+            "PYFAAS4I_VALIDATION_URL": f"{self.url}/api/v1",
+            "PYFAAS4I_AUTH_URL": self.url,
+        }
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def delay(self, route: str):
+        seconds = self.latency.get(route, 0.0) if isinstance(self.latency, dict) else self.latency
+        if seconds:
+            time.sleep(seconds)
+
+    def fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def count(self, route: str):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def payload(self) -> bytes:
+        """
+        Zip file of the download route: a forecastpack, so the download can be extracted and read like
+        the one of the API, and a stored file of download_bytes incompressible bytes, so the download size
+        is not changed by any compression
+        """
+        if self._payload is None or self._payload[0] != self.download_bytes:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as archive:
+                archive.writestr("fs_standin/forecastpack_fs_standin.json", json.dumps(synthetic_pack(5, 60)),
+                                 compress_type=zipfile.ZIP_DEFLATED)
+                archive.writestr("fs_standin/filler.bin", random.Random(1).randbytes(self.download_bytes),
+                                 compress_type=zipfile.ZIP_STORED)
+            self._payload = (self.download_bytes, buffer.getvalue())
+        return self._payload[1]
+
+
+def _decode_body(body: str) -> dict:
+    """
+    Decodes the base64 and gzip encoded request body sent by the client
+    """
+    return json.loads(gzip.decompress(base64.b64decode(body)))
+
+
+class _StandinHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _send(self, status: int, payload=None, body: bytes = None, content_type: str = "application/json"):
+        if body is None:
+            body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length).decode("utf-8")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(raw) if raw else {}
+        return {key: values[-1] for key, values in parse_qs(raw).items()}
+
+    def _route(self, method: str):
+        standin = self.server.standin
+        path = urlparse(self.path).path.rstrip("/")
+        parts = path.split("/")
+
+        if path == "/oauth/device/code":
+            route = "auth"
+        elif path == "/oauth/token":
+            route = "auth"
+        elif path == "/api/v1/validate":
+            route = "validate"
+        elif path == "/api/v1/projects":
+            route = "projects" if method == "POST" else "status"
+        elif path.startswith("/api/v1/projects/") and parts[-1] == "download":
+            route = "download"
+        elif path.startswith("/api/v1/projects/"):
+            route = "status"
+        else:
+            return self._send(404, {"error": f"Unknown endpoint: {path}."})
+
+        body = self._read_body() if method == "POST" else {}
+        standin.count(route)
+        standin.delay(route)
+
+        if standin.fail():
+            return self._send(503, {"status": 503, "info": "Service Unavailable"})
+
+        if path == "/oauth/device/code":
+            return self._send(200, {
+                "device_code": uuid.uuid4().hex,
+                "verification_uri_complete": f"{standin.url}/activate",
+                "expires_in": 900,
+            })
+
+        if path == "/oauth/token":
+            return self._send(200, {
+                "access_token": uuid.uuid4().hex,
+                "refresh_token": uuid.uuid4().hex,
+                "token_type": "Bearer",
+                "expires_in": 86400,
+            })
+
+        if route == "validate":
+            request = _decode_body(body["body"])
+            return self._send(200, {"status": 200, "info": {"n_series": len(request["data_list"])}})
+
+        if route == "projects":
+            request = _decode_body(body["body"])
+            project_id = uuid.uuid4().hex
+            with standin._lock:
+                standin.projects[project_id] = {
+                    "id": project_id,
+                    "name": request["project_id"][0],
+                    "n_series": len(request["data_list"]),
+                    "polls": 0,
+                }
+            return self._send(200, {"status": "created", "id": project_id})
+
+        if route == "status":
+            if path == "/api/v1/projects":
+                records = [self._record(project) for project in list(standin.projects.values())]
+                return self._send(200, {"records": records})
+
+            project = standin.projects.get(parts[-1])
+            if project is None:
+                return self._send(404, {"status": "not_found"})
+            with standin._lock:
+                project["polls"] += 1
+            return self._send(200, self._record(project))
+
+        project = standin.projects.get(parts[-2])
+        if project is None:
+            return self._send(404, {"status": "not_found"})
+        return self._send(200, body=standin.payload(), content_type="application/zip")
+
+    def _record(self, project: dict) -> dict:
+        ready = project["polls"] > self.server.standin.polls_until_ready
+        return {
+            "id": project["id"],
+            "name": project["name"],
+            "n_series": project["n_series"],
+            "status": "success" if ready else "processing",
+        }
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 503 response")
+    parser.add_argument("--download-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--polls-until-ready", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandinServer(args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+                           download_bytes=args.download_bytes, polls_until_ready=args.polls_until_ready)
+    print(f"Stand-in FaaS server on {server.url}. Point the client at it with:")
+    for name, value in server.environment().items():
+        print(f"  export {name}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Synthetic data generators for the benchmarks: data_lists sent to the FaaS API and forecastpacks.
+
+The generated objects follow the structure of real ones (accented column names, missing values,
+all the fields of each model of a forecastpack, consecutive vintages of the same series), so the
+benchmarks exercise the same code paths as customer jobs. Every generator is deterministic given
+its seed.
+"""
+import json
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+MODEL_TYPES = ["ARIMA", "RandomForest", "Lasso", "comb_3", "ETS"]
+METRICS = ["RMSE", "MPE", "MAPE", "WMAPE", "MASE", "MASEs"]
+
+# Names with accents and special characters, as found in customer data, so name cleaning has work to do
+_NAME_STEMS = ["Produção", "Preço médio", "Índice (IPCA)", "Câmbio R$/US$", "Exportações-total", "Temperatura.máx"]
+
+
+def synthetic_data_list(
+    n_ys: int = 1,
+    n_columns: int = 10,
+    n_periods: int = 120,
+    missing: float = 0.02,
+    start: str = "2010-01-01",
+    seed: int = 0,
+) -> Dict[str, pd.DataFrame]:
+    """
+    data_list with n_ys monthly dataframes, each with a date column, its target and n_columns regressors
+
+    Args:
+        n_ys: number of dataframes (response variables)
+        n_columns: number of regressors of each dataframe
+        n_periods: number of rows (months) of each dataframe
+        missing: share of the regressor values replaced by NaN
+        start: first date
+        seed: seed of the random values
+    Returns:
+        data_list: dictionary of the target names and their dataframes
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_periods, freq="MS").strftime("%Y-%m-%d")
+    regressors = [f"{_NAME_STEMS[j % len(_NAME_STEMS)]} {j}" for j in range(n_columns)]
+
+    data_list = {}
+    for i in range(n_ys):
+        target = f"fs_{_NAME_STEMS[i % len(_NAME_STEMS)]}_{i}"
+        values = 100 + np.cumsum(rng.normal(0.2, 1.5, (n_periods, n_columns + 1)), axis=0)
+        values[:, 1:][rng.random((n_periods, n_columns)) < missing] = np.nan
+
+        frame = pd.DataFrame(values, columns=[target] + regressors)
+        frame.insert(0, "Data", dates)
+        data_list[target] = frame
+
+    return data_list
+
+
+def synthetic_model_spec(n_steps: int = 12, n_windows: int = 6, lags: List[int] = None) -> dict:
+    """
+    model_spec with the usual options. If lags are given, they are expanded to every column with 'all'.
+    """
+    model_spec = {"n_steps": n_steps, "n_windows": n_windows, "log": True, "seas.d": True}
+    if lags:
+        model_spec["lags"] = {"all": list(lags)}
+    return model_spec
+
+
+def _model_details(model_type: str, regressors: List[str]):
+    if model_type == "ARIMA":
+        return {"coef": [{"term": name, "estimate": 0.1} for name in regressors]}
+    if model_type == "Lasso":
+        return {
+            "bestTune": [{"alpha": 1, "lambda": 0.01}],
+            "coef": [{name: 0.1 for name in regressors}],
+            "varImp": [{name: 1.0 for name in regressors}],
+        }
+    if model_type == "RandomForest":
+        return [{name: 1.0 for name in regressors}]
+    return []
+
+
+def synthetic_pack(
+    n_models: int = 20,
+    n_history: int = 60,
+    horizon: int = 12,
+    n_windows: int = 6,
+    n_regressors: int = 3,
+    start: str = "2015-01-01",
+    seed: int = 0,
+    history: np.ndarray = None,
+) -> list:
+    """
+    Raw forecastpack (list of models) with all the fields written by the FaaS API
+
+    Args:
+        n_models: number of models
+        n_history: number of historical (in-sample) periods
+        horizon: number of forecast (out-of-sample) periods
+        n_windows: number of cross-validation windows of the metric lists
+        n_regressors: number of regressors in the data of each model
+        start: first date of the history
+        seed: seed of the random values
+        history: values of the series (at least n_history), a random walk is generated if None
+    Returns:
+        pack: list of model dictionaries
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_history + horizon, freq="MS").strftime("%Y-%m-%d").tolist()
+    if history is None:
+        history = 100 + np.cumsum(rng.normal(1, 2, n_history))
+    history = np.asarray(history[:n_history], dtype=float)
+    regressors = [f"x{j}" for j in range(n_regressors)]
+
+    pack = []
+    for m in range(n_models):
+        model_type = MODEL_TYPES[m % len(MODEL_TYPES)]
+        path = history[-1] + np.cumsum(rng.normal(1, 3, horizon))
+
+        model = {"type": model_type, "sample": "full", "transformation": "level"}
+        for metric in METRICS:
+            windows = rng.random(n_windows) * (10 if metric == "RMSE" else 1)
+            if metric == "MPE":
+                windows = windows - 0.5
+            model[metric] = float(windows.mean())
+            model[f"{metric}_list"] = windows.round(6).tolist()
+
+        model["models"] = _model_details(model_type, regressors)
+        model["infos"] = {"n_steps": [horizon], "n_windows": [n_windows], "freq": ["month"]}
+        model["data"] = [
+            {"data_tidy": d, "y": float(v), **{name: float(rng.normal()) for name in regressors}}
+            for d, v in zip(dates[:n_history], history)
+        ]
+        model["data_proj"] = [
+            {"data_tidy": d, **{name: float(rng.normal()) for name in regressors}} for d in dates[n_history:]
+        ]
+        model["forecast"] = [
+            {"data_tidy": d, "y_all": float(v), "type": "in_sample"} for d, v in zip(dates, history)
+        ] + [
+            {"data_tidy": d, "y_all": float(v), "y_lo": float(v - 5), "y_hi": float(v + 5), "type": "out_sample"}
+            for d, v in zip(dates[n_history:], path)
+        ]
+        pack.append(model)
+
+    return pack
+
+
+def synthetic_vintages(
+    n_vintages: int = 6,
+    n_models: int = 20,
+    n_history: int = 60,
+    horizon: int = 12,
+    seed: int = 0,
+    **kwargs,
+) -> List[list]:
+    """
+    Consecutive monthly vintages of the same series: each vintage has one more month of history, so
+    later vintages hold the actual values of the forecasts of earlier ones (as needed by model_accuracy)
+    """
+    rng = np.random.default_rng(seed)
+    series = 100 + np.cumsum(rng.normal(1, 2, n_history + n_vintages))
+    return [
+        synthetic_pack(n_models, n_history + v, horizon, seed=seed + v + 1, history=series, **kwargs)
+        for v in range(n_vintages)
+    ]
+
+
+def write_pack(path: str, pack: list):
+    """
+    Saves a raw forecastpack as a json file, as returned by the FaaS API
+    """
+    with open(path, "w") as file:
+        json.dump(pack, file)
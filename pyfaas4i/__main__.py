@@ -0,0 +1,3 @@
+from pyfaas4i.cli import main
+
+main()
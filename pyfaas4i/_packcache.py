@@ -0,0 +1,367 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import warnings
+from functools import lru_cache
+from typing import Callable, List, Union
+
+from pyfaas4i import tracing
+from pyfaas4i._checkimports import _LazyImport, try_import
+
+# Arrow is only imported when the cache is used
+pa = _LazyImport("pyarrow")
+ipc = _LazyImport("pyarrow.ipc")
+
+
+@lru_cache(maxsize=None)
+def _arrow_imports():
+    """
+    Checks import availability of the Arrow components used by the cache, on the first use of the cache
+    """
+    with try_import() as imports:
+        import pyarrow  # noqa: F401
+        import pyarrow.ipc  # noqa: F401
+    return imports
+
+
+_CACHE_VERSION = 1
+_TABLE_FIELDS = ("forecast", "data", "data_proj")
+# Files of a cache entry (metadata, tables and their temporary files) start with its key
+_ENTRY_FILE = re.compile(r"^[0-9a-f]{32}\.(json|[a-z_]+\.arrow|[^.]+\.tmp)$")
+
+
+class _ArrowSlice:
+    """
+    Reference to the rows and columns of a single model inside a cached Arrow table.
+
+    The underlying table is memory-mapped, so the slice does not hold a private copy
+    of the data until it is converted with to_pandas() or to_records(). When pickled
+    (e.g. returned from a worker process) only the reference is sent, and the receiving
+    process maps the same cache file.
+    """
+
+    __slots__ = ("source", "table", "offset", "length", "columns")
+
+    def __init__(self, source: str, offset: int, length: int, columns: List[str]):
+        self.source = source
+        self.table = _open_table(source)
+        self.offset = offset
+        self.length = length
+        self.columns = columns
+
+    def __reduce__(self):
+        return (_ArrowSlice, (self.source, self.offset, self.length, self.columns))
+
+    def to_arrow(self):
+        return self.table.slice(self.offset, self.length).select(self.columns)
+
+    def to_pandas(self):
+        return self.to_arrow().to_pandas()
+
+    def to_records(self) -> list:
+        # Drops missing values so the records match the ones written by jsonlite
+        return [
+            {key: value for key, value in row.items() if value is not None}
+            for row in self.to_arrow().to_pylist()
+        ]
+
+
+@lru_cache(maxsize=256)
+def _open_table(source: str):
+    """
+    Memory-maps a cached Arrow IPC file, reusing the mapping within the process
+    """
+    return ipc.open_file(pa.memory_map(source, "r")).read_all()
+
+
+def _cache_dir(cache: Union[bool, str]) -> Union[str, None]:
+    """
+    Resolves the cache argument of the forecast loaders into a directory
+    Args:
+        cache: False to disable the cache, True to use the default folder or the path of a folder
+    Returns:
+        The cache folder, or None if the cache is disabled
+    """
+    if cache is None or cache is False:
+        return None
+
+    if cache is True:
+        return os.getenv(
+            "PYFAAS4I_CACHE_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "pyfaas4i"),
+        )
+
+    return str(cache)
+
+
+def _cache_key(path: str) -> str:
+    """
+    Builds the cache key of a forecastpack from its path, modification time and content hash
+    Args:
+        path: path to the forecastpack file
+    Returns:
+        key: hexadecimal key identifying the file version
+    """
+    stat = os.stat(path)
+    content = hashlib.blake2b(digest_size=16)
+
+    with open(path, "rb") as pack_file:
+        for chunk in iter(lambda: pack_file.read(1 << 20), b""):
+            content.update(chunk)
+
+    key = hashlib.blake2b(digest_size=16)
+    key.update(
+        "|".join(
+            [
+                os.path.abspath(path),
+                str(stat.st_mtime_ns),
+                str(stat.st_size),
+                content.hexdigest(),
+                str(_CACHE_VERSION),
+            ]
+        ).encode("utf-8")
+    )
+
+    return key.hexdigest()
+
+
+def _atomic_write(target: str, write_function, prefix: str = None) -> None:
+    """
+    Writes a file through a temporary file in the same folder, so readers never see partial files
+    """
+    folder = os.path.dirname(target)
+    handle, temp_path = tempfile.mkstemp(dir=folder, prefix=prefix, suffix=".tmp")
+    os.close(handle)
+
+    try:
+        write_function(temp_path)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _records_to_arrow(records: list):
+    """
+    Converts a list of row dictionaries into an Arrow table, keeping every column that appears in any row
+    """
+    columns = list(dict.fromkeys(key for row in records for key in row))
+    return pa.table({col: pa.array([row.get(col) for row in records]) for col in columns})
+
+
+def _store_pack(pack: list, cache_dir: str, key: str) -> None:
+    """
+    Saves a parsed forecastpack in the cache as Arrow IPC tables plus a JSON metadata file
+    Args:
+        pack: parsed forecastpack, as returned by json.load
+        cache_dir: folder of the cache
+        key: key returned by _cache_key
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = [dict(model) for model in pack]
+
+    for field in _TABLE_FIELDS:
+        tables = []
+        offset = 0
+
+        try:
+            for i, model in enumerate(pack):
+                records = model.get(field)
+                if not isinstance(records, list) or not records or not isinstance(records[0], dict):
+                    continue
+
+                table = _records_to_arrow(records)
+                tables.append(table)
+                meta[i][field] = {
+                    "__arrow__": field,
+                    "offset": offset,
+                    "length": table.num_rows,
+                    "columns": table.column_names,
+                }
+                offset += table.num_rows
+
+            if not tables:
+                continue
+
+            table = pa.concat_tables(tables, promote_options="permissive")
+
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Columns with mixed types are kept inside the metadata file
+            for i, model in enumerate(pack):
+                meta[i][field] = model.get(field)
+            continue
+
+        def write_table(temp_path, table=table):
+            with pa.OSFile(temp_path, "wb") as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+        _atomic_write(os.path.join(cache_dir, f"{key}.{field}.arrow"), write_table, prefix=f"{key}.")
+
+    def write_meta(temp_path):
+        with open(temp_path, "w") as meta_file:
+            json.dump(meta, meta_file)
+
+    # The metadata is written last, its presence marks a complete cache entry
+    _atomic_write(os.path.join(cache_dir, f"{key}.json"), write_meta, prefix=f"{key}.")
+
+
+def _load_pack(cache_dir: str, key: str) -> Union[list, None]:
+    """
+    Loads a forecastpack from the cache, memory-mapping its Arrow tables
+    Args:
+        cache_dir: folder of the cache
+        key: key returned by _cache_key
+    Returns:
+        pack: forecastpack with its tables as _ArrowSlice objects, or None if the key is not cached
+    """
+    meta_path = os.path.join(cache_dir, f"{key}.json")
+    if not os.path.isfile(meta_path):
+        return None
+
+    with open(meta_path) as meta_file:
+        pack = json.load(meta_file)
+
+    for model in pack:
+        for field in _TABLE_FIELDS:
+            ref = model.get(field)
+            if not (isinstance(ref, dict) and "__arrow__" in ref):
+                continue
+
+            model[field] = _ArrowSlice(
+                os.path.join(cache_dir, f"{key}.{field}.arrow"),
+                ref["offset"],
+                ref["length"],
+                ref["columns"],
+            )
+
+    return pack
+
+
+def _materialize(pack: list) -> list:
+    """
+    Replaces cached or compact table references by plain records, matching the output of json.load
+    """
+    for model in pack:
+        for field in _TABLE_FIELDS:
+            if hasattr(model.get(field), "to_records"):
+                model[field] = model[field].to_records()
+    return pack
+
+
+def _lookup(path: str, cache_dir: str):
+    """
+    Computes the cache key of a file and tries to load it from the cache
+    Returns:
+        key, pack: the cache key and the cached pack (None if not cached)
+    """
+    key = _cache_key(path)
+    try:
+        return key, _load_pack(cache_dir, key)
+    except (OSError, ValueError, pa.ArrowInvalid) as e:
+        warnings.warn(f"Ignoring unreadable cache entry for {path}: {e}")
+        return key, None
+
+
+def _store(path: str, pack: list, cache_dir: str, key: str) -> None:
+    """
+    Stores a pack in the cache, warning instead of failing when it can not be written
+    """
+    try:
+        _store_pack(pack, cache_dir, key)
+    except (OSError, pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        warnings.warn(f"Could not cache {path}: {e}")
+
+
+def _cached(path: str, cache: Union[bool, str], parse_function: Callable) -> list:
+    """
+    Returns the forecastpack at path, reading it from the cache when available
+
+    Args:
+        path: path to the forecastpack file
+        cache: False to disable the cache, True to use the default folder or the path of a folder
+        parse_function: function that parses the file when it is not cached
+    Returns:
+        pack: parsed forecastpack
+    """
+    cache_dir = _cache_dir(cache)
+    if cache_dir is None:
+        return parse_function(path)
+
+    _arrow_imports().check()
+
+    key, pack = _lookup(path, cache_dir)
+    if pack is not None:
+        tracing.count("cache.hits")
+        return pack
+
+    tracing.count("cache.misses")
+    pack = parse_function(path)
+    _store(path, pack, cache_dir, key)
+
+    return pack
+
+
+def _cached_many(paths: List[str], cache: Union[bool, str], parse_many: Callable) -> list:
+    """
+    Batch version of _cached, for parsers that handle several files at once (e.g. one R session)
+
+    Args:
+        paths: paths to the forecastpack files
+        cache: False to disable the cache, True to use the default folder or the path of a folder
+        parse_many: function that receives a list of paths and returns a list with a pack
+                    or an exception for each of them
+    Returns:
+        packs: parsed forecastpacks or exceptions, in the order of paths
+    """
+    cache_dir = _cache_dir(cache)
+    if cache_dir is None:
+        return parse_many(paths)
+
+    _arrow_imports().check()
+
+    packs = [None] * len(paths)
+    keys = {}
+    for i, path in enumerate(paths):
+        keys[i], packs[i] = _lookup(path, cache_dir)
+
+    pending = [i for i, pack in enumerate(packs) if pack is None]
+    tracing.count("cache.hits", len(paths) - len(pending))
+    tracing.count("cache.misses", len(pending))
+    if pending:
+        parsed = parse_many([paths[i] for i in pending])
+        for i, pack in zip(pending, parsed):
+            packs[i] = pack
+            if not isinstance(pack, Exception):
+                _store(paths[i], pack, cache_dir, keys[i])
+
+    return packs
+
+
+def clear_cache(cache: Union[bool, str] = True) -> int:
+    """
+    Removes all converted forecastpacks from the cache. Other files of the folder (e.g. the submission
+    state or the outbox) are left in place.
+
+    Args:
+        cache: True to use the default folder or the path of the cache folder
+    Returns:
+        removed: number of files removed
+    """
+    cache_dir = _cache_dir(cache)
+    removed = 0
+
+    if cache_dir is None or not os.path.isdir(cache_dir):
+        return removed
+
+    _open_table.cache_clear()
+
+    for name in os.listdir(cache_dir):
+        if _ENTRY_FILE.match(name):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+
+    return removed
@@ -0,0 +1,520 @@
+"""
+Command line runner of FaaS jobs described in a manifest.
+
+Each job of the manifest goes through the stages submit (run_models), wait (list_projects until the
+project is done), download (download_zip) and parse (extraction of the zip file and reading of its
+forecastpacks), with a pool of workers per stage. Every finished stage is appended to a journal, so an
+interrupted run started again with the same manifest resumes each job from the stage where it stopped.
+
+Usage:
+    pyfaas4i run manifest.json
+    pyfaas4i run manifest.json --submit-workers 2 --download-workers 4 --poll-interval 120
+    pyfaas4i status manifest.json
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+from pyfaas4i import tracing
+from pyfaas4i._checkimports import _LazyImport
+
+pd = _LazyImport("pandas")
+
+STAGES = ["submit", "wait", "download", "parse"]
+
+# Event written to the journal when each stage finishes
+_DONE_EVENTS = {"submit": "submitted", "wait": "ready", "download": "downloaded", "parse": "parsed"}
+# submitting is written before run_models, so a job interrupted while being submitted is matched by name
+_NEXT_STAGE = {None: "submit", "submitting": "submit", "submitted": "wait", "ready": "download", "downloaded": "parse", "parsed": None}
+
+_READERS = {
+    ".csv": lambda path, job: pd.read_csv(path),
+    ".xlsx": lambda path, job: pd.read_excel(path, sheet_name=job.get("sheet", 0)),
+    ".xls": lambda path, job: pd.read_excel(path, sheet_name=job.get("sheet", 0)),
+    ".parquet": lambda path, job: pd.read_parquet(path),
+}
+
+_RUN_OPTIONS = ["skip_validation", "version_check", "proxy_url", "proxy_port", "max_payload_bytes",
+                "max_memory_bytes", "split", "compact_numbers", "decimals"]
+
+
+def load_manifest(path: str) -> dict:
+    """
+    Reads and checks a manifest of jobs. Relative paths of the manifest are resolved from its folder.
+
+    The manifest is a json file with a list of jobs and optional defaults shared by all the jobs:
+    ::
+        {
+            "output_dir": "./results",
+            "defaults": {"date_variable": "data_tidy", "date_format": "%Y-%m-%d",
+                         "model_spec": {"n_steps": 3, "n_windows": 6}},
+            "jobs": [
+                {"name": "industry", "data": {"fs_pim": "inputs/dataset_1.xlsx"}},
+                {"name": "retail", "data": {"fs_pmc": "inputs/dataset_2.xlsx"},
+                 "model_spec": "specs/retail.json", "options": {"skip_validation": true}}
+            ]
+        }
+
+    Each job has a unique name, data (the response variables and the csv, xlsx or parquet file of each one),
+    date_variable, date_format and model_spec (a dictionary or the path of a json file), and optionally
+    project_name (Default is the job name), user_model, sheet (of xlsx files) and options (keyword
+    arguments of run_models).
+
+    Args:
+        path: path of the manifest
+    Returns:
+        manifest: dictionary with output_dir and the list of jobs, with the defaults applied
+    Raises:
+        ValueError: if a job is missing a required field or job names are repeated
+    """
+    with open(path, encoding="utf-8") as manifest_file:
+        content = json.load(manifest_file)
+
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(value: str) -> str:
+        return os.path.normpath(os.path.join(base, os.path.expanduser(value)))
+
+    defaults = content.get("defaults", {})
+    jobs = []
+    for position, entry in enumerate(content.get("jobs", [])):
+        job = {**defaults, **entry}
+        job["options"] = {**defaults.get("options", {}), **entry.get("options", {})}
+
+        missing = [field for field in ["name", "data", "date_variable", "date_format", "model_spec"] if field not in job]
+        if missing:
+            raise ValueError(f"Job {entry.get('name', position)} of the manifest is missing: {', '.join(missing)}.")
+
+        unexpected = [option for option in job["options"] if option not in _RUN_OPTIONS]
+        if unexpected:
+            raise ValueError(f"Job {job['name']} has unexpected options: {', '.join(unexpected)}.")
+
+        if isinstance(job["model_spec"], str):
+            with open(resolve(job["model_spec"]), encoding="utf-8") as spec_file:
+                job["model_spec"] = json.load(spec_file)
+
+        job["data"] = {y: resolve(file) for y, file in job["data"].items()}
+        job.setdefault("project_name", job["name"])
+        job.setdefault("user_model", {})
+        jobs.append(job)
+
+    names = [job["name"] for job in jobs]
+    repeated = sorted({name for name in names if names.count(name) > 1})
+    if repeated:
+        raise ValueError(f"Job names must be unique, repeated: {', '.join(repeated)}.")
+
+    return {"output_dir": resolve(content.get("output_dir", "./results")), "jobs": jobs}
+
+
+class Journal:
+    """
+    Append-only record of the stages finished by each job, one json object per line. Lines are flushed
+    to disk as they are written, so the journal survives an interrupted run.
+
+    Args:
+        path: path of the journal file, created if it does not exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, job: str, event: str, **fields):
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "job": job, "event": event, **fields}
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as journal_file:
+            journal_file.write(line)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def states(self) -> Dict[str, dict]:
+        """
+        Last state of each job: its last event and the fields written by all its events
+        """
+        states = {}
+        if not os.path.exists(self.path):
+            return states
+
+        with open(self.path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the run was killed while writing it
+                    continue
+                state = states.setdefault(entry["job"], {})
+                state.update({key: value for key, value in entry.items() if key != "job"})
+                if entry["event"] != "failed":
+                    state.pop("error", None)
+                    state.pop("stage", None)
+
+        return states
+
+
+def _next_stage(state: dict, retry_failed: bool):
+    if state.get("event") == "failed":
+        return state["stage"] if retry_failed else None
+    return _NEXT_STAGE[state.get("event")]
+
+
+def _read_data_list(job: dict) -> dict:
+    data_list = {}
+    for y, path in job["data"].items():
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in _READERS:
+            raise ValueError(f"Unsupported input file {path}, expected one of: {', '.join(_READERS)}.")
+        data_list[y] = _READERS[extension](path, job)
+    return data_list
+
+
+def _plan_parts(job: dict, data_list: dict) -> Dict[str, list]:
+    """
+    Names of the projects created by run_models for the data of a job and the datasets of each one, in order
+    """
+    from pyfaas4i.faas._modellingcalls import _plan_shards
+
+    options = job["options"]
+    shards = _plan_shards(data_list, job["date_variable"], job["date_format"], job["model_spec"], job["project_name"],
+                          job["user_model"], options.get("max_payload_bytes"), options.get("max_memory_bytes"),
+                          options.get("split", False), options.get("compact_numbers", False), options.get("decimals", 6))
+    if len(shards) == 1:
+        return {job["project_name"]: shards[0]}
+    return {f"{job['project_name']}_part{part}": keys for part, keys in enumerate(shards, start=1)}
+
+
+def _projects_of(job: dict) -> Dict[str, str]:
+    """
+    Projects of the user named after the project_name of a job or its parts, by id
+    """
+    from pyfaas4i.faas import list_projects
+
+    pattern = re.compile(re.escape(job["project_name"]) + r"(_part\d+)?")
+    proxy = {option: job["options"][option] for option in ["proxy_url", "proxy_port"] if option in job["options"]}
+    return {project["id"]: project["name"] for project in list_projects(return_dict=True, version_check=False, **proxy)
+            if pattern.fullmatch(str(project["name"]))}
+
+
+class _Runner:
+    """
+    Runs the stages of the jobs of a manifest, keeping their state in a journal
+    """
+
+    def __init__(self, manifest: dict, journal: Journal, workers: Dict[str, int], poll_interval: float,
+                 wait_timeout: float, retry_failed: bool, log=print):
+        self.manifest = manifest
+        self.journal = journal
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self.retry_failed = retry_failed
+        self.log = log
+        self.jobs = {job["name"]: job for job in manifest["jobs"]}
+        self.states = {name: state for name, state in journal.states().items() if name in self.jobs}
+
+    def job_dir(self, name: str) -> str:
+        return os.path.join(self.manifest["output_dir"], name)
+
+    @tracing.traced("cli.submit")
+    def submit(self, job: dict, state: dict) -> dict:
+        """
+        Submits the data of a job. A job submitted before sends only the parts not created yet: the parts
+        recorded by a partial submission and, as the run may have stopped after the service created them,
+        the projects named after the job that did not exist before its first submission.
+        """
+        from pyfaas4i.faas import PartialSubmissionError, run_models
+
+        tracing.current().set(job=job["name"])
+        data_list = _read_data_list(job)
+        created = dict(state.get("created_parts", {}))
+        if "existing_ids" in state:
+            existing = state["existing_ids"]
+            created.update({name: project_id for project_id, name in _projects_of(job).items()
+                            if project_id not in existing})
+        else:
+            existing = list(_projects_of(job))
+        self.journal.write(job["name"], "submitting", existing_ids=existing, created_parts=created)
+
+        if not created:
+            try:
+                project_ids = run_models(data_list, job["date_variable"], job["date_format"], job["model_spec"],
+                                         job["project_name"], job["user_model"], get_project_id=True, **job["options"])
+            except PartialSubmissionError as e:
+                created = {name: outcome["project_id"] for name, outcome in e.parts.items()
+                           if outcome["status"] == "created"}
+                self.journal.write(job["name"], "submitting", created_parts=created)
+                raise
+            if not project_ids:
+                raise RuntimeError("The project was not created, see the validation messages.")
+
+            project_ids = project_ids if isinstance(project_ids, list) else [project_ids]
+            return {"project_ids": project_ids, "wait_started": time.time()}
+
+        parts = _plan_parts(job, data_list)
+        missing = [name for name in parts if name not in created]
+        self.log(f"[{job['name']}] {len(parts) - len(missing)} of {len(parts)} parts already created, "
+                 f"sending: {', '.join(missing) or 'none'}")
+        for name in missing:
+            # The parts were planned under the limits, each one is sent whole under the name it would have had
+            project_id = run_models({key: data_list[key] for key in parts[name]}, job["date_variable"],
+                                    job["date_format"], job["model_spec"], name,
+                                    {key: job["user_model"][key] for key in parts[name] if key in job["user_model"]},
+                                    get_project_id=True, **{**job["options"], "split": False})
+            if not project_id:
+                raise RuntimeError(f"The project {name} was not created, see the validation messages.")
+            created[name] = project_id
+            self.journal.write(job["name"], "submitting", created_parts=created)
+
+        return {"project_ids": [created[name] for name in parts], "wait_started": time.time()}
+
+    @tracing.traced("cli.wait")
+    def poll(self, job: dict, state: dict):
+        """
+        Checks the status of the projects of a job once, returning None while any of them is being processed
+        """
+        from pyfaas4i.faas import AuthenticationError, ForbiddenError, ModelingError, list_projects
+
+        tracing.current().set(job=job["name"])
+        statuses = []
+        for project_id in state["project_ids"]:
+            try:
+                status = list_projects(project_id, return_dict=True, version_check=False)[0]["status"]
+            except (AuthenticationError, ForbiddenError):
+                # Checking again will not help, the job fails with the login or permission error
+                raise
+            except Exception as e:
+                # A failed status check is not a failed job, it is checked again after poll_interval
+                self.log(f"[{job['name']}] status check failed: {type(e).__name__}: {e}")
+                status = "unknown"
+            if status in ["error", "excluded"]:
+                raise ModelingError(f"Project {project_id} finished with status {status}.")
+            statuses.append(status)
+
+        if all(status in ["success", "partial_success"] for status in statuses):
+            return {"statuses": statuses}
+
+        if self.wait_timeout and time.time() - state.get("wait_started", time.time()) > self.wait_timeout:
+            raise TimeoutError(f"The projects were not done after {self.wait_timeout:.0f} seconds: {statuses}.")
+        return None
+
+    @tracing.traced("cli.download")
+    def download(self, job: dict, state: dict) -> dict:
+        from pyfaas4i.faas import APIError, download_zip
+
+        tracing.current().set(job=job["name"])
+        folder = self.job_dir(job["name"])
+        files = []
+        for position, project_id in enumerate(state["project_ids"], start=1):
+            filename = job["name"] if len(state["project_ids"]) == 1 else f"{job['name']}_part{position}"
+            file = os.path.join(folder, f"forecast-{filename}.zip")
+            # download_zip returns the status of a project still being processed or the status code of the download
+            result = download_zip(project_id, folder, filename, verbose=False, version_check=False)
+            if result != 200:
+                if os.path.exists(file):
+                    os.remove(file)
+                raise APIError(f"The download of project {project_id} failed: {result}.")
+            files.append(file)
+        return {"files": files}
+
+    @tracing.traced("cli.parse")
+    def parse(self, job: dict, state: dict) -> dict:
+        from pyfaas4i.forecastpack import PackReadError, forecast
+
+        tracing.current().set(job=job["name"])
+        folder = os.path.join(self.job_dir(job["name"]), "forecastpacks")
+        paths = []
+        for file in state["files"]:
+            with zipfile.ZipFile(file) as archive:
+                for member in archive.namelist():
+                    if member.lower().endswith((".json", ".rds")):
+                        paths.append(archive.extract(member, folder))
+
+        packs = forecast.read_many(paths, workers=1, executor="thread") if paths else []
+        rows = []
+        errors = {}
+        for path, pack in zip(paths, packs):
+            if isinstance(pack, PackReadError):
+                errors[path] = str(pack.error)
+                continue
+            best = pack.model_list(n_best=1)
+            best.insert(0, "File", os.path.relpath(path, folder))
+            best.insert(1, "Models", len(pack.json))
+            rows.append(best)
+
+        summary = os.path.join(self.job_dir(job["name"]), "summary.csv")
+        if rows:
+            pd.concat(rows, ignore_index=True).to_csv(summary, index=False)
+        return {"packs": len(paths) - len(errors), "read_errors": errors, "summary": summary if rows else None}
+
+    def run(self) -> Dict[str, dict]:
+        """
+        Runs every unfinished job until all of them are parsed or failed
+
+        Returns:
+            states: last state of each job of the manifest
+        """
+        functions = {"submit": self.submit, "wait": self.poll, "download": self.download, "parse": self.parse}
+        pools = {stage: ThreadPoolExecutor(max_workers=self.workers[stage], thread_name_prefix=f"pyfaas4i-{stage}")
+                 for stage in STAGES}
+        running = {}
+        delayed = []
+
+        def schedule(name: str, not_before: float = 0.0):
+            stage = _next_stage(self.states.get(name, {}), self.retry_failed)
+            if stage is None:
+                return
+            if not_before > time.time():
+                heapq.heappush(delayed, (not_before, name))
+                return
+            running[pools[stage].submit(functions[stage], self.jobs[name], self.states.get(name, {}))] = (name, stage)
+
+        def record(name: str, event: str, **fields):
+            self.journal.write(name, event, **fields)
+            state = self.states.setdefault(name, {})
+            state.update(event=event, **fields)
+            if event != "failed":
+                state.pop("error", None)
+                state.pop("stage", None)
+
+        for name in self.jobs:
+            state = self.states.get(name, {})
+            if state.get("event") == "failed" and self.retry_failed:
+                self.log(f"[{name}] retrying stage {state['stage']} after: {state['error']}")
+            schedule(name)
+
+        try:
+            while running or delayed:
+                while delayed and delayed[0][0] <= time.time():
+                    schedule(heapq.heappop(delayed)[1])
+
+                timeout = max(0.0, delayed[0][0] - time.time()) if delayed else None
+                if not running:
+                    time.sleep(timeout)
+                    continue
+                finished, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    name, stage = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        record(name, "failed", stage=stage, error=f"{type(e).__name__}: {e}")
+                        self.log(f"[{name}] {stage} failed: {type(e).__name__}: {e}")
+                        continue
+
+                    if stage == "wait" and result is None:
+                        schedule(name, time.time() + self.poll_interval)
+                        continue
+
+                    record(name, _DONE_EVENTS[stage], **result)
+                    self.log(f"[{name}] {_DONE_EVENTS[stage]}" + (
+                        f" {result['project_ids']}" if stage == "submit" else
+                        f" {result['summary']}" if stage == "parse" else ""))
+                    schedule(name)
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        return {name: self.states.get(name, {}) for name in self.jobs}
+
+
+def run_manifest(
+    manifest_path: str,
+    journal_path: str = None,
+    submit_workers: int = 2,
+    wait_workers: int = 4,
+    download_workers: int = 4,
+    parse_workers: int = 2,
+    poll_interval: float = 60.0,
+    wait_timeout: float = None,
+    retry_failed: bool = False,
+    log=print,
+) -> Dict[str, dict]:
+    """
+    Runs the jobs of a manifest through the stages submit, wait, download and parse, resuming the
+    jobs recorded in the journal from the stage where they stopped
+
+    Args:
+        manifest_path: path of the manifest, see load_manifest()
+        journal_path: path of the journal (Default is the manifest path with the .journal.jsonl extension)
+        submit_workers: number of jobs submitted at the same time
+        wait_workers: number of jobs whose status is checked at the same time
+        download_workers: number of jobs downloaded at the same time
+        parse_workers: number of jobs parsed at the same time
+        poll_interval: seconds between status checks of a job
+        wait_timeout: seconds after which a job still being processed fails (Default is no limit)
+        retry_failed: if failed jobs should be run again from the stage that failed
+        log: function receiving the progress messages
+    Returns:
+        states: last state of each job (event, project_ids, files, summary and, for failed jobs, stage and error)
+    """
+    manifest = load_manifest(manifest_path)
+    journal = Journal(journal_path or os.path.splitext(manifest_path)[0] + ".journal.jsonl")
+    workers = {"submit": submit_workers, "wait": wait_workers, "download": download_workers, "parse": parse_workers}
+    runner = _Runner(manifest, journal, workers, poll_interval, wait_timeout, retry_failed, log)
+    return runner.run()
+
+
+def _print_states(manifest: dict, states: Dict[str, dict]) -> int:
+    n_failed = 0
+    print(f"{'job':<30}{'state':<12}details")
+    for job in manifest["jobs"]:
+        state = states.get(job["name"], {})
+        event = state.get("event", "pending")
+        if event == "failed":
+            n_failed += 1
+            details = f"{state['stage']}: {state['error']}"
+        elif event == "parsed":
+            details = f"{state['packs']} packs, {state['summary']}"
+        else:
+            details = " ".join(state.get("project_ids", []))
+        print(f"{job['name']:<30}{event:<12}{details}")
+    return n_failed
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(prog="pyfaas4i", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run or resume the jobs of a manifest")
+    status_parser = commands.add_parser("status", help="show the state of the jobs of a manifest")
+    for command in [run_parser, status_parser]:
+        command.add_argument("manifest", help="json file with the jobs")
+        command.add_argument("--journal", help="journal file (Default is <manifest>.journal.jsonl)")
+
+    run_parser.add_argument("--submit-workers", type=int, default=2)
+    run_parser.add_argument("--wait-workers", type=int, default=4)
+    run_parser.add_argument("--download-workers", type=int, default=4)
+    run_parser.add_argument("--parse-workers", type=int, default=2)
+    run_parser.add_argument("--poll-interval", type=float, default=60.0, help="seconds between status checks")
+    run_parser.add_argument("--wait-timeout", type=float, help="seconds after which a job still being processed fails")
+    run_parser.add_argument("--retry-failed", action="store_true", help="run failed jobs again from the failed stage")
+
+    args = parser.parse_args(argv)
+    journal_path = args.journal or os.path.splitext(args.manifest)[0] + ".journal.jsonl"
+
+    if args.command == "status":
+        n_failed = _print_states(load_manifest(args.manifest), Journal(journal_path).states())
+        sys.exit(1 if n_failed else 0)
+
+    states = run_manifest(
+        args.manifest, journal_path, args.submit_workers, args.wait_workers, args.download_workers,
+        args.parse_workers, args.poll_interval, args.wait_timeout, args.retry_failed,
+    )
+    print()
+    n_failed = _print_states(load_manifest(args.manifest), states)
+    sys.exit(1 if n_failed else 0)
+
+
+if __name__ == "__main__":
+    main()
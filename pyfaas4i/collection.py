@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple, Union
+
+from pyfaas4i._checkimports import _LazyImport
+from pyfaas4i.forecastpack import forecast, PackReadError, _table_columns
+
+np = _LazyImport("numpy")
+pd = _LazyImport("pandas")
+
+METRICS = ["RMSE", "MPE", "MAPE", "WMAPE", "MASE", "MASEs"]
+
+
+def _pack_vintage(pack: list):
+    """
+    Vintage of a forecastpack: the first out-of-sample date of its first model with forecasts
+    """
+    for model in pack:
+        if model.get("forecast") is None:
+            continue
+        columns = _table_columns(model["forecast"], ["data_tidy", "type"])
+        out_sample = np.asarray(columns["type"] == "out_sample", dtype=bool)
+        if out_sample.any():
+            return columns["data_tidy"][out_sample][0]
+    return None
+
+
+class ForecastCollection:
+    """
+    Columnar store for many forecastpacks, one per series and vintage.
+
+    Instead of keeping one forecast() object per series, the collection keeps three long-format tables,
+    keyed by series and vintage (the first out-of-sample date of the pack):
+
+    - metrics: one row per model, with its type and cross-validation metrics;
+    - forecasts: the out-of-sample forecasts of every model, with the step ahead of each date;
+    - actuals: the in-sample values of each pack, stored once per pack.
+
+    Queries such as the best model per series or all forecasts for a given horizon are computed
+    with vectorized pandas operations over these tables.
+
+    Example:
+    ::
+    >>> from pyfaas4i.collection import ForecastCollection
+
+    >>> collection = ForecastCollection.from_paths({"sales": "./sales.json", "exports": "./exports.rds"})
+
+    >>> # Best model per series according to WMAPE
+    >>> best = collection.best_models(metric="WMAPE")
+
+    >>> # Third step ahead of the best models
+    >>> forecasts = collection.forecasts(horizon=3, models="best", metric="WMAPE")
+    """
+
+    def __init__(self):
+        """
+        Creates an empty ForecastCollection() object.
+        """
+        self._chunks = []
+        self._metrics = None
+        self._forecasts = None
+        self._actuals = None
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def add(self, series: str, pack: Union[forecast, list], vintage: str = None):
+        """
+        Adds a forecastpack to the collection
+
+        Args:
+            series: name of the series (Y) of the pack
+            pack: forecast() object or raw forecastpack (as returned with raw=True)
+            vintage: date of the pack. If not provided, the first out-of-sample date of the first model is used.
+        """
+        if isinstance(pack, forecast):
+            pack = pack.json
+
+        if not pack:
+            raise ValueError(f"The forecastpack for series '{series}' is empty.")
+
+        n_models = len(pack)
+        metric_values = np.array(
+            [[model.get(metric, np.nan) for metric in METRICS] for model in pack], dtype=float
+        )
+
+        dates, values, steps, models = [], [], [], []
+        actual_dates = actual_values = None
+
+        for i, model in enumerate(pack):
+            if model.get("forecast") is None:
+                continue
+
+            columns = _table_columns(model["forecast"], ["data_tidy", "y_all", "type"])
+            out_sample = np.asarray(columns["type"] == "out_sample", dtype=bool)
+
+            if actual_dates is None:
+                actual_dates = columns["data_tidy"][~out_sample]
+                actual_values = columns["y_all"][~out_sample]
+
+            dates.append(columns["data_tidy"][out_sample])
+            values.append(columns["y_all"][out_sample])
+            steps.append(np.arange(1, out_sample.sum() + 1, dtype=np.int16))
+            models.append(np.full(out_sample.sum(), i, dtype=np.int32))
+
+        if vintage is None:
+            vintage = _pack_vintage(pack)
+
+        self._chunks.append(
+            {
+                "series": series,
+                "vintage": vintage,
+                "model_type": [model["type"] for model in pack],
+                "metrics": metric_values,
+                "n_models": n_models,
+                "dates": np.concatenate(dates) if dates else np.array([]),
+                "values": np.concatenate(values) if values else np.array([]),
+                "steps": np.concatenate(steps) if steps else np.array([], dtype=np.int16),
+                "models": np.concatenate(models) if models else np.array([], dtype=np.int32),
+                "actual_dates": actual_dates if actual_dates is not None else np.array([]),
+                "actual_values": actual_values if actual_values is not None else np.array([]),
+            }
+        )
+
+    def _consolidate(self):
+        """
+        Moves the packs added since the last query into the columnar tables
+        """
+        if not self._chunks:
+            if self._metrics is None:
+                self._metrics, self._forecasts, self._actuals = self._build([])
+            return
+
+        metrics, forecasts, actuals = self._build(self._chunks)
+        self._chunks = []
+
+        if self._metrics is not None:
+            metrics = pd.concat([self._metrics, metrics], ignore_index=True)
+            forecasts = pd.concat([self._forecasts, forecasts], ignore_index=True)
+            actuals = pd.concat([self._actuals, actuals], ignore_index=True)
+
+        for table in [metrics, forecasts, actuals]:
+            for col in ["series", "model_type", "type"]:
+                if col in table.columns:
+                    table[col] = table[col].astype("category")
+
+        self._metrics, self._forecasts, self._actuals = metrics, forecasts, actuals
+
+    @staticmethod
+    def _build(chunks: list) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """
+        Concatenates the arrays extracted from the packs into the three long-format tables
+        """
+        series = np.array([chunk["series"] for chunk in chunks], dtype=object)
+        vintages = pd.to_datetime(pd.Series([chunk["vintage"] for chunk in chunks], dtype=object))
+
+        def per_pack(key):
+            return np.repeat(np.arange(len(chunks)), [len(chunk[key]) for chunk in chunks])
+
+        n_models = np.array([chunk["n_models"] for chunk in chunks], dtype=int)
+        model_pack = np.repeat(np.arange(len(chunks)), n_models)
+
+        metrics = pd.DataFrame(
+            {
+                "series": series[model_pack],
+                "vintage": vintages.to_numpy()[model_pack],
+                "model": np.concatenate([np.arange(n, dtype=np.int32) for n in n_models]) if chunks else np.array([], dtype=np.int32),
+                "model_type": np.concatenate([chunk["model_type"] for chunk in chunks]) if chunks else np.array([], dtype=object),
+            }
+        )
+        metric_values = np.vstack([chunk["metrics"] for chunk in chunks]) if chunks else np.empty((0, len(METRICS)))
+        for j, metric in enumerate(METRICS):
+            metrics[metric] = metric_values[:, j]
+
+        def concat(key, dtype=None):
+            if not chunks:
+                return np.array([], dtype=dtype)
+            return np.concatenate([np.asarray(chunk[key], dtype=dtype) for chunk in chunks])
+
+        forecast_pack = per_pack("dates")
+        forecasts = pd.DataFrame(
+            {
+                "series": series[forecast_pack],
+                "vintage": vintages.to_numpy()[forecast_pack],
+                "model": concat("models", np.int32),
+                "step": concat("steps", np.int16),
+                "data_tidy": pd.to_datetime(concat("dates")),
+                "y_all": concat("values", float),
+            }
+        )
+
+        actual_pack = per_pack("actual_dates")
+        actuals = pd.DataFrame(
+            {
+                "series": series[actual_pack],
+                "vintage": vintages.to_numpy()[actual_pack],
+                "data_tidy": pd.to_datetime(concat("actual_dates")),
+                "y_all": concat("actual_values", float),
+            }
+        )
+
+        return metrics, forecasts, actuals
+
+    @classmethod
+    def from_packs(cls, packs: Union[Dict[str, Union[forecast, list]], Iterable[Tuple]]) -> "ForecastCollection":
+        """
+        Creates a ForecastCollection() from forecast() objects or raw forecastpacks
+
+        Args:
+            packs: dictionary of series names and packs, or an iterable of (series, pack) or (series, pack, vintage) tuples
+        Returns:
+            collection: the filled ForecastCollection() object
+        """
+        collection = cls()
+        items = packs.items() if isinstance(packs, dict) else packs
+
+        for item in items:
+            collection.add(*item)
+
+        return collection
+
+    @classmethod
+    def from_paths(
+        cls,
+        paths: Union[Dict[str, Union[str, List[str]]], Iterable[Tuple[str, str]]],
+        workers: int = None,
+        executor: str = "process",
+        cache: Union[bool, str] = False,
+    ) -> "ForecastCollection":
+        """
+        Creates a ForecastCollection() reading the forecastpack files in parallel with forecast.read_many()
+
+        Args:
+            paths: dictionary of series names and a path (or a list of paths, one per vintage), or an iterable of (series, path) tuples
+            workers: Number of parallel workers. (Default = number of CPUs)
+            executor: 'process' or 'thread', see forecast.read_many(). (Default = 'process')
+            cache: If the packs should be kept in an on-disk Arrow cache, see forecast.from_json(). (Default = False)
+        Returns:
+            collection: the filled ForecastCollection() object
+        Raises:
+            PackReadError: if any of the files could not be read
+        """
+        items = paths.items() if isinstance(paths, dict) else paths
+        pairs = []
+        for series, series_paths in items:
+            if isinstance(series_paths, (list, tuple)):
+                pairs.extend((series, path) for path in series_paths)
+            else:
+                pairs.append((series, series_paths))
+
+        packs = forecast.read_many(
+            [path for _, path in pairs],
+            workers=workers,
+            fields=["type", "forecast"] + METRICS,
+            executor=executor,
+            raw=True,
+            cache=cache,
+        )
+
+        collection = cls()
+        for (series, _), pack in zip(pairs, packs):
+            if isinstance(pack, PackReadError):
+                raise pack
+            collection.add(series, pack)
+
+        return collection
+
+    @property
+    def metrics(self) -> pd.DataFrame:
+        """
+        Dataframe with one row per series, vintage and model, with the model type and cross-validation metrics
+        """
+        self._consolidate()
+        return self._metrics
+
+    @property
+    def forecasts_table(self) -> pd.DataFrame:
+        """
+        Dataframe with the out-of-sample forecasts of every model, with the step ahead of each date
+        """
+        self._consolidate()
+        return self._forecasts
+
+    @property
+    def actuals(self) -> pd.DataFrame:
+        """
+        Dataframe with the in-sample values of each pack
+        """
+        self._consolidate()
+        return self._actuals
+
+    @property
+    def series(self) -> list:
+        return list(self.metrics["series"].unique())
+
+    @property
+    def vintages(self) -> list:
+        return sorted(self.metrics["vintage"].dropna().unique())
+
+    def best_models(self, metric: str = "MAPE", latest: bool = False) -> pd.DataFrame:
+        """
+        Selects the best model of each series and vintage according to a cross-validation metric
+
+        Args:
+            metric: metric used to rank the models (Default is 'MAPE')
+            latest: if only the latest vintage of each series should be returned (Default is False)
+        Returns:
+            best: dataframe with one row per series and vintage
+        Raises:
+            ValueError: if metric is not a valid option
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}, provided value was: {metric}.")
+
+        metrics = self.metrics
+        if latest:
+            metrics = metrics.loc[metrics["vintage"] == metrics.groupby("series", observed=True)["vintage"].transform("max")]
+
+        # MPE is ranked by its absolute value, as errors may be negative
+        ranking = metrics[metric].abs() if metric == "MPE" else metrics[metric]
+        order = np.lexsort((ranking.to_numpy(), metrics["vintage"].to_numpy(), metrics["series"].cat.codes.to_numpy()))
+
+        best = metrics.iloc[order].drop_duplicates(["series", "vintage"])
+        return best.reset_index(drop=True)
+
+    def forecasts(
+        self,
+        horizon: Union[int, List[int]] = None,
+        models: Union[str, int] = "best",
+        metric: str = "MAPE",
+        latest: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Out-of-sample forecasts of the collection
+
+        Args:
+            horizon: step (or list of steps) ahead to be returned, all steps if None (Default is None)
+            models: 'best' for the best model of each pack according to metric, 'all' for all models,
+                    or the index of a model (Default is 'best')
+            metric: metric used to rank the models when models is 'best' (Default is 'MAPE')
+            latest: if only the latest vintage of each series should be returned (Default is False)
+        Returns:
+            forecasts: long-format dataframe with series, vintage, model, step, data_tidy and y_all
+        """
+        table = self.forecasts_table
+
+        if horizon is not None:
+            table = table.loc[table["step"].isin(np.atleast_1d(horizon))]
+
+        if latest:
+            table = table.loc[table["vintage"] == table.groupby("series", observed=True)["vintage"].transform("max")]
+
+        if models == "best":
+            best = self.best_models(metric=metric, latest=latest)[["series", "vintage", "model", "model_type", metric]]
+            table = table.merge(best, on=["series", "vintage", "model"], how="inner")
+        elif models != "all":
+            table = table.loc[table["model"] == int(models)]
+
+        return table.reset_index(drop=True)
+
+    def metric_summary(self, metric: str = None, by: Union[str, List[str]] = "model_type") -> pd.DataFrame:
+        """
+        Distribution of the cross-validation metrics over the collection
+
+        Args:
+            metric: metric to be summarised, all metrics if None (Default is None)
+            by: column(s) of the metrics table used to group the models (Default is 'model_type')
+        Returns:
+            summary: dataframe with count, mean, std, min, quartiles and max per group
+        """
+        columns = [metric] if metric else METRICS
+        return self.metrics.groupby(by, observed=True)[columns].describe()
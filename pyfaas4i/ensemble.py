@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from typing import List, Union
+
+from pyfaas4i._checkimports import _LazyImport
+
+np = _LazyImport("numpy")
+pd = _LazyImport("pandas")
+
+COMBINATIONS = ["mean", "median", "trimmed_mean", "inverse_metric"]
+
+
+class ForecastMatrix:
+    """
+    Out-of-sample forecasts of every model of a forecastpack, as a models x horizon array.
+
+    Created by forecast.forecast_matrix(). Row i holds the forecasts of model i of the pack, aligned on
+    the forecast dates (NaN where a model has no forecast for a date), and the cross-validation metrics
+    of each model are kept alongside, so combinations of any subset of models are computed with array
+    operations only.
+
+    Attributes:
+        dates: forecast dates (columns of values)
+        values: models x horizon array with the forecasts
+        model_types: type of each model
+        metrics: dictionary with an array of each cross-validation metric, one value per model
+
+    Example:
+    ::
+    >>> matrix = example.forecast_matrix()
+
+    >>> # Mean of the 10 best models according to MAPE
+    >>> matrix.combine("mean", k=10, metric="MAPE")
+
+    >>> # Weighted by the inverse of the WMAPE of the 5 best ARIMA models
+    >>> matrix.combine("inverse_metric", k=5, metric="WMAPE", model_type="ARIMA")
+    """
+
+    __slots__ = ("dates", "values", "model_types", "metrics")
+
+    def __init__(self, dates: pd.DatetimeIndex, values: np.ndarray, model_types: np.ndarray, metrics: dict):
+        self.dates = dates
+        self.values = values
+        self.model_types = model_types
+        self.metrics = metrics
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def metrics_frame(self) -> pd.DataFrame:
+        """
+        Dataframe with the type and cross-validation metrics of each model, indexed by the model number
+        (the row of values), as in forecast.model_list()
+        """
+        frame = pd.DataFrame({"Model Type": self.model_types, **self.metrics})
+        frame.index.name = "Model"
+        return frame
+
+    def to_frame(self, models: Union[List[int], np.ndarray] = None) -> pd.DataFrame:
+        """
+        Dataframe with the forecast dates in the rows and one column per model
+
+        Args:
+            models: model numbers to be returned, all if None
+        """
+        models = np.arange(len(self)) if models is None else np.asarray(models)
+        return pd.DataFrame(self.values[models].T, index=self.dates, columns=models)
+
+    def select(self, k: int = None, metric: str = "MAPE", model_type: Union[str, List[str]] = None) -> np.ndarray:
+        """
+        Model numbers of the k best models according to a cross-validation metric
+
+        Args:
+            k: number of models, all models if None
+            metric: metric used to rank the models, MPE is ranked by its absolute value (Default is 'MAPE')
+            model_type: model type (or list of types) to be considered, all if None
+        Returns:
+            models: model numbers, from the best to the worst
+        Raises:
+            ValueError: if the metric is not available
+        """
+        if metric not in self.metrics:
+            raise ValueError(f"metric must be one of {', '.join(self.metrics)}, provided value was: {metric}.")
+
+        ranking = np.abs(self.metrics[metric]) if metric == "MPE" else self.metrics[metric]
+        candidates = np.flatnonzero(~np.isnan(ranking))
+
+        if model_type is not None:
+            model_type = [model_type] if isinstance(model_type, str) else list(model_type)
+            candidates = candidates[np.isin(self.model_types[candidates], model_type)]
+
+        if k is not None and k < len(candidates):
+            candidates = candidates[np.argpartition(ranking[candidates], k - 1)[:k]]
+
+        return candidates[np.argsort(ranking[candidates], kind="stable")]
+
+    def combine(
+        self,
+        method: str = "mean",
+        k: int = None,
+        metric: str = "MAPE",
+        model_type: Union[str, List[str]] = None,
+        models: Union[List[int], np.ndarray] = None,
+        trim: float = 0.1,
+    ) -> pd.Series:
+        """
+        Combines the forecasts of several models into a single forecast
+
+        Args:
+            method: 'mean', 'median', 'trimmed_mean' or 'inverse_metric' (average weighted by the inverse of
+                    the absolute value of the metric) (Default is 'mean')
+            k: number of best models to be combined according to the metric, all if None
+            metric: metric used to rank (and weight) the models (Default is 'MAPE')
+            model_type: model type (or list of types) to be considered, all if None
+            models: model numbers to be combined, replacing the selection by k, metric and model_type
+            trim: proportion of models removed from each end at every date by the trimmed mean (Default is 0.1)
+        Returns:
+            combination: combined forecast indexed by date
+        Raises:
+            ValueError: if method or trim are not valid options or no model was selected
+        """
+        if method not in COMBINATIONS:
+            raise ValueError(f"method must be one of {', '.join(COMBINATIONS)}, provided value was: {method}.")
+        if not 0 <= trim < 0.5:
+            raise ValueError(f"trim must be in the interval [0, 0.5), provided value was: {trim}.")
+
+        models = self.select(k, metric, model_type) if models is None else np.asarray(models)
+        if len(models) == 0:
+            raise ValueError("No model was selected to be combined.")
+
+        values = self.values[models]
+
+        # The NaN-aware reductions are only needed when some model does not cover the whole horizon
+        missing = np.isnan(values).any()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if method == "mean":
+                combination = np.nanmean(values, axis=0) if missing else values.mean(axis=0)
+            elif method == "median":
+                combination = np.nanmedian(values, axis=0) if missing else np.median(values, axis=0)
+            elif method == "trimmed_mean":
+                combination = _trimmed_mean(values, trim)
+            else:
+                weights = 1 / np.abs(self.metrics[metric][models])
+                present = ~np.isnan(values)
+                combination = (
+                    np.where(present, values, 0).T @ weights
+                ) / (present.T @ weights)
+
+        return pd.Series(combination, index=self.dates, name=method)
+
+    def weights(self, k: int = None, metric: str = "MAPE", model_type: Union[str, List[str]] = None) -> pd.Series:
+        """
+        Normalised inverse-metric weights used by combine('inverse_metric'), indexed by model number
+        """
+        models = self.select(k, metric, model_type)
+        weights = 1 / np.abs(self.metrics[metric][models])
+        return pd.Series(weights / weights.sum(), index=pd.Index(models, name="Model"), name=metric)
+
+
+def _trimmed_mean(values: np.ndarray, trim: float) -> np.ndarray:
+    """
+    Mean of each column after removing the trim proportion of the lowest and highest values,
+    counting only the models with a forecast at each date
+    """
+    ordered = np.sort(values, axis=0)  # NaN are sorted to the end
+    n_valid = (~np.isnan(values)).sum(axis=0)
+    cut = np.floor(n_valid * trim).astype(int)
+
+    rank = np.arange(values.shape[0])[:, None]
+    keep = (rank >= cut) & (rank < n_valid - cut)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(keep, ordered, 0).sum(axis=0) / keep.sum(axis=0)
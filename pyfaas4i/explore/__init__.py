@@ -1,2 +1,4 @@
 from ._accuracy import *
+from ._backtest import *
+from ._accuracystore import *
 from ._makedash import *
\ No newline at end of file
@@ -1,43 +1,200 @@
+from __future__ import annotations
+
 from pyfaas4i.forecastpack import forecast
-from typing import List
-import pandas as pd
+from pyfaas4i._checkimports import _LazyImport
+from typing import List, Tuple
 import warnings
 
-def compare_packs(packs = List[forecast]) -> pd.DataFrame:
+np = _LazyImport('numpy')
+pd = _LazyImport('pandas')
+
+
+def _align_packs(packs: List[forecast], dtype: str = 'float64') -> Tuple[pd.DatetimeIndex, np.ndarray, np.ndarray, List[str]]:
+    '''
+    Aligns the out-of-sample forecasts of several packs on the dates of the most recent in-sample data
+
+    Args:
+     - packs: List of forecast objects
+     - dtype: 'float64' or 'float32', type of the returned values
+
+    Returns:
+     - dates: in-sample dates of the pack with the most recent data
+     - real: in-sample values of that pack
+     - matrix: dates x packs matrix with the out-of-sample forecasts of each pack (NaN where there is no forecast)
+     - names: name of each pack, the first date of its forecasts (repeated names are numbered)
+    '''
+    if not packs:
+        raise ValueError("packs should contain at least one forecast object.")
+
+    tables = [x.forecast for x in packs]
+    lengths = np.array([len(x) for x in tables])
+    pack_position = np.repeat(np.arange(len(tables)), lengths)
+
+    # Dates are parsed once for all packs
+    all_dates = pd.to_datetime(np.concatenate([np.asarray(x['data_tidy']) for x in tables])).to_numpy()
+    all_values = np.concatenate([np.asarray(x['y_all'], dtype='float64') for x in tables])
+    out_sample = np.concatenate([np.asarray(x['type'] == 'out_sample', dtype=bool) for x in tables])
+
+    # The reference is the pack whose in-sample data ends last
+    in_dates = np.where(out_sample, np.datetime64('NaT'), all_dates)
+    last_dates = pd.Series(in_dates).groupby(pack_position).max().reindex(range(len(tables)))
+    if last_dates.isna().all():
+        raise ValueError("None of the packs has in-sample data.")
+    reference = int(last_dates.to_numpy().argmax())
+
+    reference_rows = (pack_position == reference) & ~out_sample
+    order = np.argsort(all_dates[reference_rows], kind='stable')
+    dates = pd.DatetimeIndex(all_dates[reference_rows][order], name='data_tidy')
+    real = all_values[reference_rows][order].astype(dtype)
+
+    names = []
+    seen = {}
+    first_rows = np.flatnonzero(out_sample)
+    first_out = pd.Series(first_rows).groupby(pack_position[first_rows]).min()
+    for i in range(len(tables)):
+        if i not in first_out.index:
+            raise ValueError(f"The pack in position {i} has no out-of-sample forecasts.")
+
+        forecast_date = pd.Timestamp(all_dates[first_out[i]]).strftime('%Y-%m-%d')
+        seen[forecast_date] = seen.get(forecast_date, 0) + 1
+
+        if seen[forecast_date] > 1:
+            warnings.warn(f"Forecasts in the list start their projections at the same date ({forecast_date}), they are numbered in the comparison.", Warning)
+            forecast_date = f"{forecast_date} ({seen[forecast_date]})"
+
+        names.append(forecast_date)
+
+    # Single scatter of every out-of-sample value into the dates x packs matrix
+    matrix = np.full((len(dates), len(tables)), np.nan, dtype=dtype)
+    rows = dates.get_indexer(all_dates[out_sample])
+    found = rows >= 0
+    matrix[rows[found], pack_position[out_sample][found]] = all_values[out_sample][found]
+
+    return dates, real, matrix, names
+
+
+def compare_packs(packs: List[forecast], dtype: str = 'float64') -> pd.DataFrame:
     '''
     Gets comparison of projetions from forecastpacks, the newest treated as the last available value
     
     Args:
      - packs: List of forecast objects
+     - dtype: 'float64' or 'float32', type of the values in the comparison
 
     Returns:
      - comparison: Dataframe with the comparison values from different forecast objects
     '''
-    pack_forecast = [x.forecast for x in packs]
+    dates, real, matrix, names = _align_packs(packs, dtype=dtype)
 
-    in_sample = [x.loc[x['type'] == 'in_sample'].copy() for x in pack_forecast]
+    comparison = pd.DataFrame(matrix, columns=names)
+    comparison.insert(0, 'real', real)
+    comparison.insert(0, 'data_tidy', dates)
 
-    max_len = max([len(x) for x in in_sample]) # trocar para última data
+    return comparison
 
-    orig_data = [x for x in in_sample if len(x) == max_len][0]
 
-    out_sample = [x.loc[x['type'] == 'out_sample'].copy() for x in pack_forecast]
 
-    comparison = orig_data.iloc[:, [0,1]].copy()
-    comparison.rename(columns={orig_data.columns[1]: 'real'}, inplace=True)
+OBSERVED_METRICS = ['MAPE', 'WMAPE', 'RMSE', 'MPE', 'MASE']
 
-    for forecast in out_sample:
-        tmp_forecast = forecast.iloc[:, [0,1]].copy() # check for duplicates add number
-        forecast_date = tmp_forecast.iloc[0, 0]
-        tmp_forecast.rename(columns = {tmp_forecast.columns[1] : forecast_date}, inplace=True)
-        
-        if forecast_date in comparison.columns:
-            warnings.warn(f"Forecasts in the list start their projections at the same date ({forecast_date}), some forecasts will not appear in the comparison.", Warning)
-        
-        comparison = comparison.merge(tmp_forecast, how='left')
 
-    return comparison
+def _step_errors(real: np.ndarray, matrix: np.ndarray, metric: str = 'MAPE') -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Computes the packs x steps error matrix, where step 1 is the first date forecasted by each pack
+
+    Args:
+     - real: actual values, aligned with the rows of matrix
+     - matrix: dates x packs matrix of forecasts, as returned by _align_packs
+     - metric: one of OBSERVED_METRICS, defines the error of each step:
+        absolute percentage error (MAPE, WMAPE), percentage error (MPE), absolute error (RMSE)
+        or absolute error scaled by the in-sample naive forecast error (MASE)
+
+    Returns:
+     - errors: packs x steps matrix with the error of each step (NaN where there is no forecast or actual value)
+     - first: row of the first forecast of each pack (-1 if the pack has no forecasts)
+     - predicted: packs x steps matrix with the forecasts
+     - actual: packs x steps matrix with the actual values
+    '''
+    if metric not in OBSERVED_METRICS:
+        raise ValueError(f"metric must be one of {', '.join(OBSERVED_METRICS)}, provided value was: {metric}.")
+
+    n_dates, n_packs = matrix.shape
+    has_forecast = ~np.isnan(matrix)
+    first = np.where(has_forecast.any(axis=0), has_forecast.argmax(axis=0), -1)
+
+    n_steps = int((n_dates - first[first >= 0]).max()) if (first >= 0).any() else 0
+    rows = first[:, None] + np.arange(n_steps)[None, :]
+    valid = (first[:, None] >= 0) & (rows < n_dates)
+    rows = np.where(valid, rows, 0)
 
+    predicted = np.where(valid, matrix[rows, np.arange(n_packs)[:, None]], np.nan)
+    actual = np.where(valid, real[rows], np.nan)
+
+    scale = None
+    if metric == 'MASE':
+        # Scale: mean absolute error of the naive forecast over the data available to each pack
+        with np.errstate(divide='ignore', invalid='ignore'):
+            naive_mae = _naive_mae(real)
+        scale = naive_mae[np.maximum(first - 1, 0)][:, None]
+
+    errors = _point_errors(predicted, actual, metric, scale=scale)
+
+    return errors, first, predicted, actual
+
+
+def _naive_mae(real: np.ndarray) -> np.ndarray:
+    '''
+    Mean absolute error of the naive (previous value) forecast up to each position of real
+    '''
+    naive_errors = np.abs(np.diff(real, prepend=np.nan))
+    return np.nancumsum(naive_errors) / np.cumsum(~np.isnan(naive_errors))
+
+
+def _point_errors(predicted: np.ndarray, actual: np.ndarray, metric: str, scale: np.ndarray = None) -> np.ndarray:
+    '''
+    Error of each forecast according to the metric: absolute percentage error (MAPE, WMAPE),
+    percentage error (MPE), absolute error (RMSE) or absolute error divided by scale (MASE)
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if metric in ['MAPE', 'WMAPE']:
+            return np.abs(predicted - actual) * 100 / actual
+        elif metric == 'MPE':
+            return (actual - predicted) * 100 / actual
+        elif metric == 'RMSE':
+            return np.abs(predicted - actual)
+        else:
+            return np.abs(predicted - actual) / scale
+
+
+def _observed_metric(errors: np.ndarray, actual: np.ndarray, metric: str, n_steps: int, cv_summary: str) -> np.ndarray:
+    '''
+    Aggregates the first n_steps of each row of the error matrix into the observed metric of each pack
+
+    Args:
+     - errors: packs x steps matrix, as returned by _step_errors
+     - actual: packs x steps matrix with the actual values
+     - metric: one of OBSERVED_METRICS
+     - n_steps: number of steps per windows, as used inside FaaS
+     - cv_summary: 'mean' or 'median'
+
+    Returns:
+     - observed: observed metric of each pack
+    '''
+    if cv_summary not in ['mean', 'median']:
+        raise ValueError(f"cv_summary must be 'mean' or 'median', provided value was: {cv_summary}.")
+
+    summary = np.nanmean if cv_summary == 'mean' else np.nanmedian
+    window = errors[:, :n_steps]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if metric == 'RMSE':
+                return np.sqrt(summary(window ** 2, axis=1))
+            elif metric == 'WMAPE':
+                window_actual = np.where(np.isnan(window), np.nan, actual[:, :n_steps])
+                return np.nansum(window * window_actual, axis=1) / np.nansum(np.abs(window_actual), axis=1)
+            else:
+                return summary(window, axis=1)
 
 
 def model_accuracy(packs: List[forecast], n_steps: int = 1, cv_summary: str = 'mean', metric: str = 'MAPE') -> dict:
@@ -48,66 +205,68 @@ def model_accuracy(packs: List[forecast], n_steps: int = 1, cv_summary: str = 'm
     - packs: List of forecast objects
     - n_steps: number of steps per windows, as used inside FaaS
     - cv_summary: 'mean' or 'median' depeding on the option used when modelling. How the window metrics are aggregated.
-    - metric: desired metric to be compared
+    - metric: desired metric to be compared, one of 'MAPE', 'WMAPE', 'RMSE', 'MPE' or 'MASE'
 
    Returns:
-    - plot_comparison: dictionary with different comparisons between forecasts and auxiliary information for plotting
+    - plot_comparison: dictionary with different comparisons between forecasts and auxiliary information for plotting,
+      including the packs x steps error matrix ('error_matrix')
     '''
 
+    dates, real, matrix, names = _align_packs(packs)
+    errors, first, _, actual = _step_errors(real, matrix, metric=metric)
+
+    # Only packs with forecasts (and positive values, as in the plots) are compared
+    keep = (np.nansum(matrix, axis=0) > 0) & (first >= 0)
+    kept = np.flatnonzero(keep)
+    pack_dates = [names[j] for j in kept]
+
     lineplot_list = []
+    if np.nansum(real) > 0:
+        lineplot_list.append([dates, pd.Series(real, index=dates, name='real'), 'real'])
+
     lineplot_dashed = []
+    for j in kept:
+        lineplot_list.append([dates, pd.Series(matrix[:, j], index=dates, name=names[j]), names[j]])
+        if first[j] >= 1:
+            conection = dates[first[j] - 1:first[j] + 1]
+            lineplot_dashed.append([conection, [real[first[j] - 1], matrix[first[j], j]], names[j]])
 
-    metric_list = [x.__getattribute__(metric) for x in packs]
-    forecast_comparison = compare_packs(packs)
-
-    forecast_comparison = forecast_comparison.set_index('data_tidy')
-
-    step_errors = pd.DataFrame(columns=['Step', 'Error', 'Pack Date'])
-    pointer = 0
-    real_metrics = []
-    for column in forecast_comparison.columns:
-        
-        if forecast_comparison[column].sum() > 0:
-        
-            lineplot_list.append([forecast_comparison.index, forecast_comparison[column], column])
-
-        if column != 'real': 
-            
-            if forecast_comparison[column].sum() > 0:
-                
-                primeiro_valor = forecast_comparison.reset_index()[column].first_valid_index()
-                conection = forecast_comparison.index[:(primeiro_valor+1)]
-                conection = conection[-2:]
-                pred_dates = forecast_comparison.index[(primeiro_valor):]
-                erro_pack = abs(forecast_comparison[column][pred_dates] - forecast_comparison['real'][pred_dates]) * 100/forecast_comparison['real'][pred_dates]
-                pack_step_errors = pd.DataFrame({'Step': ['Step ' + str(x) for x in range(1, len(pred_dates) + 1)], 'Error': erro_pack})
-                pack_step_errors['Pack Date'] = column
-                lineplot_dashed.append([conection, [forecast_comparison['real'][conection[0]], forecast_comparison[column][conection[1]]], column])
-
-                step_errors = pd.concat([step_errors, pack_step_errors])
-                real_metrics.append(metric_list[pointer])
-            
-            pointer += 1
- 
-    
-    metric_compare = step_errors[['Error', 'Pack Date']]
-    metric_compare['occurence'] = metric_compare.groupby('Pack Date').cumcount()+1
-    metric_compare = metric_compare.loc[metric_compare['occurence'] <= n_steps].groupby('Pack Date')['Error'].agg(cv_summary).reset_index()
+    n_pack_steps = len(dates) - first[kept]
+    step_labels = np.array(['Step ' + str(x) for x in range(1, errors.shape[1] + 1)])
+
+    error_matrix = pd.DataFrame(errors[kept], index=pd.Index(pack_dates, name='Pack Date'), columns=step_labels)
 
-    metric_compare[f'{metric} -  Cross-Validation'] = real_metrics
-    metric_compare.rename(columns={'Error': f'{metric} - Observed'}, inplace=True)
-    metric_compare = metric_compare.set_index('Pack Date').stack().reset_index().rename(columns={'level_1': 'Type', 0: metric})
+    # Long format of the error matrix, one row per step inside the data of each pack
+    in_range = np.arange(errors.shape[1])[None, :] < n_pack_steps[:, None]
+    pack_rows, step_cols = np.nonzero(in_range)
+    date_rows = first[kept][pack_rows] + step_cols
+    step_errors = pd.DataFrame(
+        {
+            'Step': step_labels[step_cols],
+            'Error': errors[kept][pack_rows, step_cols],
+            'Pack Date': np.array(pack_dates, dtype=object)[pack_rows],
+        },
+        index=dates[date_rows],
+    )
 
+    observed = _observed_metric(errors[kept], actual[kept], metric, n_steps, cv_summary)
+    cross_validation = [packs[j].__getattribute__(metric) for j in kept]
+
+    metric_compare = pd.DataFrame(
+        {
+            f'{metric} - Observed': observed,
+            f'{metric} -  Cross-Validation': cross_validation,
+        },
+        index=pd.Index(pack_dates, name='Pack Date'),
+    ).sort_index()
+    metric_compare = metric_compare.stack().reset_index().rename(columns={'level_1': 'Type', 0: metric})
 
     plot_comparison = {
         'lineplot': lineplot_list, 
         'lineplot_dashed': lineplot_dashed, 
         'metric_step': step_errors, 
-        'slope_plot': metric_compare
+        'slope_plot': metric_compare,
+        'error_matrix': error_matrix
         }
 
     return plot_comparison
-
-
-
-    
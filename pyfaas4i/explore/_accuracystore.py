@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+from pyfaas4i.forecastpack import forecast
+from pyfaas4i._checkimports import _LazyImport
+from pyfaas4i._packcache import _atomic_write
+from ._accuracy import OBSERVED_METRICS, _naive_mae, _observed_metric, _point_errors
+from typing import Dict, List, Set, Tuple, Union
+import json
+import os
+import warnings
+
+np = _LazyImport('numpy')
+pd = _LazyImport('pandas')
+
+
+_STORE_VERSION = 2
+
+# Vintages per chunk file: saving rewrites only the chunks of the vintages added or updated
+_CHUNK_VINTAGES = 256
+# Arrays with one row per vintage, kept in the chunk files
+_ROW_ARRAYS = ('forecast_dates', 'predicted', 'errors', 'observed', 'cross_validation')
+
+
+def _write_arrays(target: str, **arrays):
+    '''
+    Writes arrays to a .npz file, replacing it atomically
+    '''
+    def write(temp_path):
+        with open(temp_path, 'wb') as array_file:
+            np.savez(array_file, **arrays)
+
+    _atomic_write(target, write)
+
+
+def _lookup_values(dates: np.ndarray, values: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    '''
+    Values at the target dates, NaN where the date is missing (dates must be sorted)
+    '''
+    if len(dates) == 0:
+        return np.full(targets.shape, np.nan)
+
+    position = np.minimum(np.searchsorted(dates, targets), len(dates) - 1)
+    found = (dates[position] == targets) & ~np.isnat(targets)
+    return np.where(found, values[position], np.nan)
+
+
+class AccuracyStore:
+    '''
+    Accuracy of the successive vintages of a series, persisted in a .npz file and a folder of chunks.
+
+    The store keeps the forecasts of each vintage by step ahead, the actual values of the most recent
+    vintage and the error of every forecast. Appending a vintage only computes its own errors and the
+    errors of the vintages that forecasted dates whose actual values were added or revised, found through
+    an index of the stored forecasts by date, so the cost of a refresh does not grow with the number of
+    vintages already stored. The vintages are saved in chunks of _CHUNK_VINTAGES rows next to the .npz file
+    (in <path>.chunks), and a save only writes the chunks that changed.
+
+    Args:
+     - path: path of the .npz file, created on the first append if it does not exist
+     - metric: one of 'MAPE', 'WMAPE', 'RMSE', 'MPE' or 'MASE' (Default is 'MAPE')
+     - n_steps: number of steps per windows, as used inside FaaS (Default is 1)
+     - cv_summary: 'mean' or 'median' depeding on the option used when modelling (Default is 'mean')
+
+    Raises:
+     - ValueError: if the options are not valid or differ from the ones of an existing store
+    '''
+
+    def __init__(self, path: str, metric: str = 'MAPE', n_steps: int = 1, cv_summary: str = 'mean'):
+        if metric not in OBSERVED_METRICS:
+            raise ValueError(f"metric must be one of {', '.join(OBSERVED_METRICS)}, provided value was: {metric}.")
+        if cv_summary not in ['mean', 'median']:
+            raise ValueError(f"cv_summary must be 'mean' or 'median', provided value was: {cv_summary}.")
+
+        self.path = path
+        self.metric = metric
+        self.n_steps = n_steps
+        self.cv_summary = cv_summary
+
+        self.names = []
+        self._actual_dates = np.array([], dtype='datetime64[ns]')
+        self._actual = np.array([], dtype='float64')
+        self._forecast_dates = np.empty((0, 0), dtype='datetime64[ns]')
+        self._predicted = np.empty((0, 0), dtype='float64')
+        self._errors = np.empty((0, 0), dtype='float64')
+        self._observed = np.array([], dtype='float64')
+        self._cross_validation = np.array([], dtype='float64')
+        self._step_sum = np.array([], dtype='float64')
+        self._step_count = np.array([], dtype='int64')
+
+        # Files of the saved chunks and actual values, and what changed since they were written
+        self._chunk_files = []
+        self._actual_file = None
+        self._dirty_rows = set()
+        self._actual_dirty = False
+        # Rows forecasting each date (as int64 nanoseconds), built on first use
+        self._rows_by_date = None
+
+        if os.path.isfile(path):
+            self._load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _load(self):
+        with np.load(self.path, allow_pickle=False) as stored:
+            arrays = {key: stored[key] for key in stored.files}
+
+        meta = json.loads(str(arrays.pop('meta')))
+        for option in ['metric', 'n_steps', 'cv_summary']:
+            if meta[option] != getattr(self, option):
+                raise ValueError(f"The store at {self.path} was created with {option}={meta[option]!r}, provided value was: {getattr(self, option)!r}.")
+
+        self.names = [str(x) for x in arrays.pop('names')]
+
+        if meta.get('version', 1) < 2:
+            # Stores of the first version keep every array in the .npz file, they are split on the next save
+            for key, value in arrays.items():
+                setattr(self, f'_{key}', value)
+            self._dirty_rows = set(range(len(self.names)))
+            self._actual_dirty = True
+            return
+
+        self._step_sum = arrays['step_sum']
+        self._step_count = arrays['step_count']
+        self._chunk_files = meta['chunks']
+        self._actual_file = meta['actual']
+
+        if self._actual_file is not None:
+            with np.load(os.path.join(self._chunks_dir(), self._actual_file), allow_pickle=False) as stored:
+                self._actual_dates = stored['actual_dates']
+                self._actual = stored['actual']
+
+        chunks = []
+        for name in self._chunk_files:
+            with np.load(os.path.join(self._chunks_dir(), name), allow_pickle=False) as stored:
+                chunks.append({key: stored[key] for key in _ROW_ARRAYS})
+        if not chunks:
+            return
+
+        # Chunks saved before a vintage with more steps was added are narrower
+        n_steps = max([chunk['predicted'].shape[1] for chunk in chunks] + [len(self._step_sum)])
+
+        def stack(key, fill):
+            return np.concatenate([
+                np.pad(chunk[key], ((0, 0), (0, n_steps - chunk[key].shape[1])), constant_values=fill)
+                for chunk in chunks
+            ])
+
+        self._forecast_dates = stack('forecast_dates', np.datetime64('NaT'))
+        self._predicted = stack('predicted', np.nan)
+        self._errors = stack('errors', np.nan)
+        self._observed = np.concatenate([chunk['observed'] for chunk in chunks])
+        self._cross_validation = np.concatenate([chunk['cross_validation'] for chunk in chunks])
+
+    def _chunks_dir(self) -> str:
+        return os.path.abspath(self.path) + '.chunks'
+
+    def save(self):
+        '''
+        Writes the chunks of the vintages changed since the last save, then the .npz file referencing them,
+        replacing each file atomically
+        '''
+        folder = self._chunks_dir()
+        os.makedirs(folder, exist_ok=True)
+
+        # New files get new names, so the previous ones stay valid until the .npz file references the new ones
+        replaced = []
+        n_chunks = -(-len(self.names) // _CHUNK_VINTAGES)
+        chunk_files = self._chunk_files + [None] * (n_chunks - len(self._chunk_files))
+        for chunk in sorted({row // _CHUNK_VINTAGES for row in self._dirty_rows}):
+            rows = slice(chunk * _CHUNK_VINTAGES, (chunk + 1) * _CHUNK_VINTAGES)
+            name = f'chunk{chunk:05d}-{os.urandom(4).hex()}.npz'
+            _write_arrays(os.path.join(folder, name), **{key: getattr(self, f'_{key}')[rows] for key in _ROW_ARRAYS})
+            replaced.append(chunk_files[chunk])
+            chunk_files[chunk] = name
+
+        actual_file = self._actual_file
+        if self._actual_dirty:
+            actual_file = f'actual-{os.urandom(4).hex()}.npz'
+            _write_arrays(os.path.join(folder, actual_file), actual_dates=self._actual_dates, actual=self._actual)
+            replaced.append(self._actual_file)
+
+        meta = {
+            'version': _STORE_VERSION,
+            'metric': self.metric,
+            'n_steps': self.n_steps,
+            'cv_summary': self.cv_summary,
+            'chunks': chunk_files,
+            'actual': actual_file,
+        }
+        _write_arrays(
+            os.path.abspath(self.path),
+            meta=np.array(json.dumps(meta)),
+            names=np.array(self.names, dtype=str),
+            step_sum=self._step_sum,
+            step_count=self._step_count,
+        )
+
+        self._chunk_files = chunk_files
+        self._actual_file = actual_file
+        self._dirty_rows = set()
+        self._actual_dirty = False
+
+        for name in replaced:
+            if name is not None and os.path.exists(os.path.join(folder, name)):
+                os.remove(os.path.join(folder, name))
+
+    def _date_index(self) -> Dict[int, Set[int]]:
+        '''
+        Rows of the store forecasting each date, keyed by the date as int64 nanoseconds
+        '''
+        if self._rows_by_date is None:
+            rows, steps = np.nonzero(~np.isnat(self._forecast_dates))
+            dates = self._forecast_dates[rows, steps].view('int64')
+            order = np.argsort(dates, kind='stable')
+            dates, rows = dates[order], rows[order].tolist()
+            starts = (np.flatnonzero(np.diff(dates)) + 1).tolist()
+            self._rows_by_date = {
+                date: set(rows[start:end])
+                for date, start, end in zip(dates[[0] + starts].tolist(), [0] + starts, starts + [len(rows)])
+            } if len(rows) else {}
+        return self._rows_by_date
+
+    def _index_row(self, row: int, add: bool):
+        '''
+        Adds or removes the forecast dates of a row from the date index, if it was built
+        '''
+        if self._rows_by_date is None:
+            return
+        dates = self._forecast_dates[row]
+        for date in dates[~np.isnat(dates)].view('int64').tolist():
+            if add:
+                self._rows_by_date.setdefault(date, set()).add(row)
+            else:
+                self._rows_by_date.get(date, set()).discard(row)
+
+    def _resize(self, n_packs: int, n_steps: int):
+        '''
+        Grows the packs x steps arrays, padding with missing values
+        '''
+        old_packs, old_steps = self._predicted.shape
+        if n_packs <= old_packs and n_steps <= old_steps:
+            return
+
+        n_packs, n_steps = max(n_packs, old_packs), max(n_steps, old_steps)
+
+        def grow(array, fill):
+            grown = np.full((n_packs, n_steps), fill, dtype=array.dtype)
+            grown[:old_packs, :old_steps] = array
+            return grown
+
+        self._forecast_dates = grow(self._forecast_dates, np.datetime64('NaT'))
+        self._predicted = grow(self._predicted, np.nan)
+        self._errors = grow(self._errors, np.nan)
+
+        self._observed = np.concatenate([self._observed, np.full(n_packs - old_packs, np.nan)])
+        self._cross_validation = np.concatenate([self._cross_validation, np.full(n_packs - old_packs, np.nan)])
+        self._step_sum = np.concatenate([self._step_sum, np.zeros(n_steps - old_steps)])
+        self._step_count = np.concatenate([self._step_count, np.zeros(n_steps - old_steps, dtype='int64')])
+
+    def _set_actuals(self, dates: np.ndarray, values: np.ndarray) -> np.ndarray:
+        '''
+        Replaces the actual values by the in-sample data of a newer pack
+
+        Returns:
+         - changed: dates whose actual value was added, removed or revised
+        '''
+        if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+            order = np.argsort(dates, kind='stable')
+            dates, values = dates[order], values[order]
+
+        n_old = len(self._actual_dates)
+        if len(dates) >= n_old and np.array_equal(dates[:n_old], self._actual_dates):
+            # Usual refresh: the same dates followed by new ones, compared position by position
+            old_values, new_values = self._actual, values[:n_old]
+            revised = ~((old_values == new_values) | (np.isnan(old_values) & np.isnan(new_values)))
+            changed = np.concatenate([dates[:n_old][revised], dates[n_old:][~np.isnan(values[n_old:])]])
+        else:
+            union = np.union1d(self._actual_dates, dates)
+            old_values = _lookup_values(self._actual_dates, self._actual, union)
+            new_values = _lookup_values(dates, values, union)
+            changed = union[~((old_values == new_values) | (np.isnan(old_values) & np.isnan(new_values)))]
+
+        if len(changed) or len(dates) != n_old or not np.array_equal(dates, self._actual_dates):
+            self._actual_dirty = True
+        self._actual_dates = dates
+        self._actual = values
+
+        return changed
+
+    def _add_pack(self, pack: forecast, replace: bool) -> Tuple[int, np.ndarray]:
+        '''
+        Stores the forecasts of a pack and, when its data is the most recent one, its actual values
+
+        Returns:
+         - row: position of the pack in the store
+         - changed: dates whose actual value was added, removed or revised
+        '''
+        table = pack.forecast
+        dates = pd.to_datetime(np.asarray(table['data_tidy'])).to_numpy(dtype='datetime64[ns]')
+        values = np.asarray(table['y_all'], dtype='float64')
+        out_sample = np.asarray(table['type'] == 'out_sample', dtype=bool)
+
+        if not out_sample.any():
+            raise ValueError("The pack has no out-of-sample forecasts.")
+
+        order = np.argsort(dates[out_sample], kind='stable')
+        forecast_dates = dates[out_sample][order]
+        predicted = values[out_sample][order]
+
+        name = pd.Timestamp(forecast_dates[0]).strftime('%Y-%m-%d')
+        if name in self.names:
+            if not replace:
+                raise ValueError(f"The vintage {name} is already in the store, use replace=True to overwrite it.")
+            row = self.names.index(name)
+        else:
+            row = len(self.names)
+            self.names.append(name)
+
+        self._resize(row + 1, len(forecast_dates))
+        self._index_row(row, add=False)
+        self._forecast_dates[row] = np.datetime64('NaT')
+        self._forecast_dates[row, :len(forecast_dates)] = forecast_dates
+        self._index_row(row, add=True)
+        self._predicted[row] = np.nan
+        self._predicted[row, :len(predicted)] = predicted
+        self._cross_validation[row] = pack.__getattribute__(self.metric)
+
+        changed = np.array([], dtype='datetime64[ns]')
+        in_dates = dates[~out_sample]
+        if len(in_dates) and (len(self._actual_dates) == 0 or in_dates.max() >= self._actual_dates.max()):
+            changed = self._set_actuals(in_dates, values[~out_sample])
+
+        return row, changed
+
+    def _update_rows(self, rows: np.ndarray):
+        '''
+        Recomputes the errors and observed metric of some packs, updating the running step aggregates
+        '''
+        forecast_dates = self._forecast_dates[rows]
+        actual = _lookup_values(self._actual_dates, self._actual, forecast_dates)
+
+        scale = None
+        if self.metric == 'MASE':
+            # Scale: mean absolute error of the naive forecast over the data available to each pack
+            if len(self._actual):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    naive_mae = _naive_mae(self._actual)
+                first = np.searchsorted(self._actual_dates, forecast_dates[:, 0])
+                scale = naive_mae[np.clip(first - 1, 0, len(naive_mae) - 1)][:, None]
+            else:
+                scale = np.nan
+
+        errors = _point_errors(self._predicted[rows], actual, self.metric, scale=scale)
+
+        # Only finite errors enter the running aggregates (zero actual values give infinite errors)
+        old_errors = self._errors[rows]
+        old_finite, new_finite = np.isfinite(old_errors), np.isfinite(errors)
+        self._step_sum += np.where(new_finite, errors, 0).sum(axis=0) - np.where(old_finite, old_errors, 0).sum(axis=0)
+        self._step_count += new_finite.sum(axis=0) - old_finite.sum(axis=0)
+
+        self._errors[rows] = errors
+        self._observed[rows] = _observed_metric(errors, actual, self.metric, self.n_steps, self.cv_summary)
+        self._dirty_rows.update(rows.tolist())
+
+    def append(self, packs: Union[forecast, List[forecast]], replace: bool = False, save: bool = True) -> List[str]:
+        '''
+        Adds new vintages to the store, computing only the errors that depend on them
+
+        Args:
+         - packs: forecast object or list of forecast objects
+         - replace: whether a vintage already in the store is overwritten (Default is False)
+         - save: whether the store is written to its path after the update (Default is True)
+
+        Returns:
+         - names: names of the appended vintages, the first date of their forecasts
+
+        Raises:
+         - ValueError: if a pack has no out-of-sample forecasts or its vintage is already stored and replace is False
+        '''
+        if isinstance(packs, forecast):
+            packs = [packs]
+
+        rows = []
+        changed = []
+        for pack in packs:
+            row, changed_dates = self._add_pack(pack, replace)
+            rows.append(row)
+            changed.append(changed_dates)
+
+        affected = set(rows)
+
+        changed = np.concatenate(changed) if changed else np.array([], dtype='datetime64[ns]')
+        if len(changed):
+            rows_by_date = self._date_index()
+            for date in np.unique(changed).view('int64').tolist():
+                affected |= rows_by_date.get(date, set())
+            if self.metric == 'MASE':
+                # Revised history changes the scale of every pack forecasting after it
+                affected.update(np.flatnonzero(self._forecast_dates[:, 0] > changed.min()).tolist())
+
+        self._update_rows(np.array(sorted(affected), dtype=int))
+
+        if save:
+            self.save()
+
+        return [self.names[i] for i in rows]
+
+    def _pack_order(self) -> np.ndarray:
+        '''
+        Positions of the stored packs with at least one error, sorted by vintage
+        '''
+        has_errors = ~np.isnan(self._errors).all(axis=1) if self._errors.size else np.zeros(len(self.names), dtype=bool)
+        return np.array([i for i in np.argsort(self.names, kind='stable') if has_errors[i]], dtype=int)
+
+    def error_matrix(self) -> pd.DataFrame:
+        '''
+        Error of each vintage (rows) per step ahead (columns), as the 'error_matrix' of model_accuracy()
+
+        Returns:
+         - error_matrix: dataframe indexed by 'Pack Date'
+        '''
+        order = self._pack_order()
+        return pd.DataFrame(
+            self._errors[order],
+            index=pd.Index([self.names[i] for i in order], name='Pack Date'),
+            columns=['Step ' + str(x) for x in range(1, self._errors.shape[1] + 1)],
+        )
+
+    def metric_compare(self) -> pd.DataFrame:
+        '''
+        Observed and cross-validation metric of each vintage, as the 'slope_plot' of model_accuracy()
+
+        Returns:
+         - metric_compare: long-format dataframe with the columns 'Pack Date', 'Type' and the metric
+        '''
+        order = self._pack_order()
+        metric_compare = pd.DataFrame(
+            {
+                f'{self.metric} - Observed': self._observed[order],
+                f'{self.metric} -  Cross-Validation': self._cross_validation[order],
+            },
+            index=pd.Index([self.names[i] for i in order], name='Pack Date'),
+        )
+        return metric_compare.stack().reset_index().rename(columns={'level_1': 'Type', 0: self.metric})
+
+    def step_summary(self) -> pd.Series:
+        '''
+        Errors per step ahead aggregated over all vintages with cv_summary. The mean is kept up to date
+        on every append, ignoring non-finite errors; the median is computed from the stored errors
+
+        Returns:
+         - summary: series indexed by step
+        '''
+        index = pd.Index(['Step ' + str(x) for x in range(1, len(self._step_sum) + 1)], name='Step')
+
+        if self.cv_summary == 'mean':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = self._step_sum / self._step_count
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                values = np.nanmedian(np.where(np.isfinite(self._errors), self._errors, np.nan), axis=0)
+
+        return pd.Series(values, index=index, name=self.metric)
+
+    def comparison(self) -> pd.DataFrame:
+        '''
+        Forecasts of each vintage aligned with the actual values, as returned by compare_packs()
+
+        Returns:
+         - comparison: dataframe with the dates, the actual values and one column per vintage
+        '''
+        order = np.argsort(self.names, kind='stable')
+        dates = pd.DatetimeIndex(self._actual_dates, name='data_tidy')
+
+        matrix = np.full((len(dates), len(order)), np.nan)
+        positions = dates.get_indexer(self._forecast_dates[order].ravel()).reshape(self._forecast_dates[order].shape)
+        pack_rows, step_cols = np.nonzero(positions >= 0)
+        matrix[positions[pack_rows, step_cols], pack_rows] = self._predicted[order][pack_rows, step_cols]
+
+        comparison = pd.DataFrame(matrix, columns=[self.names[i] for i in order])
+        comparison.insert(0, 'real', self._actual)
+        comparison.insert(0, 'data_tidy', dates)
+
+        return comparison
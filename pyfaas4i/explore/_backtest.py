@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Tuple
+
+from pyfaas4i._checkimports import _LazyImport
+from pyfaas4i.collection import ForecastCollection
+from ._accuracy import OBSERVED_METRICS, _naive_mae, _observed_metric, _point_errors
+
+np = _LazyImport("numpy")
+pd = _LazyImport("pandas")
+
+
+class BacktestResult:
+    """
+    Observed accuracy of many series, vintages and model types, as computed by backtest().
+
+    Attributes:
+        series: names of the series (first axis)
+        vintages: dates of the vintages (second axis)
+        model_types: model types (third axis)
+        steps: steps ahead (fourth axis)
+        errors: series x vintages x model types x steps array with the error of each forecast
+        observed: series x vintages x model types array with the observed metric of the first n_steps forecasts,
+                  aggregated as in the cross-validation (cv_summary)
+        cross_validation: series x vintages x model types array with the cross-validation metric of the selected models
+        models: series x vintages x model types array with the index of the selected model in each pack (-1 if missing)
+        metric: metric used in the errors
+        cv_summary: 'mean' or 'median', how the errors are aggregated
+    """
+
+    def __init__(self, series, vintages, model_types, steps, errors, observed,
+                 cross_validation, models, metric, cv_summary):
+        self.series = series
+        self.vintages = vintages
+        self.model_types = model_types
+        self.steps = steps
+        self.errors = errors
+        self.observed = observed
+        self.cross_validation = cross_validation
+        self.models = models
+        self.metric = metric
+        self.cv_summary = cv_summary
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Long-format dataframe with the error of each series, vintage, model type and step (missing errors are dropped)
+        """
+        index = np.nonzero(~np.isnan(self.errors))
+        return pd.DataFrame(
+            {
+                "series": np.asarray(self.series, dtype=object)[index[0]],
+                "vintage": np.asarray(self.vintages)[index[1]],
+                "model_type": np.asarray(self.model_types, dtype=object)[index[2]],
+                "step": np.asarray(self.steps)[index[3]],
+                self.metric: self.errors[index],
+            }
+        )
+
+    def observed_frame(self) -> pd.DataFrame:
+        """
+        Long-format dataframe with the observed and cross-validation metrics of each series, vintage and model type
+        """
+        index = np.nonzero(self.models >= 0)
+        return pd.DataFrame(
+            {
+                "series": np.asarray(self.series, dtype=object)[index[0]],
+                "vintage": np.asarray(self.vintages)[index[1]],
+                "model_type": np.asarray(self.model_types, dtype=object)[index[2]],
+                "model": self.models[index],
+                f"{self.metric} - Observed": self.observed[index],
+                f"{self.metric} -  Cross-Validation": self.cross_validation[index],
+            }
+        )
+
+    def summary(self, by: str = "model_type") -> pd.DataFrame:
+        """
+        Errors per step ahead, aggregated with cv_summary over all other axes
+
+        Args:
+            by: 'model_type' or 'series', the axis kept in the rows (Default is 'model_type')
+        Returns:
+            summary: dataframe with one row per model type (or series) and one column per step
+        """
+        if by not in ["model_type", "series"]:
+            raise ValueError(f"by must be 'model_type' or 'series', provided value was: {by}.")
+
+        summary_function = np.nanmean if self.cv_summary == "mean" else np.nanmedian
+        axis = (0, 1) if by == "model_type" else (1, 2)
+        labels = self.model_types if by == "model_type" else self.series
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            values = summary_function(self.errors, axis=axis)
+
+        return pd.DataFrame(
+            values,
+            index=pd.Index(labels, name=by),
+            columns=[f"Step {x}" for x in self.steps],
+        )
+
+
+def _selected_models(metrics: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """
+    Best model of each model type in each pack according to the cross-validation metric
+    """
+    ranking = metrics[metric].abs() if metric == "MPE" else metrics[metric]
+    order = np.argsort(ranking.to_numpy(), kind="stable")
+    return metrics.iloc[order].drop_duplicates(["series", "vintage", "model_type"])
+
+
+def _reference_actuals(actuals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Actual values of each series, taken from its pack whose in-sample data ends last
+    """
+    last_dates = actuals.groupby(["series", "vintage"], observed=True)["data_tidy"].max().reset_index()
+    last_dates = last_dates.sort_values(["data_tidy", "vintage"], kind="stable").drop_duplicates("series", keep="last")
+
+    reference = actuals.merge(last_dates[["series", "vintage"]], on=["series", "vintage"], how="inner")
+    return reference[["series", "data_tidy", "y_all"]].sort_values(["series", "data_tidy"], kind="stable")
+
+
+def _backtest_shard(
+    metrics: pd.DataFrame,
+    forecasts: pd.DataFrame,
+    actuals: pd.DataFrame,
+    series: List[str],
+    vintages: np.ndarray,
+    model_types: List[str],
+    max_steps: int,
+    metric: str,
+    n_steps: int,
+    cv_summary: str,
+    dtype: str,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the dense error, observed, cross-validation and model arrays for a subset of the series
+    """
+    shape = (len(series), len(vintages), len(model_types))
+    errors = np.full(shape + (max_steps,), np.nan, dtype=dtype)
+    actual_values = np.full(shape + (max_steps,), np.nan, dtype=dtype)
+    cross_validation = np.full(shape, np.nan, dtype=dtype)
+    models = np.full(shape, -1, dtype=np.int32)
+
+    selected = _selected_models(metrics, metric)
+    s_index = pd.Index(series).get_indexer(selected["series"].astype(object))
+    v_index = pd.Index(vintages).get_indexer(selected["vintage"])
+    t_index = pd.Index(model_types).get_indexer(selected["model_type"].astype(object))
+    cross_validation[s_index, v_index, t_index] = selected[metric].to_numpy()
+    models[s_index, v_index, t_index] = selected["model"].to_numpy()
+
+    selected = selected[["series", "vintage", "model", "model_type"]]
+    rows = forecasts.merge(selected, on=["series", "vintage", "model"], how="inner")
+
+    reference = _reference_actuals(actuals)
+    rows = rows.merge(
+        reference.rename(columns={"y_all": "actual"}), on=["series", "data_tidy"], how="left"
+    )
+
+    scale = None
+    if metric == "MASE":
+        # In-sample naive error available at each vintage: up to the date before the vintage
+        with np.errstate(divide="ignore", invalid="ignore"):
+            reference["scale"] = reference.groupby("series", observed=True)["y_all"].transform(
+                lambda values: _naive_mae(values.to_numpy(dtype=float))
+            )
+        rows = rows.sort_values("vintage", kind="stable")
+        rows = pd.merge_asof(
+            rows,
+            reference[["series", "data_tidy", "scale"]].rename(columns={"data_tidy": "scale_date"}).sort_values("scale_date"),
+            left_on="vintage",
+            right_on="scale_date",
+            by="series",
+            allow_exact_matches=False,
+        )
+        scale = rows["scale"].to_numpy(dtype=float)
+
+    point_errors = _point_errors(rows["y_all"].to_numpy(dtype=float), rows["actual"].to_numpy(dtype=float), metric, scale=scale)
+
+    s_index = pd.Index(series).get_indexer(rows["series"].astype(object))
+    v_index = pd.Index(vintages).get_indexer(rows["vintage"])
+    t_index = pd.Index(model_types).get_indexer(rows["model_type"].astype(object))
+    h_index = rows["step"].to_numpy(dtype=int) - 1
+
+    errors[s_index, v_index, t_index, h_index] = point_errors
+    actual_values[s_index, v_index, t_index, h_index] = rows["actual"].to_numpy(dtype=float)
+
+    observed = _observed_metric(
+        errors.reshape(-1, max_steps), actual_values.reshape(-1, max_steps), metric, n_steps, cv_summary
+    ).reshape(shape)
+
+    return errors, observed.astype(dtype), cross_validation, models
+
+
+def backtest(
+    collection: ForecastCollection,
+    n_steps: int = 1,
+    cv_summary: str = "mean",
+    metric: str = "MAPE",
+    workers: int = 1,
+    executor: str = "process",
+    dtype: str = "float64",
+) -> BacktestResult:
+    """
+    Rolling-origin accuracy of many series and vintages: compares the forecasts of every vintage with the actual
+    values of the most recent pack of each series, for the best model (by the cross-validation metric) of each model type.
+
+    Args:
+        collection: ForecastCollection with the packs of all series and vintages
+        n_steps: number of steps per windows, as used inside FaaS (Default is 1)
+        cv_summary: 'mean' or 'median' depeding on the option used when modelling. How the window metrics are aggregated. (Default is 'mean')
+        metric: desired metric to be compared, one of 'MAPE', 'WMAPE', 'RMSE', 'MPE' or 'MASE' (Default is 'MAPE')
+        workers: number of shards of series computed in parallel (Default is 1)
+        executor: 'process' or 'thread', the pool used when workers is greater than 1 (Default is 'process')
+        dtype: 'float64' or 'float32', type of the returned arrays (Default is 'float64')
+
+    Returns:
+        result: BacktestResult with the series x vintages x model types x steps error array and its aggregations
+
+    Raises:
+        ValueError: if metric, cv_summary or executor are not valid options
+    """
+    if metric not in OBSERVED_METRICS:
+        raise ValueError(f"metric must be one of {', '.join(OBSERVED_METRICS)}, provided value was: {metric}.")
+    if cv_summary not in ["mean", "median"]:
+        raise ValueError(f"cv_summary must be 'mean' or 'median', provided value was: {cv_summary}.")
+    if executor not in ["process", "thread"]:
+        raise ValueError(f"executor must be 'process' or 'thread', provided value was: {executor}.")
+
+    metrics = collection.metrics
+    forecasts = collection.forecasts_table
+    actuals = collection.actuals
+
+    series = list(metrics["series"].astype(object).unique())
+    vintages = np.array(sorted(metrics["vintage"].dropna().unique()))
+    model_types = sorted(metrics["model_type"].astype(object).unique())
+    max_steps = int(forecasts["step"].max()) if len(forecasts) else 0
+    steps = list(range(1, max_steps + 1))
+
+    def shard_arguments(shard_series):
+        return (
+            metrics.loc[metrics["series"].isin(shard_series)],
+            forecasts.loc[forecasts["series"].isin(shard_series)],
+            actuals.loc[actuals["series"].isin(shard_series)],
+            shard_series, vintages, model_types, max_steps, metric, n_steps, cv_summary, dtype,
+        )
+
+    if workers <= 1 or len(series) <= 1:
+        shards = [_backtest_shard(*shard_arguments(series))]
+    else:
+        n_shards = min(workers, len(series))
+        shard_series = [list(x) for x in np.array_split(np.array(series, dtype=object), n_shards)]
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=n_shards) as pool:
+            futures = [pool.submit(_backtest_shard, *shard_arguments(x)) for x in shard_series]
+            shards = [future.result() for future in futures]
+        series = [name for x in shard_series for name in x]
+
+    errors, observed, cross_validation, models = (
+        np.concatenate([shard[i] for shard in shards], axis=0) for i in range(4)
+    )
+
+    return BacktestResult(
+        series=series,
+        vintages=list(pd.to_datetime(vintages)),
+        model_types=model_types,
+        steps=steps,
+        errors=errors,
+        observed=observed,
+        cross_validation=cross_validation,
+        models=models,
+        metric=metric,
+        cv_summary=cv_summary,
+    )
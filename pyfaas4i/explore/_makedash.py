@@ -1,75 +1,121 @@
 import glob
-from typing import List
+import html
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Union
 
-from pyfaas4i.forecastpack import forecast
+from pyfaas4i import profiling, tracing
+from pyfaas4i._checkimports import _LazyImport
+from pyfaas4i.forecastpack import forecast, PackReadError
 from ._accuracy import model_accuracy
-from ._importplotly import _imports
+from ._importplotly import _plotly_imports
 
-if _imports.is_successful():
-    import plotly.express as px
-    import plotly.graph_objects as go
-    from plotly.subplots import make_subplots
+# plotly is only imported when a dashboard is built
+px = _LazyImport('plotly.express')
+go = _LazyImport('plotly.graph_objects')
+subplots = _LazyImport('plotly.subplots')
+offline = _LazyImport('plotly.offline')
 
+# Up to this number of forecastpacks, starting worker processes costs more than parsing them in threads
+_THREAD_MAX_PACKS = 4
 
-def get_dashboard(base_path: List[forecast], target_path: str, metric: str = 'MAPE', cv_summary: str = 'mean', verbose: bool=True):
+
+def _load_packs(base_path: str, workers: int = None, cache: Union[bool, str] = False,
+                executor: str = None) -> List[forecast]:
     '''
-    This function saves a HTML dashboard with the comparison between different forecast objects for the same series.
+    Reads every forecastpack in a folder concurrently, in the order of the file names
 
     Args:
      - base_path: folder where the forecastpacks are located (no other file should be in the folder).
-     - target_path: where the dashboard should be saved, including file name and html extension.
-     - metric: desired metric to be compared.
-     - cv_summary: 'mean' or 'median' depeding on the option used when modelling. How the window metrics are aggregated.
-     - verbose: whether a message stating the saved path will be saved or not.
+     - workers: number of parallel workers (Default is the number of CPUs)
+     - cache: False to disable the cache, True to use the default folder or the path of a folder
+     - executor: 'process' or 'thread', see forecast.read_many() (Default is 'thread' for a single worker or
+       a few forecastpacks, 'process' otherwise)
+
+    Returns:
+     - packs: list of forecast objects
+
+    Raises:
+     - PackReadError: if any of the files could not be read
     '''
+    file_list = sorted(glob.glob(base_path + '*'))
+    if not file_list:
+        raise ValueError(f"No forecastpack was found in {base_path}.")
 
-    _imports.check()
-    file_list = glob.glob(base_path + '*')
-    lista_teste = []
+    if executor is None:
+        executor = 'thread' if workers == 1 or len(file_list) <= _THREAD_MAX_PACKS else 'process'
 
-    for i in file_list:
-        if i.endswith('.json'):
-            temp = forecast.readJSON(i)
-        else:
-            temp = forecast.readRDS(i)
+    packs = forecast.read_many(file_list, workers=workers, cache=cache, executor=executor)
+    for pack in packs:
+        if isinstance(pack, PackReadError):
+            raise pack
 
-        lista_teste.append(temp)
+    return packs
 
-    n_steps, _ = temp.steps_and_windows()
-    
-    plot_dict = model_accuracy(lista_teste, n_steps= n_steps, cv_summary=cv_summary, metric=metric) # TODO: Trocar nome da variavel
 
+def _build_dashboard(plot_dict: dict, metric: str, webgl_threshold: int):
+    '''
+    Builds the dashboard figure from the output of model_accuracy, adding the traces of each subplot in bulk
+
+    Args:
+     - plot_dict: dictionary returned by model_accuracy
+     - metric: metric being compared
+     - webgl_threshold: number of points above which the traces are rendered with WebGL (Scattergl)
+
+    Returns:
+     - dash: plotly figure
+    '''
+    metric_step = plot_dict['metric_step']
+    slope_plot = plot_dict['slope_plot']
+    pack_dates = metric_step['Pack Date'].drop_duplicates().to_list()
+
+    # Colors are cycled, so any number of packs can be plotted
     color_list = px.colors.qualitative.Plotly
-    pack_names = plot_dict['metric_step']['Pack Date'].drop_duplicates().to_list() + ['real', 'Median error']
-    color_dict = dict(zip(pack_names, color_list[:len(pack_names)]))
+    pack_names = pack_dates + ['real', 'Median error']
+    color_dict = {name: color_list[i % len(color_list)] for i, name in enumerate(pack_names)}
 
+    n_points = (
+        sum(min(len(series[0]), 8) for series in plot_dict['lineplot'])
+        + 2 * len(plot_dict['lineplot_dashed'])
+        + len(metric_step)
+        + len(slope_plot)
+    )
+    scatter = go.Scattergl if n_points > webgl_threshold else go.Scatter
 
-    dash = make_subplots(rows=2, cols=2, specs = [[{"colspan": 2}, None], [{}, {}]], 
+    dash = subplots.make_subplots(rows=2, cols=2, specs = [[{"colspan": 2}, None], [{}, {}]],
             subplot_titles=('Series Accuracy', 'Model error per step outside original sample', "Error Comparison"))
 
+    traces, rows, cols = [], [], []
+
+    def add(trace, row, col):
+        traces.append(trace)
+        rows.append(row)
+        cols.append(col)
+
     for series in plot_dict['lineplot']:
-        dash.add_trace(go.Scatter(x=series[0][-8:], y=series[1][-8:], name=series[2], legendgroup=series[2], marker_color = color_dict[series[2]], mode='lines+markers'), row=1, col=1)
+        add(scatter(x=series[0][-8:], y=series[1][-8:], name=series[2], legendgroup=series[2], marker_color = color_dict[series[2]], mode='lines+markers'), 1, 1)
     for dashes in plot_dict['lineplot_dashed']:
-        dash.add_trace(go.Scatter(x=dashes[0], y=dashes[1], mode='lines', legendgroup=dashes[2], showlegend=False, line={'dash': 'dash', 'color': 'gray'}), row=1, col=1)
+        add(scatter(x=dashes[0], y=dashes[1], mode='lines', legendgroup=dashes[2], showlegend=False, line={'dash': 'dash', 'color': 'gray'}), 1, 1)
 
+    step_groups = metric_step.groupby('Pack Date', sort=False)
+    slope_groups = slope_plot.groupby('Pack Date', sort=False)
+    for pack_date in pack_dates:
+        plot_points = step_groups.get_group(pack_date)
+        add(scatter(x=plot_points['Step'], y=plot_points['Error'], mode = 'markers', name = pack_date, marker_color = color_dict[pack_date], legendgroup = pack_date, showlegend=False), 2, 1)
 
+        date_slope = slope_groups.get_group(pack_date)
+        add(scatter(x=date_slope['Type'], y=date_slope.iloc[:,-1], mode='lines+markers', name = pack_date, marker_color = color_dict[pack_date], legendgroup = pack_date, showlegend=False), 2, 2)
 
-    median_agg = plot_dict['metric_step'].groupby('Step')['Error'].median().reset_index()
-    for pack_date in plot_dict['metric_step']['Pack Date'].drop_duplicates():
-        plot_points = plot_dict['metric_step']
-        plot_points = plot_points.loc[plot_points['Pack Date'] == pack_date]
-        dash.add_trace(go.Scatter(x=plot_points['Step'], y=plot_points['Error'], mode = 'markers', name = pack_date, marker_color = color_dict[pack_date], legendgroup = pack_date, showlegend=False), row=2, col=1)
+    median_agg = metric_step.groupby('Step')['Error'].median().reset_index()
+    add(scatter(x=median_agg['Step'], y=median_agg['Error'], mode='lines+markers', name='Median error', marker_color = color_dict['Median error']), 2, 1)
 
-        date_slope = plot_dict['slope_plot']
-        date_slope = date_slope.loc[date_slope['Pack Date'] == pack_date]
-        dash.add_trace(go.Scatter(x=date_slope['Type'], y=date_slope.iloc[:,-1], mode='lines+markers', name = pack_date, marker_color = color_dict[pack_date], legendgroup = pack_date, showlegend=False), row=2, col=2)
+    dash.add_traces(traces, rows=rows, cols=cols)
 
-    dash.add_trace(go.Scatter(x=median_agg['Step'], y=median_agg['Error'], mode='lines+markers', name='Median error', marker_color = color_dict['Median error']), row=2, col=1)
-    
     dash.update_xaxes(categoryorder='array', categoryarray = [f'{metric} -  Cross-Validation', f'{metric} - Observed'], row=2, col=2)
     dash.update_layout(showlegend=True)
 
-        
     dash.update_yaxes(title_text="Series Values", row=1, col=1)
     dash.update_yaxes(title_text=f"{metric}", row=2, col=1)
     dash.update_yaxes(title_text=f"{metric}", row=2, col=2)
@@ -78,9 +124,183 @@ def get_dashboard(base_path: List[forecast], target_path: str, metric: str = 'MA
 
     dash.update_layout(title_text="Model Accuracy - Dashboard (Alpha Version)", title_x=0.5)
 
+    return dash
+
 
-    dash.write_html(target_path)
+@profiling.profiled('explore.get_dashboard')
+def get_dashboard(base_path: str, target_path: str, metric: str = 'MAPE', cv_summary: str = 'mean', verbose: bool=True,
+                  workers: int = None, cache: Union[bool, str] = False, webgl_threshold: int = 1000,
+                  include_plotlyjs: Union[bool, str] = True, executor: str = None) -> Dict[str, float]:
+    '''
+    This function saves a HTML dashboard with the comparison between different forecast objects for the same series.
+
+    Args:
+     - base_path: folder where the forecastpacks are located (no other file should be in the folder).
+     - target_path: where the dashboard should be saved, including file name and html extension.
+     - metric: desired metric to be compared.
+     - cv_summary: 'mean' or 'median' depeding on the option used when modelling. How the window metrics are aggregated.
+     - verbose: whether a message stating the saved path and the time of each phase will be printed or not.
+     - workers: number of parallel workers reading the forecastpacks (Default is the number of CPUs).
+     - cache: False to disable the cache of converted forecastpacks, True to use the default folder or the path of a folder.
+     - webgl_threshold: number of points above which the plots are rendered with WebGL.
+     - include_plotlyjs: how plotly.js is included in the HTML, as in plotly's write_html (e.g. True to embed it
+       or the path of a shared plotly.min.js file).
+     - executor: 'process' or 'thread', the pool reading the forecastpacks (Default is 'thread' for a single
+       worker or a few forecastpacks, 'process' otherwise).
+
+    Returns:
+     - timings: seconds spent in each phase ('load', 'compute', 'render' and 'write')
+    '''
+
+    _plotly_imports().check()
+    timings = {}
+
+    start = time.perf_counter()
+    with tracing.span('dashboard.load'):
+        packs = _load_packs(base_path, workers=workers, cache=cache, executor=executor)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with tracing.span('dashboard.compute'):
+        n_steps, _ = packs[-1].steps_and_windows()
+        plot_dict = model_accuracy(packs, n_steps= n_steps, cv_summary=cv_summary, metric=metric)
+    timings['compute'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with tracing.span('dashboard.render'):
+        dash = _build_dashboard(plot_dict, metric, webgl_threshold)
+    timings['render'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with tracing.span('dashboard.write'):
+        dash.write_html(target_path, include_plotlyjs=include_plotlyjs)
+    timings['write'] = time.perf_counter() - start
 
     if verbose:
         print(f'Dashboard saved to {target_path}')
+        print(' | '.join(f'{phase}: {seconds:.2f}s' for phase, seconds in timings.items()))
+
+    return timings
+
+
+def _dashboard_task(series: str, base_path: str, target_path: str, metric: str, cv_summary: str,
+                    cache: Union[bool, str], webgl_threshold: int, include_plotlyjs: str):
+    '''
+    Builds the dashboard of one series inside a worker of get_dashboards, returning the error instead of raising it
+    '''
+    try:
+        timings = get_dashboard(base_path, target_path, metric=metric, cv_summary=cv_summary, verbose=False,
+                                workers=1, cache=cache, webgl_threshold=webgl_threshold,
+                                include_plotlyjs=include_plotlyjs, executor='thread')
+        return series, timings, None
+    except Exception as e:
+        return series, None, f'{type(e).__name__}: {e}'
+
+
+def _safe_file_name(series: str) -> str:
+    '''
+    File name of the dashboard of a series, keeping only characters that are safe in paths and URLs
+    '''
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', str(series)).strip('._')
+    return name or 'series'
+
+
+def _write_index(target_folder: str, results: List[tuple], files: Dict[str, str], metric: str):
+    '''
+    Writes the index.html page linking the dashboard of every series
+    '''
+    rows = []
+    for series, timings, error in results:
+        name = html.escape(str(series))
+        if error is None:
+            link = f'<a href="{html.escape(files[series])}">{name}</a>'
+            status = f'{sum(timings.values()):.2f}s'
+        else:
+            link = name
+            status = f'Failed: {html.escape(error)}'
+        rows.append(f'<tr><td>{link}</td><td>{status}</td></tr>')
+
+    page = (
+        '<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>Model Accuracy - Dashboards</title></head>\n<body>\n'
+        f'<h1>Model Accuracy - Dashboards ({html.escape(metric)})</h1>\n'
+        '<table>\n<tr><th>Series</th><th>Status</th></tr>\n' + '\n'.join(rows) + '\n</table>\n</body>\n</html>\n'
+    )
+
+    with open(os.path.join(target_folder, 'index.html'), 'w', encoding='utf-8') as index_file:
+        index_file.write(page)
+
+
+def get_dashboards(paths: Dict[str, str], target_folder: str, metric: str = 'MAPE', cv_summary: str = 'mean',
+                   workers: int = None, cache: Union[bool, str] = False, webgl_threshold: int = 1000,
+                   verbose: bool = True) -> Dict[str, Union[str, Exception]]:
+    '''
+    Saves the HTML dashboards of many series in a folder, building them in parallel.
+
+    Every page references a single plotly.min.js file written in the folder, instead of embedding
+    its own copy of plotly.js, and an index.html page links all dashboards.
+
+    Args:
+     - paths: dictionary of series names and the folder where their forecastpacks are located.
+     - target_folder: folder where the dashboards, plotly.min.js and index.html are saved.
+     - metric: desired metric to be compared.
+     - cv_summary: 'mean' or 'median' depeding on the option used when modelling. How the window metrics are aggregated.
+     - workers: number of dashboards built in parallel (Default is the number of CPUs).
+     - cache: False to disable the cache of converted forecastpacks, True to use the default folder or the path of a folder.
+     - webgl_threshold: number of points above which the plots are rendered with WebGL.
+     - verbose: whether a message for each saved dashboard and the total time will be printed or not.
+
+    Returns:
+     - dashboards: dictionary with the path of the dashboard of each series, or a RuntimeError
+       describing why it could not be built
+    '''
+    _plotly_imports().check()
+    start = time.perf_counter()
+
+    os.makedirs(target_folder, exist_ok=True)
+    with open(os.path.join(target_folder, 'plotly.min.js'), 'w', encoding='utf-8') as js_file:
+        js_file.write(offline.get_plotlyjs())
+
+    files = {}
+    used = set()
+    for series in paths:
+        name = _safe_file_name(series)
+        file_name = f'{name}.html'
+        number = 1
+        while file_name in used or file_name == 'index.html':
+            number += 1
+            file_name = f'{name}_{number}.html'
+        used.add(file_name)
+        files[series] = file_name
+
+    tasks = [
+        (series, base_path, os.path.join(target_folder, files[series]), metric, cv_summary,
+         cache, webgl_threshold, 'plotly.min.js')
+        for series, base_path in paths.items()
+    ]
+
+    def report(result):
+        if verbose:
+            series, _, error = result
+            print(f'{series}: ' + (f'failed ({error})' if error else f'saved to {files[series]}'))
+        return result
+
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if workers <= 1:
+        results = [report(_dashboard_task(*task)) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_dashboard_task, *task) for task in tasks]
+            results = [report(future.result()) for future in futures]
+
+    _write_index(target_folder, results, files, metric)
+
+    dashboards = {}
+    for series, _, error in results:
+        dashboards[series] = os.path.join(target_folder, files[series]) if error is None else RuntimeError(error)
+
+    if verbose:
+        failed = sum(isinstance(x, Exception) for x in dashboards.values())
+        print(f'{len(dashboards) - failed} dashboards saved to {target_folder} in {time.perf_counter() - start:.2f}s'
+              + (f', {failed} failed' if failed else ''))
 
+    return dashboards
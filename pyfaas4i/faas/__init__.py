@@ -1,5 +1,21 @@
 from ._modellingcalls import *
 from ._utilities import *
+from ._incremental import *
+from ._outbox import *
+from ._ratelimit import *
 from .services.auth_zero import *
 from .services.login import login
-from .services.login import refresh_login
\ No newline at end of file
+from .services.login import refresh_login
+
+
+def __getattr__(name: str):
+    # CONFIG, DOMAIN, CLIENT_ID and AUDIENCE were exported by the import of auth_zero above while they
+    # were module constants, as was configur by the import of _utilities; they are read from the configuration
+    # on first use now, so they are delegated
+    if name in ["CONFIG", "DOMAIN", "CLIENT_ID", "AUDIENCE"]:
+        from .services import auth_zero
+        return getattr(auth_zero, name)
+    if name == "configur":
+        from ._utilities import _get_config
+        return _get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from typing import List, Tuple
+
+from pyfaas4i._checkimports import _LazyImport
+
+pd = _LazyImport("pandas")
+np = _LazyImport("numpy")
+
+# Rows encoded at once, bounding the memory of the character matrices to a few times the payload of a chunk
+_CHUNK_ROWS = 20000
+
+_RAW_MARKER = "__pyfaas4i_raw_{}__"
+_RAW_PATTERN = re.compile(rb'"__pyfaas4i_raw_(\d+)__"')
+
+
+def _format_number(value: float, decimals: int) -> str:
+    """
+    Shortest text of a number rounded to decimals places, without a fractional part for integer values.
+    Used for the values out of the range of the vectorized encoder.
+    """
+    if not math.isfinite(value):
+        return json.dumps(value)
+    rounded = round(value, decimals)
+    if rounded.is_integer() and abs(rounded) < 1e16:
+        return str(int(rounded))
+    return repr(rounded)
+
+
+def _text_field(texts: List[str], present) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Characters and mask of a column of texts, padded to the longest one
+    """
+    encoded = [text.encode("utf-8") for text in texts]
+    width = max([len(text) for text in encoded] + [1])
+    chars = np.array(encoded, dtype=f"S{width}").view(np.uint8).reshape(len(encoded), width)
+    lengths = np.fromiter((len(text) for text in encoded), dtype=np.int64, count=len(encoded))
+    return chars, (np.arange(width) < lengths[:, None]) & present[:, None]
+
+
+def _digits(values: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ASCII digits of non-negative integers right aligned in width characters (on a new last axis),
+    and the mask of the significant ones
+    """
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    chars = (values[..., None] // powers % 10 + 48).astype(np.uint8)
+    n_digits = np.ones(values.shape, dtype=np.int64)
+    for j in range(1, width):
+        n_digits += values >= 10 ** j
+    return chars, np.arange(width) >= (width - n_digits)[..., None]
+
+
+def _number_fields(values: np.ndarray, decimals: int) -> Tuple[List[np.ndarray], List[np.ndarray], np.ndarray]:
+    """
+    Characters and masks of numeric columns (rows x columns) written in the shortest text at decimals places:
+    sign, integer digits, decimal point and the fractional digits up to the last non-zero one
+
+    Returns:
+        Lists of character arrays and masks (rows x columns x characters), and the mask of the present
+        (not missing) values
+    """
+    is_float = values.dtype.kind == "f"
+    present = ~np.isnan(values) if is_float else np.ones(values.shape, dtype=bool)
+    scale = 10 ** decimals if is_float else 1
+
+    if is_float:
+        # Exact integer arithmetic while the scaled values stay below 2 ** 53
+        fast = np.isfinite(values) & (np.abs(values) < 2 ** 53 / scale)
+        scaled = np.rint(np.abs(np.where(fast, values, 0)) * scale).astype(np.int64)
+    else:
+        # Integers are exact in int64, except its minimum (without a positive counterpart) and the uint64
+        # values above its maximum
+        if values.dtype.kind == "u":
+            fast = values <= np.iinfo(np.int64).max
+        else:
+            fast = values != np.iinfo(np.int64).min
+        scaled = np.abs(np.where(fast, values, 0).astype(np.int64))
+    integer = scaled // scale
+    fraction = scaled % scale
+
+    chars = [np.full(values.shape + (1,), ord("-"), dtype=np.uint8)]
+    masks = [(fast & (values < 0) & (scaled > 0))[..., None]]
+
+    width = len(str(int(integer.max()))) if integer.size else 1
+    integer_chars, integer_mask = _digits(integer, width)
+    chars.append(integer_chars)
+    masks.append(integer_mask & fast[..., None])
+
+    if is_float and decimals > 0:
+        # Number of fractional digits up to the last non-zero one
+        n_fraction = np.zeros(values.shape, dtype=np.int64)
+        for j in range(decimals):
+            n_fraction += fraction % 10 ** (decimals - j) != 0
+        chars.append(np.full(values.shape + (1,), ord("."), dtype=np.uint8))
+        masks.append((fast & (n_fraction > 0))[..., None])
+        fraction_chars, _ = _digits(fraction, decimals)
+        chars.append(fraction_chars)
+        masks.append((np.arange(decimals) < n_fraction[..., None]) & fast[..., None])
+
+    slow = present & ~fast
+    if slow.any():
+        # Integers are written from their exact value, never through a float
+        texts = [(_format_number(float(value), decimals) if is_float else str(int(value))) if is_slow else ""
+                 for value, is_slow in zip(values.ravel(), slow.ravel())]
+        slow_chars, slow_mask = _text_field(texts, slow.ravel())
+        chars.append(slow_chars.reshape(values.shape + (-1,)))
+        masks.append(slow_mask.reshape(values.shape + (-1,)))
+
+    return chars, masks, present
+
+
+def _object_fields(values: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray], np.ndarray]:
+    """
+    Characters and masks of a column of other types (e.g. the dates), written by json.dumps. Missing values
+    and "NA" are left out, as in the records of _build_call.
+    """
+    present = ~pd.isna(values)
+    texts = []
+    for i, value in enumerate(values):
+        if present[i] and isinstance(value, str) and value == "NA":
+            present[i] = False
+        texts.append(json.dumps(value.item() if hasattr(value, "item") else value, default=str) if present[i] else "")
+    chars, mask = _text_field(texts, present)
+    return [chars], [mask], present
+
+
+def _column_fields(df: pd.DataFrame, decimals: int) -> list:
+    """
+    Characters, masks and present values of each column of a dataframe, in order. The numeric columns
+    are encoded together, the float, signed integer and unsigned integer columns each as one array.
+    """
+    kinds = [dtype.kind for dtype in df.dtypes]
+    fields = [None] * len(kinds)
+
+    for group, dtype in [("f", np.float64), ("i", np.int64), ("u", np.uint64)]:
+        positions = [i for i, kind in enumerate(kinds) if kind == group]
+        if not positions:
+            continue
+        values = df.iloc[:, positions].to_numpy(dtype=dtype)
+        chars, masks, present = _number_fields(values, decimals)
+        for j, position in enumerate(positions):
+            fields[position] = ([c[:, j] for c in chars], [m[:, j] for m in masks], present[:, j])
+
+    for position, kind in enumerate(kinds):
+        if fields[position] is not None:
+            continue
+        values = df.iloc[:, position].to_numpy()
+        if kind == "b":
+            present = np.ones(len(values), dtype=bool)
+            chars, mask = _text_field(["true" if value else "false" for value in values], present)
+            fields[position] = ([chars], [mask], present)
+        else:
+            fields[position] = _object_fields(values.astype(object))
+
+    return fields
+
+
+def _encode_chunk(df: pd.DataFrame, decimals: int, first_row: bool) -> bytes:
+    n_rows = len(df)
+
+    def constant(text: bytes):
+        return np.broadcast_to(np.frombuffer(text, dtype=np.uint8), (n_rows, len(text)))
+
+    # A comma before every row but the first one of the dataframe
+    row_separator = np.ones((n_rows, 1), dtype=bool)
+    if first_row:
+        row_separator[0] = False
+    chars = [constant(b","), constant(b"{")]
+    masks = [row_separator, np.ones((n_rows, 1), dtype=bool)]
+
+    previous = np.zeros(n_rows, dtype=bool)
+    for name, (column_chars, column_masks, present) in zip(df.columns, _column_fields(df, decimals)):
+        key = f"{json.dumps(str(name))}:".encode("utf-8")
+        chars += [constant(b","), constant(key), *column_chars]
+        masks += [(present & previous)[:, None], np.broadcast_to(present[:, None], (n_rows, len(key))), *column_masks]
+        previous = previous | present
+
+    chars.append(constant(b"}"))
+    masks.append(np.ones((n_rows, 1), dtype=bool))
+    return np.concatenate(chars, axis=1)[np.concatenate(masks, axis=1)].tobytes()
+
+
+def _encode_records(df: pd.DataFrame, decimals: int = 6) -> bytes:
+    """
+    JSON list of the rows of a dataframe, as the records of _build_call (one object per row, without the
+    missing values), writing the numbers in the shortest text at decimals places and the integer values
+    without a fractional part. The text is built on the NumPy arrays, without a rounded copy of the dataframe.
+
+    Args:
+        df: dataframe with unique column names
+        decimals: decimal places of the numbers
+    Returns:
+        UTF-8 JSON text
+    """
+    chunks = [b"["]
+    for start in range(0, len(df), _CHUNK_ROWS):
+        chunks.append(_encode_chunk(df.iloc[start:start + _CHUNK_ROWS], decimals, start == 0))
+    chunks.append(b"]")
+    return b"".join(chunks)
+
+
+def _dumps_with_raw(body: dict, raw: List[bytes]) -> bytes:
+    """
+    json.dumps of a body in which the strings _RAW_MARKER.format(i) are replaced by the JSON text raw[i]
+    """
+    parts = _RAW_PATTERN.split(json.dumps(body).encode("utf-8"))
+    # split alternates the text around the markers and the indices captured from them
+    return b"".join(raw[int(part)] if i % 2 else part for i, part in enumerate(parts))
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Union
+
+from pyfaas4i import tracing
+from pyfaas4i._checkimports import _LazyImport
+from pyfaas4i._packcache import _atomic_write, _cache_dir
+from ._modellingcalls import _SPECIAL_CHARS, _plan_shards, run_models
+
+__all__ = ["SubmissionState", "fingerprint_series", "run_changed_models"]
+
+pd = _LazyImport("pandas")
+_unidecode = _LazyImport("unidecode")
+
+_STATE_VERSION = 1
+
+# model_spec entries that refer to variables, of which each dataset only depends on its own
+_VARIABLE_KEYS = ("lags", "exclusions", "golden_variables", "user_model")
+
+
+def _tidy(name) -> str:
+    """
+    Variable name as sent to the API, without accents and special characters
+    """
+    return _SPECIAL_CHARS.sub('_', _unidecode.unidecode(str(name).lower()))
+
+
+def _names(entry) -> List[str]:
+    """
+    Variable names of an exclusions or user_model entry, which may nest lists of names
+    """
+    if isinstance(entry, str):
+        return [_tidy(entry)]
+    return [name for item in entry for name in _names(item)]
+
+
+def _spec_slice(model_spec: dict, columns: set) -> dict:
+    """
+    Part of a model_spec that affects a dataset: every option, with the variable lists reduced to its columns
+    """
+    spec = {key: value for key, value in model_spec.items() if key not in _VARIABLE_KEYS}
+
+    if "lags" in model_spec:
+        spec["lags"] = {
+            _tidy(var): lags for var, lags in model_spec["lags"].items() if _tidy(var) == "all" or _tidy(var) in columns
+        }
+    if "golden_variables" in model_spec:
+        spec["golden_variables"] = sorted(_tidy(var) for var in model_spec["golden_variables"] if _tidy(var) in columns)
+    for key in ["exclusions", "user_model"]:
+        if key in model_spec:
+            spec[key] = [entry for entry in model_spec[key] if any(name in columns for name in _names(entry))]
+
+    return spec
+
+
+def fingerprint_series(
+    data: pd.DataFrame,
+    y: str,
+    date_variable: str,
+    date_format: str,
+    model_spec: dict,
+    user_model: dict = None,
+    decimals: int = 6,
+) -> str:
+    """
+    Fingerprint of a dataset as sent to the API: its values rounded to the decimal places sent, its variable names
+    without accents and special characters, and the parts of model_spec and user_model that apply to it.
+    The order of the columns does not change the fingerprint.
+
+    Args:
+        data: dataframe of the response variable y
+        y: name of the response variable (key of the dataframe in data_list)
+        date_variable: name of the variable to be considered as the timesteps
+        date_format: format of date_variable following datetime notation
+        model_spec: dictionary containing arguments required by the API
+        user_model: dictionary with the response variable names and their respective model specifications
+        decimals: decimal places of the numbers sent (the decimals option of run_models)
+    Returns:
+        Hexadecimal fingerprint
+    """
+    frame = data.round(decimals)
+    if date_variable in frame.columns:
+        frame[date_variable] = frame[date_variable].astype(str)
+    frame.columns = [_tidy(column) for column in frame.columns]
+    frame = frame[sorted(frame.columns)]
+    columns = set(frame.columns)
+
+    user_models = (user_model or {}).get(y, [])
+    context = {
+        "version": _STATE_VERSION,
+        "y": _tidy(y),
+        "columns": list(frame.columns),
+        "dtypes": [str(dtype) for dtype in frame.dtypes],
+        "date_variable": _tidy(date_variable),
+        "date_format": date_format,
+        "decimals": decimals,
+        "model_spec": _spec_slice(model_spec, columns),
+        "user_model": user_models,
+    }
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(context, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+class SubmissionState:
+    """
+    Local store of the datasets submitted for modelling: the fingerprint of each response variable
+    (see fingerprint_series), the project that modelled it and, once downloaded, its forecastpack.
+    Used by run_changed_models to send only new or changed datasets.
+
+    Args:
+        path: json file of the store, created on the first submission (Default is state/submissions.json in the
+              cache folder, PYFAAS4I_CACHE_DIR or ~/.cache/pyfaas4i, outside the forecastpacks removed by
+              clear_cache). Keep one store per recurring job.
+
+    Example:
+    ::
+    >>> state = SubmissionState("./sales_state.json")
+    >>> report = run_changed_models(data_list, "data", "%Y-%m-%d", model_spec, "sales_2024_05", state)
+    >>> report["unchanged"]
+    {'fs_sales_north': {'project_id': '6f1c...', 'project_name': 'sales_2024_04', 'pack': None, ...}}
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(_cache_dir(True), "state", "submissions.json")
+        self._lock = threading.Lock()
+        self._series = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as state_file:
+                content = json.load(state_file)
+            if content.get("version") == _STATE_VERSION:
+                self._series = content["series"]
+
+    def __len__(self):
+        return len(self._series)
+
+    def __repr__(self):
+        return f"SubmissionState({self.path!r}, {len(self._series)} series)"
+
+    def records(self) -> Dict[str, dict]:
+        """
+        Dictionary of the response variables and their last submission (fingerprint, project_id,
+        project_name, submitted_at and pack)
+        """
+        with self._lock:
+            return copy.deepcopy(self._series)
+
+    def save(self):
+        """
+        Writes the store to its file, replacing it atomically
+        """
+        with self._lock:
+            content = {"version": _STATE_VERSION, "series": self._series}
+
+            def write(temp_path):
+                with open(temp_path, "w", encoding="utf-8") as state_file:
+                    json.dump(content, state_file, indent=1)
+
+            folder = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder, exist_ok=True)
+            _atomic_write(os.path.join(folder, os.path.basename(self.path)), write)
+
+    def plan(
+        self,
+        data_list: Dict[str, pd.DataFrame],
+        date_variable: str,
+        date_format: str,
+        model_spec: dict,
+        user_model: dict = None,
+        decimals: int = 6,
+    ) -> dict:
+        """
+        Compares the datasets of a data_list with their last submission
+
+        Args:
+            data_list: dictionary of pandas datataframes and their respective keys
+            date_variable: name of the variable to be considered as the timesteps
+            date_format: format of date_variable following datetime notation
+            model_spec: dictionary containing arguments required by the API
+            user_model: dictionary with the response variable names and their respective model specifications
+            decimals: decimal places of the numbers sent
+        Returns:
+            Dictionary with:
+             - changed: list of the response variables that are new or whose inputs changed
+             - unchanged: dictionary of the other response variables and their last submission
+             - fingerprints: dictionary of the fingerprint of every response variable
+        """
+        with tracing.span("faas.fingerprint", n_series=len(data_list)) as span:
+            fingerprints = {
+                y: fingerprint_series(df, y, date_variable, date_format, model_spec, user_model, decimals)
+                for y, df in data_list.items()
+            }
+
+            with self._lock:
+                previous = {y: self._series.get(y) for y in data_list}
+
+            changed = [y for y in data_list if previous[y] is None or previous[y]["fingerprint"] != fingerprints[y]]
+            unchanged = {y: dict(previous[y]) for y in data_list if y not in changed}
+            span.set(changed=len(changed))
+
+        return {"changed": changed, "unchanged": unchanged, "fingerprints": fingerprints}
+
+    def record(self, fingerprints: Dict[str, str], project_id: str, project_name: str):
+        """
+        Saves the submission of some response variables in a project
+
+        Args:
+            fingerprints: dictionary of the submitted response variables and their fingerprints
+            project_id: id of the project returned by run_models
+            project_name: name of the project
+        """
+        submitted_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with self._lock:
+            for y, fingerprint in fingerprints.items():
+                self._series[y] = {
+                    "fingerprint": fingerprint,
+                    "project_id": project_id,
+                    "project_name": project_name,
+                    "submitted_at": submitted_at,
+                    "pack": None,
+                }
+        self.save()
+
+    def set_pack(self, project_id: str, path: str):
+        """
+        Saves the path of the results (forecastpack file or folder downloaded with download_zip) of a project
+        for all the response variables it modelled
+        """
+        with self._lock:
+            for record in self._series.values():
+                if record["project_id"] == project_id:
+                    record["pack"] = str(path)
+        self.save()
+
+    def forget(self, ys: List[str] = None):
+        """
+        Removes response variables from the store, so they are sent again on the next submission
+
+        Args:
+            ys: names of the response variables (Default is all of them)
+        """
+        with self._lock:
+            if ys is None:
+                self._series.clear()
+            for y in ys or []:
+                self._series.pop(y, None)
+        self.save()
+
+
+def run_changed_models(
+    data_list: Dict[str, pd.DataFrame],
+    date_variable: str,
+    date_format: str,
+    model_spec: dict,
+    project_name: str,
+    state: Union[SubmissionState, str],
+    user_model: dict = {},
+    **kwargs,
+) -> dict:
+    """
+    Sends to modelling only the datasets that are new or changed since their last submission recorded in state,
+    and reports which previous results are still valid for the others
+
+    Args:
+        data_list: dictionary of pandas datataframes and their respective keys to be sent to the API
+        date_variable: name of the variable to be considered as the timesteps
+        date_format: format of date_variable following datetime notation
+                    (See https://docs.python.org/3/library/datetime.html#strftime-and-strptime-behavior)
+        model_spec: dictionary containing arguments required by the API
+        project_name: name of the project defined by the user, that should be at most 50 characters long
+        state: SubmissionState, or the path of its file
+        user_model: dictionary with the response variable names and their respective model specifications and constraints
+        kwargs: the keyword arguments of run_models (skip_validation, version_check, proxy_url, proxy_port,
+                max_payload_bytes, max_memory_bytes, split, outbox, compact_numbers and decimals)
+    Returns:
+        Dictionary with:
+         - submitted: response variables sent to modelling
+         - project_ids: ids of the projects created (several if the data_list was split)
+         - not_submitted: new or changed response variables whose project was not created (not validated, or
+           saved to the outbox); they are not recorded in state, so they are sent again on the next call
+         - unchanged: dictionary of the other response variables and their last submission (project_id, project_name and pack)
+    """
+    if not isinstance(state, SubmissionState):
+        state = SubmissionState(state)
+
+    plan = state.plan(data_list, date_variable, date_format, model_spec, user_model, kwargs.get("decimals", 6))
+    changed = plan["changed"]
+    report = {"submitted": [], "project_ids": [], "not_submitted": [], "unchanged": plan["unchanged"]}
+
+    print(f"{len(changed)} of {len(data_list)} datasets are new or changed since their last submission.")
+    if plan["unchanged"]:
+        projects = sorted({record["project_name"] for record in plan["unchanged"].values()})
+        print(f"Previous results are still valid for {len(plan['unchanged'])} datasets, from project(s): {', '.join(projects)}")
+    if not changed:
+        return report
+
+    options = dict(kwargs)
+    split = options.pop("split", False)
+    shards = _plan_shards({y: data_list[y] for y in changed}, date_variable, date_format, model_spec, project_name,
+                          user_model or {}, options.get("max_payload_bytes"), options.get("max_memory_bytes"), split,
+                          options.get("compact_numbers", False), options.get("decimals", 6))
+
+    for part, keys in enumerate(shards, start=1):
+        name = project_name if len(shards) == 1 else f"{project_name}_part{part}"
+        project_id = run_models({y: data_list[y] for y in keys}, date_variable, date_format, model_spec, name,
+                                copy.deepcopy({y: user_model[y] for y in keys if y in user_model}),
+                                get_project_id=True, **options)
+        if project_id is None:
+            print(f"The project {name} was not created, datasets not submitted: {', '.join(keys)}")
+            report["not_submitted"].extend(keys)
+            continue
+
+        state.record({y: plan["fingerprints"][y] for y in keys}, project_id, name)
+        report["submitted"].extend(keys)
+        report["project_ids"].append(project_id)
+
+    return report
@@ -1,20 +1,45 @@
-import pandas as pd
+from __future__ import annotations
+
 import re
 import copy
-import numpy as np
 import datetime as dt
-from typing import Dict, Type, Union
-import requests
+from typing import Dict, Tuple, Type, Union
 import json
 import gzip
 import zlib
 import base64
-from unidecode import unidecode
 import time
-from requests.structures import CaseInsensitiveDict
-from ._utilities import _get_access_token, _version_check, _get_proxies, APIError, AuthenticationError
+from pyfaas4i import profiling, tracing
+from pyfaas4i._checkimports import _LazyImport
+from ._utilities import _get_access_token, _version_check, _get_proxies, _send, _modelling_url, _validation_url, APIError, AuthenticationError, PayloadTooLargeError, PartialSubmissionError
+from ._encoding import _RAW_MARKER, _dumps_with_raw, _encode_records
+from ._outbox import Outbox, _QueuedRequest, _resolve_outbox
 from .services.auth_zero import FOURI_USER_AGENT
 
+# Heavy dependencies are imported on first use, keeping `import pyfaas4i.faas` fast
+pd = _LazyImport("pandas")
+np = _LazyImport("numpy")
+requests = _LazyImport("requests")
+_unidecode = _LazyImport("unidecode")
+
+# Peak memory of _build_call per byte of JSON payload (rounded copies, records, payload and compressed body),
+# measured with tracemalloc on synthetic data_lists of 7 to 9 MB of payload
+_MEMORY_PER_PAYLOAD_BYTE = 6
+
+# Rows of each dataframe serialized to estimate the size of its payload
+_SIZE_SAMPLE_ROWS = 200
+# Share of the estimated size of each dataset kept free in the shards of split=True, for the error of the estimates
+_SHARD_MARGIN = 0.01
+
+# Dummy email sent in every request
+_USER_EMAIL = 'user@legitmail.com'
+
+# Characters replaced by '_' in the variable names sent to the API
+_SPECIAL_CHARS = re.compile('[@!#$%^&*()<>?/\\|}{~:\[\].-]')
+
+# Status codes of a service that is down or overloaded, whose requests can be saved to an outbox
+_UNAVAILABLE_STATUS = [429, 502, 503]
+
     
 def _get_url(extension: str) -> str:
     """
@@ -22,12 +47,12 @@ def _get_url(extension: str) -> str:
     Args:
         extension: Whether to call the validation of modeling API
     Returns:
-        An url in the for of a string
+        An url in the for of a string (the base URLs can be set with PYFAAS4I_MODELLING_URL and PYFAAS4I_VALIDATION_URL)
     """
     if extension == "projects":
-        return "https://run-prod-4casthub-faas-modelling-api-zdfk3g7cpq-ue.a.run.app/api/v1/projects"
+        return f"{_modelling_url()}/projects"
     else:
-        return "https://run-prod-4casthub-api-faas-validation-zdfk3g7cpq-ue.a.run.app/api/v1/validate"
+        return f"{_validation_url()}/validate"
 
 
 def _check_model_spec(model_spec: dict, column_list: list) -> dict:
@@ -97,7 +122,300 @@ def _check_model_spec(model_spec: dict, column_list: list) -> dict:
     return model_spec
 
 
+def _format_specs(formatted_model_spec: dict, user_model: dict, columns_list: list) -> dict:
+    """
+    Formats model_spec and user_model as sent to the API: variable names without accents and special
+    characters, options in lists for the R scripts and the missing options filled from the template
+    Args:
+        formatted_model_spec: copy of model_spec, changed in place
+        user_model: dictionary with the response variable names and their respective model specifications,
+                    changed in place
+        columns_list: names of the explanatory variables of all the datasets, as sent
+    Returns:
+        The formatted model_spec
+    """
+    regex_special_chars = _SPECIAL_CHARS
+
+    # ------ removing accentuation and special characters------
+    if 'golden_variables' in formatted_model_spec.keys():
+        formatted_model_spec["golden_variables"] = [
+            regex_special_chars.sub('_', _unidecode.unidecode(i.lower())) for i in formatted_model_spec["golden_variables"]
+        ]
+    
+    if 'exclusions' in formatted_model_spec.keys():
+        temp_exclusions = []
+        for i in formatted_model_spec["exclusions"]:
+            
+            temp_j = []
+            for j in i:
+                if isinstance(j, str):                
+                    temp_j.append(regex_special_chars.sub('_', _unidecode.unidecode(j.lower())))
+                else:
+                    temp_k = []
+                    for k in j:
+                        temp_k.append(regex_special_chars.sub('_', _unidecode.unidecode(k.lower())))
+                    temp_j.append(temp_k)
+
+            temp_exclusions.append(temp_j)
+        
+        formatted_model_spec["exclusions"] = temp_exclusions
+    
+    if 'lags' in formatted_model_spec.keys():
+        temp_lags = {}
+        for var, lags in formatted_model_spec['lags'].items():
+            var_tidy = regex_special_chars.sub('_', _unidecode.unidecode(var.lower()))
+            temp_lags[var_tidy] = lags
+        formatted_model_spec['lags'] = temp_lags
+    
+    
+    if 'user_model' in formatted_model_spec.keys():
+        temp_user_model = []
+
+        for i in formatted_model_spec["user_model"]:       
+                temp_j = []
+                for j in i:
+                    temp_j.append(regex_special_chars.sub('_', _unidecode.unidecode(j.lower())))
+                temp_user_model.append(temp_j)
+        formatted_model_spec["user_model"] = temp_user_model
+
+    if user_model:
+        for models in user_model.values():
+            for model in models:
+                # ------ removing vars' accentuation and special characters ------ 
+                model["vars"] = [regex_special_chars.sub('_', _unidecode.unidecode(v.lower())) for v in model["vars"]]
+
+                # ------ Turning None into "NA" to make compatible with 'R' scripts ------ 
+                if 'order' in model.keys():
+                    model["order"] = ["NA" if x is None else x for x in model["order"]]
+
+                if "constraints" not in model.keys():
+                    continue
+
+                new_constraints = {}
+
+                # ------ removing constraints' accentuation and special characters ------ 
+                for constraint_name, constraint_values in model["constraints"].items():
+                    _constraint_values_str = [str(x) for x in constraint_values]
+                    new_constraints[regex_special_chars.sub('_', _unidecode.unidecode(constraint_name.lower()))] = _constraint_values_str
+                model["constraints"] = new_constraints
+
+    # ----- Change formatted_model_spec to be R compatible
+    for key in formatted_model_spec.keys():
+        if key == "selection_methods":
+            for method in formatted_model_spec[key].keys():
+                if method != "apply.collinear":
+                    formatted_model_spec[key][method] = [formatted_model_spec[key][method]]
+        elif key not in ["lags", "exclusions", "golden_variables", "user_model"]:
+            formatted_model_spec[key] = [formatted_model_spec[key]]
+
+    # ----- Filling formatted_model_spec if anything is missing
+    columns_list = list(set(columns_list))
+    formatted_model_spec = _check_model_spec(model_spec=formatted_model_spec, column_list=columns_list)
+
+    return formatted_model_spec
+
+
+def _estimate_payload_sizes(data_list: Dict[str, pd.DataFrame], date_variable: str,
+                            compact_numbers: bool = False, decimals: int = 6) -> Dict[str, int]:
+    """
+    Estimates the bytes of the JSON payload of each dataframe without encoding the whole data_list: a sample
+    of rows is encoded as _build_call does (decimals places, no missing values) and scaled to all the rows.
+    The rows of a dataset share their columns, and their numbers have the same magnitude and decimal places,
+    so evenly spaced rows give the size within a fraction of a percent (0.05% on the synthetic benchmarks)
+    at a fixed cost per dataset. The estimate only decides the shards: _build_call checks the actual payload
+    against the limit before sending it.
+    Args:
+        data_list: dictionary of pandas datataframes and their respective keys
+        date_variable: name of the variable to be considered as the timesteps
+        compact_numbers: if the payload is encoded with the compact numeric encoding
+        decimals: decimal places of the numbers
+    Returns:
+        Dictionary of the keys of data_list and the estimated payload bytes of each dataframe
+    """
+    sizes = {}
+    for key, df in data_list.items():
+        if len(df) == 0:
+            sizes[key] = 2
+            continue
+
+        positions = np.unique(np.linspace(0, len(df) - 1, min(len(df), _SIZE_SAMPLE_ROWS)).astype(int))
+        sample = df.iloc[positions] if compact_numbers else df.iloc[positions].round(decimals)
+        if date_variable in sample.columns:
+            sample[date_variable] = sample[date_variable].astype(str)
+        sample.columns = [_SPECIAL_CHARS.sub('_', _unidecode.unidecode(str(x).lower())) for x in sample.columns]
+
+        if compact_numbers:
+            sizes[key] = int(len(_encode_records(sample, decimals)) * len(df) / len(positions))
+            continue
+
+        records = [
+            {column: value for column, value in row.items() if value != "NA"}
+            for row in sample.fillna("NA").to_dict("records")
+        ]
+        sample_bytes = len(json.dumps(records).encode("utf-8"))
+        sizes[key] = int(sample_bytes * len(df) / len(positions))
+
+    return sizes
+
+
+def _body_overhead(
+    data_list: Dict[str, pd.DataFrame],
+    date_variable: str,
+    date_format: str,
+    model_spec: dict,
+    project_name: str,
+    user_model: dict,
+) -> Tuple[int, Dict[str, int]]:
+    """
+    Bytes of the body built by _build_call besides the records of the datasets: a fixed part (model_spec
+    formatted for all the datasets, which bounds the one of any part, the name of a part and the date options)
+    and, for each dataset, its forecast_<n>_ keys and its user_model
+    Args:
+        data_list: dictionary of pandas datataframes and their respective keys
+        date_variable: name of the variable to be considered as the timesteps
+        date_format: format of date_variable following datetime notation
+        model_spec: dictionary containing arguments required by the API
+        project_name: name of the project defined by the user
+        user_model: dictionary with the response variable names and their respective model specifications
+    Returns:
+        The fixed bytes, and the bytes of each key of data_list
+    """
+    def tidy(name) -> str:
+        return _SPECIAL_CHARS.sub('_', _unidecode.unidecode(str(name).lower()))
+
+    date_tidy = tidy(date_variable)
+    columns_list = []
+    for key, df in data_list.items():
+        columns_list += [column for column in map(tidy, df.columns) if column not in [tidy(key), date_tidy]]
+
+    user_model = copy.deepcopy({key: user_model[key] for key in data_list if key in user_model})
+    formatted_model_spec = _format_specs(copy.deepcopy(model_spec), user_model, columns_list)
+
+    # Positions and part numbers written with as many digits as the largest one
+    widest = "9" * len(str(len(data_list)))
+    body = {
+        "data_list": {},
+        "model_spec": formatted_model_spec,
+        "user_email": [_USER_EMAIL],
+        "project_id": [f"{project_name}_part{widest}"],
+        "date_variable": [date_tidy],
+        "date_format": [date_format],
+        "user_model": {},
+    }
+    fixed = len(json.dumps(body).encode("utf-8"))
+
+    per_key = {}
+    for key in data_list:
+        # '"forecast_<n>_<key>": ' and the ', ' separating it from the next one
+        key_bytes = len(json.dumps(f"forecast_{widest}_{tidy(key)}").encode("utf-8")) + 4
+        per_key[key] = key_bytes
+        if key in user_model:
+            per_key[key] += key_bytes + len(json.dumps(user_model[key]).encode("utf-8"))
+
+    return fixed, per_key
+
+
+def _payload_limit(max_payload_bytes: Union[int, None], max_memory_bytes: Union[int, None]) -> Union[int, None]:
+    """
+    Maximum bytes of JSON payload allowed by max_payload_bytes and max_memory_bytes, None if neither is set
+    """
+    limits = []
+    if max_payload_bytes is not None:
+        limits.append(int(max_payload_bytes))
+    if max_memory_bytes is not None:
+        limits.append(int(max_memory_bytes) // _MEMORY_PER_PAYLOAD_BYTE)
+    return min(limits) if limits else None
+
+
+def _plan_shards(
+    data_list: Dict[str, pd.DataFrame],
+    date_variable: str,
+    date_format: str,
+    model_spec: dict,
+    project_name: str,
+    user_model: dict,
+    max_payload_bytes: Union[int, None],
+    max_memory_bytes: Union[int, None],
+    split: bool,
+    compact_numbers: bool = False,
+    decimals: int = 6,
+) -> list:
+    """
+    Checks the estimated payload of data_list against the size limits, before anything is encoded. The
+    estimate adds the rest of the body (see _body_overhead) to the records of the datasets, and the shards
+    of split=True keep a margin of _SHARD_MARGIN of the records for the error of their estimate.
+    Args:
+        data_list: dictionary of pandas datataframes and their respective keys
+        date_variable: name of the variable to be considered as the timesteps
+        date_format: format of date_variable following datetime notation
+        model_spec: dictionary containing arguments required by the API
+        project_name: name of the project defined by the user
+        user_model: dictionary with the response variable names and their respective model specifications
+        max_payload_bytes: maximum bytes of the JSON payload of a request, None for no limit
+        max_memory_bytes: maximum memory used to build the payload of a request, None for no limit
+        split: if data_list should be split into several requests under the limits instead of failing
+        compact_numbers: if the payload is encoded with the compact numeric encoding
+        decimals: decimal places of the numbers
+    Returns:
+        List of the groups of keys of data_list to be sent together, in their original order
+    Raises:
+        PayloadTooLargeError: if the payload exceeds the limits and split is False, or if a single dataframe exceeds them
+    """
+    limit = _payload_limit(max_payload_bytes, max_memory_bytes)
+    if limit is None:
+        return [list(data_list.keys())]
+
+    with tracing.span("faas.estimate_size", limit=limit) as span:
+        sizes = _estimate_payload_sizes(data_list, date_variable, compact_numbers, decimals)
+        fixed, per_key = _body_overhead(data_list, date_variable, date_format, model_spec, project_name, user_model)
+        span.set(bytes=sum(sizes.values()), overhead=fixed + sum(per_key.values()))
+
+    # Only the shards of split=True keep a margin, a single request is checked against its actual payload
+    margin = _SHARD_MARGIN if split else 0.0
+    costs = {key: int(size * (1 + margin)) + per_key[key] for key, size in sizes.items()}
+
+    def breakdown() -> str:
+        largest = sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+        lines = [f"  {key}: {size / 1e6:.2f} MB" for key, size in largest[:20]]
+        if len(largest) > 20:
+            lines.append(f"  ... and {len(largest) - 20} other datasets")
+        return "\n".join(lines)
+
+    limit_text = f"{limit / 1e6:.2f} MB of payload"
+    if max_memory_bytes is not None:
+        limit_text += f" ({int(max_memory_bytes) / 1e6:.2f} MB of memory)"
+
+    if fixed + sum(costs.values()) <= limit:
+        return [list(data_list.keys())]
+
+    if not split:
+        raise PayloadTooLargeError(
+            f"The estimated payload of the data_list is {(fixed + sum(costs.values())) / 1e6:.2f} MB, above the limit of {limit_text}. "
+            f"Estimated size of each dataset:\n{breakdown()}\nSend fewer datasets per project or use split=True.",
+            sizes,
+        )
+
+    too_large = [key for key, cost in costs.items() if fixed + cost > limit]
+    if too_large:
+        raise PayloadTooLargeError(
+            f"Dataset(s) {', '.join(str(key) for key in too_large)} alone exceed the limit of {limit_text}, so the data_list "
+            f"cannot be split under it. Estimated size of each dataset:\n{breakdown()}",
+            sizes,
+        )
+
+    shards = [[]]
+    shard_bytes = fixed
+    for key, cost in costs.items():
+        if shards[-1] and shard_bytes + cost > limit:
+            shards.append([])
+            shard_bytes = fixed
+        shards[-1].append(key)
+        shard_bytes += cost
 
+    return shards
+
+
+@tracing.traced("faas.build_call")
 def _build_call(
     data_list: Dict[str, pd.DataFrame],
     date_variable: str,
@@ -109,7 +427,11 @@ def _build_call(
     version_check: bool,
     extension: str,
     proxy_url: Union[str, None],
-    proxy_port: Union[str, None]
+    proxy_port: Union[str, None],
+    max_payload_bytes: Union[int, None] = None,
+    outbox: Union[Outbox, str, bool, None] = None,
+    compact_numbers: bool = False,
+    decimals: int = 6
 ) -> str:
 
     """
@@ -127,8 +449,14 @@ def _build_call(
         extension: Wheter to call the validation of modeling API
         proxy_url: A proxy for URL during the request
         proxy_port: A proxy for port to compose the URL during the request
+        max_payload_bytes: if provided, the request is not sent when its JSON payload is larger
+        outbox: if provided, a request rejected because the service is unavailable is saved to this Outbox
+                (or the Outbox in this folder, or the default Outbox if True) instead of failing
+        compact_numbers: if True, the numbers are written in the shortest text at decimals places, and the integer
+                         values without a fractional part, directly from the NumPy arrays of the dataframes
+        decimals: decimal places of the numbers sent
     Returns:
-        A response from the called API
+        A response from the called API, or a _QueuedRequest if it was saved to the outbox
     """
 
     if not isinstance(skip_validation, bool):
@@ -142,11 +470,13 @@ def _build_call(
     if not data_list:
         raise ValueError("The data_list should contain at least one named dataframe.")
 
+    tracing.current().set(endpoint=extension, project_id=project_id, n_series=len(data_list))
+
     data_list = data_list.copy()
     formatted_model_spec = copy.deepcopy(model_spec)
 
     # ---- declare dummy email
-    user_email = 'user@legitmail.com'
+    user_email = _USER_EMAIL
     # ----- Get access token from auth0
 
     access_token = _get_access_token()
@@ -163,52 +493,65 @@ def _build_call(
     # ------ Check dataframes inside dictionary and turn them into dictionaries themselves
     missing_date_variable = []
     long_variable_name = []
-    regex_special_chars = re.compile('[@!#$%^&*()<>?/\\|}{~:\[\].-]')
+    regex_special_chars = _SPECIAL_CHARS
     columns_list = []
 
-    # Formatting data_list to include only 6 decimal places
-    data_list = {k: v.round(6) for k, v in data_list.items()} 
+    # Formatting data_list to include only the given decimal places
+    if compact_numbers:
+        # The numbers are rounded as they are written, so the dataframes are not copied
+        data_list = {k: v.copy(deep=False) for k, v in data_list.items()}
+    else:
+        with tracing.span("faas.round"):
+            data_list = {k: v.round(decimals) for k, v in data_list.items()}
 
     # Formatting date_variable and keeping the original value for checking
     orig_date_variable = date_variable
-    date_variable = regex_special_chars.sub('_', unidecode(date_variable.lower()))
+    date_variable = regex_special_chars.sub('_', _unidecode.unidecode(date_variable.lower()))
 
-    for key in data_list.keys():
-        
-        # ----- cleaning column names
+    with tracing.span("faas.clean_names"):
+        for key in data_list.keys():
 
-        # Checks for absence of orig_date_variable in dataframes
-        try:
-            data_list[key][orig_date_variable] = data_list[key][orig_date_variable].astype(str)
-        except:
-            missing_date_variable.append(str(key))
-            pass
+            # ----- cleaning column names
 
-        if key not in data_list[key].columns:
-            raise KeyError(f"Variable {key} not found in the dataset")
+            # Checks for absence of orig_date_variable in dataframes
+            try:
+                data_list[key][orig_date_variable] = data_list[key][orig_date_variable].astype(str)
+            except:
+                missing_date_variable.append(str(key))
+                pass
 
-        # ------ remove accentuation and special characters ------
-        data_list[key].columns = [regex_special_chars.sub('_', unidecode(x.lower())) for x in data_list[key].columns]
+            if key not in data_list[key].columns:
+                raise KeyError(f"Variable {key} not found in the dataset")
 
-        # fill columns_list removing date and y variables
-        columns_list = columns_list + list(data_list[key].columns)
-        formatted_y_var = regex_special_chars.sub('_', unidecode(key.lower()))
-        columns_list.remove(formatted_y_var)
-        try:
-            columns_list.remove(date_variable)
-        except:
-            pass
+            # ------ remove accentuation and special characters ------
+            data_list[key].columns = [regex_special_chars.sub('_', _unidecode.unidecode(x.lower())) for x in data_list[key].columns]
 
-        if any(len(col) > 50 for col in data_list[key].columns):
-            long_variable_name.append(str(key))
+            # fill columns_list removing date and y variables
+            columns_list = columns_list + list(data_list[key].columns)
+            formatted_y_var = regex_special_chars.sub('_', _unidecode.unidecode(key.lower()))
+            columns_list.remove(formatted_y_var)
+            try:
+                columns_list.remove(date_variable)
+            except:
+                pass
 
-        # converting dataframes into dictionaries
-        data_list[key] = data_list[key].fillna("NA").T.to_dict()
+            if any(len(col) > 50 for col in data_list[key].columns):
+                long_variable_name.append(str(key))
 
-        for inner_key in list(data_list[key]):
-            for innerer_key in list(data_list[key][inner_key]):
-                if data_list[key][inner_key][innerer_key] == "NA":
-                    del data_list[key][inner_key][innerer_key]
+    # converting dataframes into dictionaries
+    with tracing.span("faas.to_dict", rows=sum(len(df) for df in data_list.values()),
+                      encoding="compact" if compact_numbers else "json"):
+        for key in data_list.keys():
+            if compact_numbers:
+                data_list[key] = _encode_records(data_list[key], decimals)
+                continue
+
+            data_list[key] = data_list[key].fillna("NA").T.to_dict()
+
+            for inner_key in list(data_list[key]):
+                for innerer_key in list(data_list[key][inner_key]):
+                    if data_list[key][inner_key][innerer_key] == "NA":
+                        del data_list[key][inner_key][innerer_key]
 
     # Checks if any dataframe is missing the date_variable
     if len(missing_date_variable) > 0:
@@ -235,93 +578,20 @@ def _build_call(
     position = 1
 
     for key in list(data_list.keys()):
-        data_list[key] = [x for x in data_list[key].values()]
-        data_list[f"forecast_{position}_" + regex_special_chars.sub('_', unidecode(key.lower()))] = data_list.pop(key)
+        if not compact_numbers:
+            data_list[key] = [x for x in data_list[key].values()]
+        data_list[f"forecast_{position}_" + regex_special_chars.sub('_', _unidecode.unidecode(key.lower()))] = data_list.pop(key)
         
         # ------ renaming Y to `forecast_#_Y` ------ 
         if key in user_model.keys():
-            user_model[f"forecast_{position}_" + regex_special_chars.sub('_', unidecode(key.lower()))] = user_model.pop(key)
+            user_model[f"forecast_{position}_" + regex_special_chars.sub('_', _unidecode.unidecode(key.lower()))] = user_model.pop(key)
         
         position += 1
 
 
     
     
-    # ------ removing accentuation and special characters------
-    if 'golden_variables' in formatted_model_spec.keys():
-        formatted_model_spec["golden_variables"] = [
-            regex_special_chars.sub('_', unidecode(i.lower())) for i in formatted_model_spec["golden_variables"]
-        ]
-    
-    if 'exclusions' in formatted_model_spec.keys():
-        temp_exclusions = []
-        for i in formatted_model_spec["exclusions"]:
-            
-            temp_j = []
-            for j in i:
-                if isinstance(j, str):                
-                    temp_j.append(regex_special_chars.sub('_', unidecode(j.lower())))
-                else:
-                    temp_k = []
-                    for k in j:
-                        temp_k.append(regex_special_chars.sub('_', unidecode(k.lower())))
-                    temp_j.append(temp_k)
-
-            temp_exclusions.append(temp_j)
-        
-        formatted_model_spec["exclusions"] = temp_exclusions
-    
-    if 'lags' in formatted_model_spec.keys():
-        temp_lags = {}
-        for var, lags in formatted_model_spec['lags'].items():
-            var_tidy = regex_special_chars.sub('_', unidecode(var.lower()))
-            temp_lags[var_tidy] = lags
-        formatted_model_spec['lags'] = temp_lags
-    
-    
-    if 'user_model' in formatted_model_spec.keys():
-        temp_user_model = []
-
-        for i in formatted_model_spec["user_model"]:       
-                temp_j = []
-                for j in i:
-                    temp_j.append(regex_special_chars.sub('_', unidecode(j.lower())))
-                temp_user_model.append(temp_j)
-        formatted_model_spec["user_model"] = temp_user_model
-
-    if user_model:
-        for models in user_model.values():
-            for model in models:
-                # ------ removing vars' accentuation and special characters ------ 
-                model["vars"] = [regex_special_chars.sub('_', unidecode(v.lower())) for v in model["vars"]]
-
-                # ------ Turning None into "NA" to make compatible with 'R' scripts ------ 
-                if 'order' in model.keys():
-                    model["order"] = ["NA" if x is None else x for x in model["order"]]
-
-                if "constraints" not in model.keys():
-                    continue
-
-                new_constraints = {}
-
-                # ------ removing constraints' accentuation and special characters ------ 
-                for constraint_name, constraint_values in model["constraints"].items():
-                    _constraint_values_str = [str(x) for x in constraint_values]
-                    new_constraints[regex_special_chars.sub('_', unidecode(constraint_name.lower()))] = _constraint_values_str
-                model["constraints"] = new_constraints
-
-    # ----- Change formatted_model_spec to be R compatible
-    for key in formatted_model_spec.keys():
-        if key == "selection_methods":
-            for method in formatted_model_spec[key].keys():
-                if method != "apply.collinear":
-                    formatted_model_spec[key][method] = [formatted_model_spec[key][method]]
-        elif key not in ["lags", "exclusions", "golden_variables", "user_model"]:
-            formatted_model_spec[key] = [formatted_model_spec[key]]
-
-    # ----- Filling formatted_model_spec if anything is missing
-    columns_list = list(set(columns_list))
-    formatted_model_spec = _check_model_spec(model_spec=formatted_model_spec, column_list=columns_list)
+    formatted_model_spec = _format_specs(formatted_model_spec, user_model, columns_list)
     # ------ Unite everything into a dictionary -----------------
    
     body = {
@@ -336,11 +606,30 @@ def _build_call(
     
     # ----- Get the designated url ----------------------------------
 
-    url = _get_url(extension)
-    url_validation = _get_url("validate")
-    zipped_body = base64.b64encode(
-        gzip.compress(json.dumps(body).encode("utf-8"))
-    ).decode("utf-8")
+    with tracing.span("faas.serialize") as span:
+        if compact_numbers:
+            # The records already are JSON text, which replaces placeholders in the rest of the body
+            records = list(data_list.values())
+            body["data_list"] = {key: _RAW_MARKER.format(i) for i, key in enumerate(data_list)}
+            payload = _dumps_with_raw(body, records)
+        else:
+            payload = json.dumps(body).encode("utf-8")
+        span.set(bytes=len(payload))
+
+    # The estimate of _plan_shards is checked against the actual payload before anything is sent
+    if max_payload_bytes is not None and len(payload) > max_payload_bytes:
+        raise PayloadTooLargeError(
+            f"The payload of the data_list is {len(payload) / 1e6:.2f} MB, above the limit of {max_payload_bytes / 1e6:.2f} MB."
+        )
+
+    with tracing.span("faas.compress") as span:
+        zipped_body = base64.b64encode(
+            gzip.compress(payload)
+        ).decode("utf-8")
+        span.set(bytes_in=len(payload), bytes_out=len(zipped_body))
+
+    tracing.count("faas.bytes_raw", len(payload), endpoint=extension)
+    tracing.count("faas.bytes_compressed", len(zipped_body), endpoint=extension)
 
     # Uncomment to save locally
 
@@ -350,95 +639,182 @@ def _build_call(
     
     # return 0
 
-    headers = CaseInsensitiveDict()
+    headers = _payload_headers(access_token)
+    outbox = _resolve_outbox(outbox)
+
+    try:
+        r = _send_payload(zipped_body, extension, skip_validation, headers, proxies)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        if outbox is None:
+            raise
+        r = e
+
+    # The encoded body is kept, so the request is sent later without building it again
+    unavailable = _service_unavailable(extension, r) if outbox is not None else None
+    if unavailable:
+        entry_id = outbox.put(zipped_body, extension, project_id, skip_validation, proxies, unavailable)
+        return _QueuedRequest(outbox, entry_id, unavailable)
+
+    return r
+
+
+def _payload_headers(access_token: str):
+    """
+    Headers of the requests to the validation and modelling APIs
+    """
+    headers = requests.structures.CaseInsensitiveDict()
     headers["authorization"] = f"Bearer {access_token}"
     headers["user-agent"] = FOURI_USER_AGENT
+    return headers
 
-    def send_request(extension):
-        if extension == "validate":
 
-            return requests.post(
-                url,
-                {"body": zipped_body, "check_model_spec": True},
-                headers=headers,
-                timeout=1200,
-                proxies=proxies
-            )
+def _response_json(response) -> dict:
+    """
+    Content of a response of the modelling API, which is not JSON when a gateway rejected the request
+    """
+    try:
+        return json.loads(response.text)
+    except ValueError:
+        return {}
 
-        else:
-            if skip_validation:
-                
-                modelling_response = requests.post(
-                    url,
-                    json={"body": zipped_body, "skip_validation": True},
-                    headers=headers,
-                    timeout=1200,
-                    proxies=proxies
-                )
-                modelling_status = modelling_response.status_code
-                modelling_response = json.loads(modelling_response.text)
-                modelling_response['api_status_code'] = modelling_status
-                validation_response = {"status":"skip_validation", "info": "skip_validation"}
-            else:
-                # Now calls validation separately
-
-                validation_response = requests.post(url_validation,
-                                                    {'body': zipped_body,
-                                                     'check_model_spec': True},
-                                                    headers=headers,
-                                                    timeout=1200,
-                                                    proxies=proxies)
-                
-                validation_code =  validation_response.status_code
 
-                if validation_code not in [200, 201, 202]:
+def _send_payload(zipped_body: str, extension: str, skip_validation: bool, headers, proxies: Union[dict, None]):
+    """
+    Sends an encoded body built by _build_call to the validation API, or to the validation and modelling APIs.
+    Internal errors (500) are retried up to 5 times; the validation of a 'projects' request is sent once, and
+    answers of an unavailable service are not retried, so they can be saved to an outbox.
 
-                    modelling_response = {"info": "validation_error"}
+    Args:
+        zipped_body: compressed and base64 encoded JSON payload
+        extension: 'validate' or 'projects'
+        skip_validation: if the validation step should be bypassed
+        headers: headers of the request, see _payload_headers
+        proxies: proxies of the request, if any
+    Returns:
+        The response of the validation API for 'validate', or a list with the validation and modelling responses
+    """
+    url = _get_url(extension)
+    url_validation = _get_url("validate")
 
-                    validation_response = {'api_status': validation_code, 'api_content': validation_response}
-                        
-                else:
+    def send_validation():
+        return _send("POST", url_validation, "validate",
+                     data={'body': zipped_body, 'check_model_spec': True},
+                     headers=headers,
+                     timeout=1200,
+                     proxies=proxies)
+
+    def send_modelling():
+        modelling_response = _send("POST", url, "projects",
+                                   json={'body': zipped_body, 'skip_validation': True},
+                                   headers=headers,
+                                   timeout=1200,
+                                   proxies=proxies)
+        modelling_status = modelling_response.status_code
+        modelling_response = _response_json(modelling_response)
+        modelling_response['api_status_code'] = modelling_status
+        return modelling_response
+
+    def send_with_retries(send, retry, attempts=5):
+        for attempt in range(attempts):
+
+            if attempt > 0:
+                tracing.count("faas.retries", endpoint=extension)
+                time.sleep(1)
 
-                    validation_response = json.loads(validation_response.text)
+            with tracing.span("faas.attempt", attempt=attempt + 1):
+                r = send()
 
-                    if validation_response['status'] in [200, 201, 202]:
-                        
-                        if 'info' not in validation_response.keys() or 'error_list' not in validation_response['info'].keys() or len(validation_response['info']['error_list']) == 0:
-                            modelling_response = requests.post(url,
-                                                                json={'body': zipped_body,
-                                                                        'skip_validation': True},
-                                                                headers=headers,
-                                                                timeout=1200,
-                                                                proxies=proxies) 
-                            modelling_status = modelling_response.status_code
-                            modelling_response = json.loads(modelling_response.text)
-                            modelling_response['api_status_code'] = modelling_status
-                        
-                    else:
-                        modelling_response = {"info": "validation_error"}
+            if not retry(r):
+                break
 
+        return r
 
-            return [validation_response, modelling_response]
+    if extension == "validate":
+        return send_with_retries(send_validation, lambda r: r.status_code == 500)
 
-    for _ in range(5):
+    if skip_validation:
+        validation_response = {"status": "skip_validation", "info": "skip_validation"}
+    else:
+        # Now calls validation separately, once
+        validation_response = send_with_retries(send_validation, lambda r: False)
+        validation_code = validation_response.status_code
 
-        r = send_request(extension)
+        if validation_code not in [200, 201, 202]:
+            return [{'api_status': validation_code, 'api_content': validation_response}, {"info": "validation_error"}]
 
-        if extension == "validate":
-            if r.status_code != 500:
-                break
-            else:
-                time.sleep(1)
-        else:
-            if any(key in ["status", "info"] for key in r[1].keys()):
-                break
-            else:
-                time.sleep(1)
+        validation_response = json.loads(validation_response.text)
+        has_errors = (
+            'info' in validation_response.keys() and isinstance(validation_response['info'], dict)
+            and len(validation_response['info'].get('error_list', [])) > 0
+        )
+        if validation_response['status'] not in [200, 201, 202] or has_errors:
+            return [validation_response, {"info": "validation_error"}]
 
-    return r
+    # Only an internal error without an answer of the API is retried
+    modelling_response = send_with_retries(
+        send_modelling,
+        lambda r: not any(key in ["status", "info"] for key in r.keys()) and r['api_status_code'] == 500
+    )
+    return [validation_response, modelling_response]
 
 
+def _service_unavailable(extension: str, response) -> Union[str, None]:
+    """
+    Describes why a request was rejected by a service that is down or overloaded (_UNAVAILABLE_STATUS,
+    connection errors and timeouts), or returns None for any other response
 
+    Args:
+        extension: 'validate' or 'projects'
+        response: return of _send_payload, or the connection error it raised
+    """
+    if isinstance(response, Exception):
+        return f"{type(response).__name__}: {response}"
+
+    if extension == "validate":
+        if response.status_code in _UNAVAILABLE_STATUS:
+            return f"Validation - Status Code: {response.status_code}"
+        return None
+
+    validation_response, modelling_response = response
+    if validation_response.get("api_status") in _UNAVAILABLE_STATUS:
+        return f"Validation - Status Code: {validation_response['api_status']}"
+    modelling_status = modelling_response.get("status", modelling_response.get("api_status_code"))
+    if modelling_status in _UNAVAILABLE_STATUS:
+        return f"Modeling - Status Code: {modelling_status}"
+    return None
+
+
+def _request_outcome(extension: str, response) -> tuple:
+    """
+    Outcome of a request sent from the outbox: ('sent', details) or ('failed', details with the error)
+
+    Raises:
+        AuthenticationError: if the login expired
+    """
+    if extension == "validate":
+        if response.status_code == 401:
+            raise AuthenticationError()
+        content = _response_json(response)
+        errors = content.get("info", {}).get("error_list") if isinstance(content.get("info"), dict) else None
+        if response.status_code in [200, 201, 202] and content.get("status") in [200, 201, 202] and not errors:
+            return "sent", {"api_status": content["status"]}
+        return "failed", {"error": f"Status Code: {content.get('status', response.status_code)}. Content: {content}"}
+
+    validation_response, modelling_response = response
+    if 401 in [validation_response.get("api_status"), modelling_response.get("status"),
+               modelling_response.get("api_status_code")]:
+        raise AuthenticationError()
+
+    if modelling_response.get("status") in [200, 201, 202, "created"]:
+        return "sent", {"api_status": modelling_response["status"], "project_id": modelling_response.get("id")}
+    if modelling_response.get("info") == "validation_error":
+        content = validation_response.get("info", validation_response.get("api_content"))
+        return "failed", {"error": f"Validation error: {content}"}
+    status = modelling_response.get("status", modelling_response.get("api_status_code"))
+    return "failed", {"error": f"Modeling - Status Code: {status}. Content: {modelling_response}"}
+
+
+@profiling.profiled("faas.validate_models")
 def validate_models(data_list: Dict[str, pd.DataFrame],
                     date_variable: str,
                     date_format: str,
@@ -456,16 +832,31 @@ def validate_models(data_list: Dict[str, pd.DataFrame],
         model_spec: dictionary containing arguments required by the API
         project_name: name of the project defined by the user, that should be at most 50 characters long
         user_model: dictionary with the response variable names and their respective model specifications and constraints
+        max_payload_bytes: (keyword) maximum size of the JSON payload of a request, checked before it is built and sent
+        max_memory_bytes: (keyword) maximum memory used to build the payload of a request (estimated from the payload size)
+        split: (keyword) if True, a data_list above the limits is validated in parts named <project_name>_part<n>,
+               instead of raising PayloadTooLargeError
+        outbox: (keyword) Outbox, folder of an Outbox or True for the default one. If the service is unavailable
+                (429, 502, 503, connection error or timeout), the encoded request is saved to it, to be sent
+                later by Outbox.flush() or Outbox.drain(), instead of raising APIError
+        compact_numbers: (keyword) if True, the numbers are written in the shortest text at the given decimal places
+                         and the integer values without a fractional part, which makes the payload smaller and
+                         faster to build (Default is False)
+        decimals: (keyword) decimal places of the numbers sent (Default is 6)
 
     Returns:
         If successfully received, returns the API's return code and email address to which the results
         will be sent. If failed, return API's return code.
     '''
     if any([x not in ['skip_validation', 'version_check',
-                      'proxy_url', 'proxy_port'] for x in list(kwargs.keys())]):
+                      'proxy_url', 'proxy_port', 'max_payload_bytes',
+                      'max_memory_bytes', 'split', 'outbox',
+                      'compact_numbers', 'decimals'] for x in list(kwargs.keys())]):
         unexpected = list(kwargs.keys())
         for arg in ['skip_validation', 'version_check',
-                    'proxy_url', 'proxy_port']:
+                    'proxy_url', 'proxy_port', 'max_payload_bytes',
+                    'max_memory_bytes', 'split', 'outbox',
+                    'compact_numbers', 'decimals']:
             if arg in list(kwargs.keys()):
                 unexpected.remove(arg)
 
@@ -487,12 +878,38 @@ def validate_models(data_list: Dict[str, pd.DataFrame],
     if 'proxy_port' in kwargs:
         proxy_port = kwargs['proxy_port']
 
+    max_payload_bytes = kwargs.get('max_payload_bytes')
+    max_memory_bytes = kwargs.get('max_memory_bytes')
+    split = kwargs.get('split', False)
+    outbox = _resolve_outbox(kwargs.get('outbox'))
+    compact_numbers = kwargs.get('compact_numbers', False)
+    decimals = kwargs.get('decimals', 6)
+
+    shards = _plan_shards(data_list, date_variable, date_format, model_spec, project_name, user_model,
+                          max_payload_bytes, max_memory_bytes, split, compact_numbers, decimals)
+    if len(shards) > 1:
+        for part, keys in enumerate(shards, start=1):
+            print(f"\nPart {part} of {len(shards)} ({len(keys)} datasets): {project_name}_part{part}")
+            validate_models({key: data_list[key] for key in keys}, date_variable, date_format, model_spec,
+                            f"{project_name}_part{part}",
+                            copy.deepcopy({key: user_model[key] for key in keys if key in user_model}),
+                            skip_validation=skip_validation, version_check=version_check and part == 1,
+                            proxy_url=proxy_url, proxy_port=proxy_port,
+                            max_payload_bytes=max_payload_bytes, max_memory_bytes=max_memory_bytes, outbox=outbox,
+                            compact_numbers=compact_numbers, decimals=decimals)
+        return
+
     req = _build_call(data_list, date_variable,
                       date_format, model_spec,
                       project_name, user_model,
                       skip_validation,
                       version_check, 'validate',
-                      proxy_url, proxy_port)
+                      proxy_url, proxy_port,
+                      _payload_limit(max_payload_bytes, max_memory_bytes),
+                      outbox, compact_numbers, decimals)
+    if isinstance(req, _QueuedRequest):
+        print(req.message())
+        return
     req_status = req.status_code
 
     if req_status not in [200, 201, 202]:
@@ -549,6 +966,7 @@ def validate_models(data_list: Dict[str, pd.DataFrame],
 
 
 
+@profiling.profiled("faas.run_models")
 def run_models(data_list: Dict[str, pd.DataFrame],
                date_variable: str,
                date_format: str,
@@ -569,17 +987,36 @@ def run_models(data_list: Dict[str, pd.DataFrame],
         project_name: name of the project defined by the user, that should be at most 50 characters long
         user_model: dictionary with the response variable names and their respective model specifications and constraints
         get_project_id: if True, returns the project ID when the request is successful
+        max_payload_bytes: (keyword) maximum size of the JSON payload of a request, checked before it is built and sent
+        max_memory_bytes: (keyword) maximum memory used to build the payload of a request (estimated from the payload size)
+        split: (keyword) if True, a data_list above the limits is sent as several linked projects named
+               <project_name>_part<n>, instead of raising PayloadTooLargeError
+        outbox: (keyword) Outbox, folder of an Outbox or True for the default one. If the service is unavailable
+                (429, 502, 503, connection error or timeout), the encoded request is saved to it, to be sent
+                later by Outbox.flush() or Outbox.drain(), instead of raising APIError. Returns None in that case
+        compact_numbers: (keyword) if True, the numbers are written in the shortest text at the given decimal places
+                         and the integer values without a fractional part, which makes the payload smaller and
+                         faster to build (Default is False)
+        decimals: (keyword) decimal places of the numbers sent (Default is 6)
 
     Returns:
         If successfully received, returns the API's return code and email address to which the results
-        will be sent. If failed, return API's return code.
+        will be sent. If failed, return API's return code. When the data_list is split and get_project_id
+        is True, returns the list of the project IDs of the parts, in order.
+    Raises:
+        PartialSubmissionError: when the data_list is split and some parts were not created (failed, or saved
+                                to the outbox), with the IDs of the parts created in its project_ids attribute
     '''
     
     if any([x not in ['skip_validation', 'version_check',
-                      'proxy_url', 'proxy_port'] for x in list(kwargs.keys())]):
+                      'proxy_url', 'proxy_port', 'max_payload_bytes',
+                      'max_memory_bytes', 'split', 'outbox',
+                      'compact_numbers', 'decimals'] for x in list(kwargs.keys())]):
         unexpected = list(kwargs.keys())
         for arg in ['skip_validation', 'version_check',
-                    'proxy_url', 'proxy_port']:
+                    'proxy_url', 'proxy_port', 'max_payload_bytes',
+                    'max_memory_bytes', 'split', 'outbox',
+                    'compact_numbers', 'decimals']:
             if arg in list(kwargs.keys()):
                 unexpected.remove(arg)
 
@@ -602,12 +1039,71 @@ def run_models(data_list: Dict[str, pd.DataFrame],
     if 'proxy_port' in kwargs:
         proxy_port = kwargs['proxy_port']
 
+    max_payload_bytes = kwargs.get('max_payload_bytes')
+    max_memory_bytes = kwargs.get('max_memory_bytes')
+    split = kwargs.get('split', False)
+    outbox = _resolve_outbox(kwargs.get('outbox'))
+    compact_numbers = kwargs.get('compact_numbers', False)
+    decimals = kwargs.get('decimals', 6)
+
+    shards = _plan_shards(data_list, date_variable, date_format, model_spec, project_name, user_model,
+                          max_payload_bytes, max_memory_bytes, split, compact_numbers, decimals)
+    if len(shards) > 1:
+        project_ids = []
+        parts = {}
+        for part, keys in enumerate(shards, start=1):
+            name = f"{project_name}_part{part}"
+            print(f"\nPart {part} of {len(shards)} ({len(keys)} datasets): {name}")
+            try:
+                project_id = run_models({key: data_list[key] for key in keys}, date_variable, date_format, model_spec,
+                                        name,
+                                        copy.deepcopy({key: user_model[key] for key in keys if key in user_model}),
+                                        get_project_id=True, skip_validation=skip_validation,
+                                        version_check=version_check and part == 1, proxy_url=proxy_url,
+                                        proxy_port=proxy_port, max_payload_bytes=max_payload_bytes,
+                                        max_memory_bytes=max_memory_bytes, outbox=outbox,
+                                        compact_numbers=compact_numbers, decimals=decimals)
+            except AuthenticationError as e:
+                # The other parts would fail the same way
+                parts[name] = {"status": "failed", "error": str(e)}
+                for later in range(part + 1, len(shards) + 1):
+                    parts[f"{project_name}_part{later}"] = {"status": "not_sent"}
+                break
+            except Exception as e:
+                parts[name] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                continue
+
+            if project_id is not None:
+                project_ids.append(project_id)
+                parts[name] = {"status": "created", "project_id": project_id}
+            elif outbox is not None and any(entry["project_name"] == name for entry in outbox.entries()):
+                parts[name] = {"status": "queued"}
+            else:
+                parts[name] = {"status": "failed", "error": "Not created, see the validation messages."}
+
+        if len(project_ids) < len(shards):
+            summary = "\n".join(f"  {name}: {', '.join(str(value) for value in outcome.values())}"
+                                 for name, outcome in parts.items())
+            raise PartialSubmissionError(
+                f"{len(project_ids)} of {len(shards)} parts were created:\n{summary}\n"
+                f"The created projects are running; send only the other parts again.",
+                project_ids, parts,
+            )
+        if get_project_id:
+            return project_ids
+        return
+
     req = _build_call(data_list, date_variable, 
                       date_format, model_spec,
                       project_name, user_model,
                       skip_validation,
                       version_check, 'projects',
-                      proxy_url, proxy_port)
+                      proxy_url, proxy_port,
+                      _payload_limit(max_payload_bytes, max_memory_bytes),
+                      outbox, compact_numbers, decimals)
+    if isinstance(req, _QueuedRequest):
+        print(req.message())
+        return
     api_response_validation = req[0]
     api_response_modelling = req[1]
 
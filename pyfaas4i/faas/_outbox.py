@@ -0,0 +1,285 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from typing import List, Union
+
+from pyfaas4i import tracing
+from pyfaas4i._packcache import _atomic_write, _cache_dir
+
+__all__ = ["Outbox"]
+
+# Entries being sent by a flush are renamed to <id>.sending; older ones were left by an interrupted flush
+_STALE_SENDING_SECONDS = 3600
+
+
+class Outbox:
+    """
+    Folder of requests that could not be sent because the validation or modelling service was unavailable
+    (429, 502 or 503 responses, connection errors and timeouts). Each entry keeps the compressed body of
+    the request, so it is sent later by flush() or drain() without encoding the data_list again.
+
+    Entries are files, written atomically, so they survive the end of the process and several processes
+    can share the same outbox. A flush sends the oldest entries first and stops at the first one still
+    rejected as unavailable, waiting with an exponential backoff before trying again.
+
+    Args:
+        path: folder of the outbox, created if it does not exist (Default is the outbox folder in the cache
+              folder, PYFAAS4I_CACHE_DIR or ~/.cache/pyfaas4i)
+
+    Example:
+    ::
+    >>> outbox = Outbox("./outbox")
+    >>> run_models(data_list, date_variable, date_format, model_spec, "sales", outbox=outbox)
+    The service is unavailable (Status Code: 503), the request was saved to the outbox ./outbox as 3f2a...
+    >>> outbox.drain(timeout=3600)
+    [{'id': '3f2a...', 'project_name': 'sales', 'status': 'sent', 'project_id': '6f1c...', ...}]
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(_cache_dir(True), "outbox")
+        os.makedirs(os.path.join(self.path, "failed"), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries())
+
+    def __repr__(self):
+        return f"Outbox({self.path!r}, {len(self)} entries)"
+
+    def _file(self, entry_id: str, extension: str) -> str:
+        return os.path.join(self.path, f"{entry_id}.{extension}")
+
+    def _write_metadata(self, target: str, metadata: dict):
+        def write(temp_path):
+            with open(temp_path, "w", encoding="utf-8") as metadata_file:
+                json.dump(metadata, metadata_file, indent=1)
+
+        _atomic_write(target, write)
+
+    def put(self, zipped_body: str, extension: str, project_name: str, skip_validation: bool,
+            proxies: dict = None, error: str = None) -> str:
+        """
+        Saves a request that could not be sent
+
+        Args:
+            zipped_body: compressed and encoded body built by _build_call
+            extension: 'validate' or 'projects'
+            project_name: name of the project
+            skip_validation: if the validation step should be bypassed
+            proxies: proxies of the request, if any
+            error: description of the failed attempt
+        Returns:
+            Id of the entry
+        """
+        entry_id = f"{time.strftime('%Y%m%d%H%M%S')}-{os.urandom(6).hex()}"
+        with open(self._file(entry_id, "body"), "w", encoding="utf-8") as body_file:
+            body_file.write(zipped_body)
+
+        # The metadata is written last, so an entry is only listed once its body is complete
+        self._write_metadata(self._file(entry_id, "json"), {
+            "id": entry_id,
+            "project_name": project_name,
+            "extension": extension,
+            "skip_validation": skip_validation,
+            "proxies": proxies,
+            "created_at": time.time(),
+            "attempts": 1,
+            "next_attempt_at": time.time(),
+            "last_error": error,
+            "bytes": len(zipped_body),
+        })
+        tracing.count("outbox.queued", extension=extension)
+        return entry_id
+
+    def entries(self) -> List[dict]:
+        """
+        Metadata of the entries waiting to be sent, oldest first
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.path, name), encoding="utf-8") as metadata_file:
+                    entries.append(json.load(metadata_file))
+            except (OSError, ValueError):
+                # Claimed by another flush in the meantime
+                continue
+        return sorted(entries, key=lambda entry: entry["created_at"])
+
+    def failed(self) -> List[dict]:
+        """
+        Metadata of the entries rejected by the service (e.g. validation errors), with their error
+        """
+        folder = os.path.join(self.path, "failed")
+        entries = []
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".json"):
+                with open(os.path.join(folder, name), encoding="utf-8") as metadata_file:
+                    entries.append(json.load(metadata_file))
+        return entries
+
+    def remove(self, entry_id: str):
+        """
+        Deletes an entry without sending it
+        """
+        for extension in ["json", "sending", "body"]:
+            if os.path.exists(self._file(entry_id, extension)):
+                os.remove(self._file(entry_id, extension))
+
+    def _claim(self, entry_id: str) -> bool:
+        try:
+            os.rename(self._file(entry_id, "json"), self._file(entry_id, "sending"))
+            return True
+        except OSError:
+            return False
+
+    def _restore_stale(self):
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if name.endswith(".sending") and time.time() - os.path.getmtime(path) > _STALE_SENDING_SECONDS:
+                os.replace(path, path[: -len(".sending")] + ".json")
+
+    def _log_sent(self, result: dict):
+        with self._lock, open(os.path.join(self.path, "sent.jsonl"), "a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps(result, default=str) + "\n")
+
+    def flush(self, backoff: float = 30.0, max_backoff: float = 3600.0, max_attempts: int = None) -> List[dict]:
+        """
+        Sends the entries that are due, oldest first, stopping at the first one rejected as unavailable
+
+        Args:
+            backoff: seconds before an entry rejected as unavailable is tried again, doubled after each attempt
+            max_backoff: maximum seconds between attempts
+            max_attempts: if provided, entries still unavailable after this number of attempts are moved to failed
+        Returns:
+            One dictionary per entry tried, with its id, project_name and status: 'sent' (with the project_id of
+            a 'projects' request), 'unavailable' (kept for a later flush) or 'failed' (moved to failed, with the error)
+        Raises:
+            AuthenticationError: if the login expired, leaving the entries in the outbox
+        """
+        from ._modellingcalls import _payload_headers, _request_outcome, _send_payload, _service_unavailable
+        from ._utilities import _get_access_token
+
+        requests_exceptions = _requests_exceptions()
+        self._restore_stale()
+        results = []
+        headers = None
+
+        for metadata in self.entries():
+            if metadata["next_attempt_at"] > time.time() or not self._claim(metadata["id"]):
+                continue
+
+            entry_id = metadata["id"]
+            sending = self._file(entry_id, "sending")
+            try:
+                headers = headers or _payload_headers(_get_access_token())
+                with open(self._file(entry_id, "body"), encoding="utf-8") as body_file:
+                    zipped_body = body_file.read()
+
+                with tracing.span("outbox.send", entry=entry_id, extension=metadata["extension"]):
+                    try:
+                        response = _send_payload(zipped_body, metadata["extension"], metadata["skip_validation"],
+                                                 headers, metadata["proxies"])
+                    except (requests_exceptions.ConnectionError, requests_exceptions.Timeout) as e:
+                        response = e
+                unavailable = _service_unavailable(metadata["extension"], response)
+                outcome = None if unavailable else _request_outcome(metadata["extension"], response)
+            except BaseException:
+                os.replace(sending, self._file(entry_id, "json"))
+                raise
+
+            result = {"id": entry_id, "project_name": metadata["project_name"], "extension": metadata["extension"]}
+
+            if unavailable:
+                metadata["attempts"] += 1
+                metadata["last_error"] = unavailable
+                if max_attempts is None or metadata["attempts"] < max_attempts:
+                    delay = min(max_backoff, backoff * 2 ** (metadata["attempts"] - 2))
+                    metadata["next_attempt_at"] = time.time() + delay * random.uniform(0.8, 1.2)
+                    self._write_metadata(self._file(entry_id, "json"), metadata)
+                    os.remove(sending)
+                    tracing.count("outbox.unavailable", extension=metadata["extension"])
+                    results.append({**result, "status": "unavailable", "error": unavailable})
+                    # The service is still down, the other entries wait for the next flush
+                    break
+                status, details = "failed", {"error": f"Still unavailable after {metadata['attempts']} attempts: {unavailable}"}
+            else:
+                status, details = outcome
+
+            result = {**result, "status": status, **details}
+            if status == "sent":
+                self.remove(entry_id)
+                self._log_sent({**result, "sent_at": time.time()})
+            else:
+                metadata.update(details, failed_at=time.time())
+                self._write_metadata(os.path.join(self.path, "failed", f"{entry_id}.json"), metadata)
+                shutil.move(self._file(entry_id, "body"), os.path.join(self.path, "failed", f"{entry_id}.body"))
+                os.remove(sending)
+            tracing.count(f"outbox.{status}", extension=metadata["extension"])
+            results.append(result)
+
+        return results
+
+    def drain(self, timeout: float = None, backoff: float = 30.0, max_backoff: float = 3600.0,
+              max_attempts: int = None) -> List[dict]:
+        """
+        Flushes the outbox until it is empty, waiting for the backoff of the entries between flushes
+
+        Args:
+            timeout: maximum seconds to wait (Default is until the outbox is empty)
+            backoff, max_backoff, max_attempts: see flush()
+        Returns:
+            Results of all the entries sent or failed (see flush())
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        results = []
+        while True:
+            results += [result for result in self.flush(backoff, max_backoff, max_attempts)
+                        if result["status"] != "unavailable"]
+            entries = self.entries()
+            if not entries:
+                return results
+
+            wait = max(0.0, min(entry["next_attempt_at"] for entry in entries) - time.time())
+            if deadline is not None:
+                if time.time() + wait > deadline:
+                    return results
+            time.sleep(max(wait, 0.05))
+
+
+class _QueuedRequest:
+    """
+    Returned by _build_call instead of a response when the request was saved to an outbox
+    """
+
+    def __init__(self, outbox: Outbox, entry_id: str, reason: str):
+        self.outbox = outbox
+        self.entry_id = entry_id
+        self.reason = reason
+
+    def message(self) -> str:
+        return (f"The service is unavailable ({self.reason}), the request was saved to the outbox {self.outbox.path} "
+                f"as {self.entry_id}.\nIt will be sent by Outbox.flush() or Outbox.drain().")
+
+
+def _requests_exceptions():
+    import requests.exceptions
+    return requests.exceptions
+
+
+def _resolve_outbox(outbox: Union[Outbox, str, bool, None]) -> Union[Outbox, None]:
+    """
+    Outbox from the outbox argument of run_models and validate_models: an Outbox, the path of its folder,
+    True for the default folder, or None/False to disable it
+    """
+    if outbox is None or outbox is False:
+        return None
+    if outbox is True:
+        return Outbox()
+    if isinstance(outbox, Outbox):
+        return outbox
+    return Outbox(str(outbox))
@@ -0,0 +1,377 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Union
+
+from pyfaas4i import tracing
+from pyfaas4i._checkimports import _LazyImport
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = ["TokenBucket", "AdaptiveConcurrency", "EndpointLimiter", "configure_limits", "reset_limits", "limits_stats"]
+
+requests = _LazyImport("requests")
+
+# Answers of a service that is overloaded, which make the concurrency limit decrease
+_OVERLOAD_STATUS = (429, 502, 503, 504)
+
+_DEFAULT = "*"
+
+
+class _FileLock:
+    """
+    Lock of a file shared by several processes
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def __call__(self):
+        with self._lock, open(self.path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate of requests: each request takes a token, and tokens are added at a
+    constant rate up to burst. With a state file, the bucket is shared by all the processes using it.
+
+    Args:
+        rate: tokens added per second
+        burst: maximum number of tokens, i.e. of requests sent at once after an idle period (Default is max(1, rate))
+        path: if provided, json file of the state of the bucket, locked on each use
+    """
+
+    def __init__(self, rate: float, burst: float = None, path: str = None):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, provided value was: {rate}.")
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.path = path
+        self._state = {"tokens": self.burst, "updated": time.time(), "paused_until": 0.0}
+        self._lock = threading.Lock() if path is None else _FileLock(path + ".lock")
+
+    @contextmanager
+    def _locked_state(self):
+        if self.path is None:
+            with self._lock:
+                yield self._state
+            return
+
+        with self._lock():
+            try:
+                with open(self.path, encoding="utf-8") as state_file:
+                    state = json.load(state_file)
+            except (OSError, ValueError):
+                state = {"tokens": self.burst, "updated": time.time(), "paused_until": 0.0}
+            yield state
+            with open(self.path, "w", encoding="utf-8") as state_file:
+                json.dump(state, state_file)
+
+    def _take(self) -> float:
+        """
+        Takes a token if there is one, returning 0, or returns the seconds until one is available
+        """
+        with self._locked_state() as state:
+            now = time.time()
+            if state["paused_until"] > now:
+                return state["paused_until"] - now
+            state["tokens"] = min(self.burst, state["tokens"] + (now - state["updated"]) * self.rate)
+            state["updated"] = now
+            if state["tokens"] >= 1:
+                state["tokens"] -= 1
+                return 0.0
+            return (1 - state["tokens"]) / self.rate
+
+    def acquire(self, timeout: float = None) -> float:
+        """
+        Waits for a token
+
+        Args:
+            timeout: maximum seconds to wait (Default is no limit)
+        Returns:
+            Seconds waited
+        Raises:
+            TimeoutError: if no token was available in time
+        """
+        start = time.monotonic()
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return time.monotonic() - start
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                raise TimeoutError(f"No request token was available in {timeout} seconds.")
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Holds the tokens for some seconds, e.g. the Retry-After of a 429 answer
+        """
+        with self._locked_state() as state:
+            state["paused_until"] = max(state["paused_until"], time.time() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    Limit of the requests in flight adjusted by additive increase and multiplicative decrease (AIMD): the limit
+    grows while the requests succeed, doubling per round trip until the first overload and then by one per round
+    trip, and is multiplied by decrease when the share of overloaded answers (429, 502, 503, 504, connection
+    errors and timeouts) in the last requests goes above error_threshold, or their average latency goes above
+    target_latency. Each process adapts its own limit.
+
+    Args:
+        max_concurrency: maximum limit
+        min_concurrency: minimum limit
+        initial: limit of the first requests (Default is min_concurrency)
+        target_latency: if provided, seconds of average latency above which the limit decreases
+        error_threshold: share of overloaded answers in the window above which the limit decreases
+        window: number of recent requests of the error rate and the average latency
+        decrease: factor applied to the limit on each decrease
+    """
+
+    def __init__(self, max_concurrency: int, min_concurrency: int = 1, initial: int = None,
+                 target_latency: float = None, error_threshold: float = 0.05, window: int = 20,
+                 decrease: float = 0.5):
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("The concurrency limits must satisfy 1 <= min_concurrency <= max_concurrency.")
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.target_latency = target_latency
+        self.error_threshold = error_threshold
+        self.window = window
+        self.decrease = decrease
+        self.limit = float(min(max_concurrency, max(min_concurrency, initial or min_concurrency)))
+        self.in_flight = 0
+        self.decreases = 0
+        self._slow_start = True
+        self._outcomes = []
+        self._latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float = None) -> float:
+        """
+        Waits until a request can be sent under the current limit
+
+        Returns:
+            Start time of the request, to be given to release()
+        Raises:
+            TimeoutError: if the limit did not allow the request in time
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                raise TimeoutError(f"The concurrency limit did not allow the request in {timeout} seconds.")
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, overloaded: bool):
+        """
+        Records the outcome of a request and adjusts the limit
+
+        Args:
+            started: return of acquire()
+            overloaded: if the service answered as overloaded or did not answer
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._condition:
+            self.in_flight -= 1
+            self._outcomes = (self._outcomes + [overloaded])[-self.window:]
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+
+            error_rate = sum(self._outcomes) / len(self._outcomes)
+            slow = self.target_latency is not None and self._latency > self.target_latency
+            congested = (overloaded and error_rate > self.error_threshold) or slow
+
+            # Requests sent before the last decrease already saw the old limit, so each round trip decreases once
+            if congested and started >= self._last_decrease:
+                self.limit = max(float(self.min_concurrency), self.limit * self.decrease)
+                self._last_decrease = now
+                self._slow_start = False
+                self.decreases += 1
+                if slow:
+                    self._latency = None
+            elif not congested and not overloaded:
+                increase = 1.0 if self._slow_start else 1.0 / self.limit
+                self.limit = min(float(self.max_concurrency), self.limit + increase)
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "decreases": self.decreases,
+                "error_rate": sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0,
+                "latency": self._latency,
+            }
+
+
+class EndpointLimiter:
+    """
+    Rate and concurrency limits of the requests to an endpoint, see configure_limits()
+    """
+
+    def __init__(self, endpoint: str, rate: float = None, burst: float = None, max_concurrency: int = None,
+                 min_concurrency: int = 1, initial_concurrency: int = None, target_latency: float = None,
+                 error_threshold: float = 0.05, window: int = 20, decrease: float = 0.5, shared_dir: str = None,
+                 timeout: float = None):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.bucket = None
+        self.concurrency = None
+        if rate is not None:
+            path = None
+            if shared_dir is not None:
+                os.makedirs(shared_dir, exist_ok=True)
+                path = os.path.join(shared_dir, f"{endpoint.replace('*', 'default')}.bucket")
+            self.bucket = TokenBucket(rate, burst, path)
+        if max_concurrency is not None:
+            self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency, initial_concurrency,
+                                                   target_latency, error_threshold, window, decrease)
+        self._waited = 0.0
+        self._requests = 0
+        self._stats_lock = threading.Lock()
+
+    @contextmanager
+    def request(self):
+        """
+        Context manager around a request: waits for the limits on entry, and records the outcome on exit.
+        The response must be given to the yielded callback. A request counts as an overload when the service
+        answers with a status of _OVERLOAD_STATUS or when it fails with a connection error or a timeout of
+        requests; other exceptions, such as a TimeoutError waiting for the limits, do not change the limit.
+        """
+        start = time.monotonic()
+        started = self.concurrency.acquire(self.timeout) if self.concurrency is not None else None
+        outcome = {"overloaded": False}
+        try:
+            if self.bucket is not None:
+                self.bucket.acquire(None if self.timeout is None else max(0.0, self.timeout - (time.monotonic() - start)))
+            waited = time.monotonic() - start
+            with self._stats_lock:
+                self._waited += waited
+                self._requests += 1
+            if waited > 0.001:
+                tracing.count("http.throttled_seconds", waited, endpoint=self.endpoint)
+
+            def record(response):
+                outcome["overloaded"] = response.status_code in _OVERLOAD_STATUS
+                retry_after = response.headers.get("Retry-After")
+                if self.bucket is not None and response.status_code in (429, 503) and retry_after:
+                    try:
+                        self.bucket.pause(min(float(retry_after), 300.0))
+                    except ValueError:
+                        # Retry-After can also be an HTTP date, which is not followed
+                        pass
+
+            yield record
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            outcome["overloaded"] = True
+            raise
+        finally:
+            if started is not None:
+                self.concurrency.release(started, outcome["overloaded"])
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = {"requests": self._requests, "waited_seconds": self._waited}
+        if self.bucket is not None:
+            stats.update(rate=self.bucket.rate, burst=self.bucket.burst)
+        if self.concurrency is not None:
+            stats.update(self.concurrency.stats())
+        return stats
+
+
+_limiters: Dict[str, EndpointLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_limits(endpoint: str = _DEFAULT, **options) -> EndpointLimiter:
+    """
+    Limits the requests of pyfaas4i to an endpoint, shared by all the threads of the process (and by all the
+    processes using the same shared_dir for the rate). Without limits, requests are sent right away.
+
+    Args:
+        endpoint: name of the endpoint ('validate', 'projects', 'project_status', 'download', 'list_projects',
+                  'github_release', 'auth_device_code', 'auth_token' or 'auth_refresh_token'), or '*' for the
+                  endpoints without their own limits
+        options:
+         - rate: maximum requests per second (token bucket)
+         - burst: maximum requests sent at once after an idle period (Default is max(1, rate))
+         - shared_dir: folder of the state of the token bucket, to share the rate between processes
+         - max_concurrency: maximum requests in flight, adapted between min_concurrency and max_concurrency
+           by AIMD on the error rate and latency of the answers
+         - min_concurrency, initial_concurrency, target_latency, error_threshold, window, decrease:
+           see AdaptiveConcurrency
+         - timeout: maximum seconds a request waits for the limits before raising TimeoutError
+    Returns:
+        The limiter of the endpoint, whose stats() method reports its state
+
+    Example:
+    ::
+    >>> configure_limits("projects", rate=2, burst=4, max_concurrency=8, shared_dir="/tmp/pyfaas4i_limits")
+    >>> configure_limits("download", max_concurrency=16, target_latency=30)
+    """
+    limiter = EndpointLimiter(endpoint, **options)
+    with _limiters_lock:
+        _limiters[endpoint] = limiter
+    return limiter
+
+
+def reset_limits(endpoint: str = None):
+    """
+    Removes the limits of an endpoint (Default is all of them)
+    """
+    with _limiters_lock:
+        if endpoint is None:
+            _limiters.clear()
+        else:
+            _limiters.pop(endpoint, None)
+
+
+def limits_stats() -> Dict[str, dict]:
+    """
+    State of the limiter of each endpoint: requests, seconds waited, rate and, with adaptive concurrency,
+    the current limit, requests in flight, number of decreases, error rate and average latency
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {endpoint: limiter.stats() for endpoint, limiter in limiters.items()}
+
+
+def _limiter(endpoint: str) -> Union[EndpointLimiter, None]:
+    return _limiters.get(endpoint) or _limiters.get(_DEFAULT)
+
+
+def _limits_from_env(value: str):
+    """
+    Limits configured by the PYFAAS4I_LIMITS environment variable: a json object of the options of each endpoint,
+    e.g. {"projects": {"rate": 2, "max_concurrency": 8}, "*": {"max_concurrency": 16}}
+    """
+    if not value:
+        return
+    for endpoint, options in json.loads(value).items():
+        configure_limits(endpoint, **options)
+
+
+_limits_from_env(os.getenv("PYFAAS4I_LIMITS", ""))
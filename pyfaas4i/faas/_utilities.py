@@ -1,26 +1,132 @@
+from __future__ import annotations
+
 import json
+import os
 import sys
+import time
 from logging import warning
 import re
 from os import path
 import importlib.resources as pkg_resources
-import pandas as pd
-import requests
 import warnings
 from pathlib import Path
-from requests.structures import CaseInsensitiveDict
 from configparser import ConfigParser
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
 from typing import Union
 
 import pyfaas4i
-from pyfaas4i import auth_files
+from pyfaas4i import auth_files, profiling, tracing
+from pyfaas4i._checkimports import _LazyImport
+from ._ratelimit import _limiter
 from .services.constants import FOURI_USER_AGENT
 
-configur = ConfigParser()
-with pkg_resources.path(auth_files, "config.ini") as ci:
-        config_ini = str(ci)
+# Heavy dependencies are imported on first use, keeping `import pyfaas4i.faas` fast
+pd = _LazyImport("pandas")
+requests = _LazyImport("requests")
+
+
+# Base URLs of the FaaS APIs, which can be replaced through environment variables (e.g. to use a local stand-in server)
+MODELLING_URL = "https://run-prod-4casthub-faas-modelling-api-zdfk3g7cpq-ue.a.run.app/api/v1"
+VALIDATION_URL = "https://run-prod-4casthub-api-faas-validation-zdfk3g7cpq-ue.a.run.app/api/v1"
+
+
+def _modelling_url() -> str:
+    """
+    Base URL of the modelling API, from PYFAAS4I_MODELLING_URL if set
+    """
+    return os.getenv("PYFAAS4I_MODELLING_URL", MODELLING_URL).rstrip("/")
+
 
-configur.read(ci)
+def _validation_url() -> str:
+    """
+    Base URL of the validation API, from PYFAAS4I_VALIDATION_URL if set
+    """
+    return os.getenv("PYFAAS4I_VALIDATION_URL", VALIDATION_URL).rstrip("/")
+
+
+def _config_file() -> str:
+    """
+    Path of the config.json file with the login data, from PYFAAS4I_CONFIG_JSON if set
+    """
+    return os.getenv("PYFAAS4I_CONFIG_JSON", pyfaas4i.__path__[0] + "/config.json")
+
+
+@lru_cache(maxsize=None)
+def _get_config() -> ConfigParser:
+    """
+    Reads the authentication settings from config.ini, on first use
+    Returns:
+        The parsed configuration
+    """
+    configur = ConfigParser()
+    with pkg_resources.path(auth_files, "config.ini") as ci:
+        configur.read(ci)
+
+    return configur
+
+
+def __getattr__(name: str):
+    # Kept for compatibility with code that reads the configuration as a module attribute
+    if name == "configur":
+        return _get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@contextmanager
+def _exchange(method: str, url: str, endpoint: str, **kwargs):
+    """
+    Sends an HTTP request inside a tracing span, counting the requests and the latency per endpoint,
+    under the rate and concurrency limits of the endpoint if any (see configure_limits). The response
+    is yielded while the concurrency slot of the endpoint is held, so a streamed body is read inside it.
+    Args:
+        method: HTTP method, e.g. 'GET' or 'POST'
+        url: URL of the request
+        endpoint: short name of the endpoint used in spans and counters, e.g. 'validate'
+        kwargs: arguments passed to requests.request (data, json, headers, timeout, proxies, stream...)
+    Yields:
+        The requests response, closed on exit if streamed
+    """
+    limiter = _limiter(endpoint)
+    start = time.perf_counter()
+    with tracing.span("http.request", endpoint=endpoint, method=method) as span:
+        with limiter.request() if limiter is not None else nullcontext() as record:
+            try:
+                response = requests.request(method, url, **kwargs)
+            except Exception as e:
+                tracing.count("http.errors", endpoint=endpoint, error=type(e).__name__)
+                raise
+            if record is not None:
+                record(response)
+
+            span.set(status_code=response.status_code)
+            if not kwargs.get("stream"):
+                span.set(bytes_received=len(response.content))
+                yield response
+            else:
+                try:
+                    yield response
+                finally:
+                    response.close()
+
+    tracing.count("http.requests", endpoint=endpoint, status_code=response.status_code)
+    tracing.count("http.seconds", time.perf_counter() - start, endpoint=endpoint)
+
+
+def _send(method: str, url: str, endpoint: str, **kwargs):
+    """
+    Sends an HTTP request through _exchange, releasing the limits of the endpoint once it is answered.
+    Streamed bodies should be read inside _exchange instead.
+    Args:
+        method: HTTP method, e.g. 'GET' or 'POST'
+        url: URL of the request
+        endpoint: short name of the endpoint used in spans and counters, e.g. 'validate'
+        kwargs: arguments passed to requests.request (data, json, headers, timeout, proxies...)
+    Returns:
+        The requests response
+    """
+    with _exchange(method, url, endpoint, **kwargs) as response:
+        return response
 
 
 def _get_proxies(proxy_url: Union[str, None],
@@ -51,8 +157,8 @@ def _version_check(proxies):
         proxies: The proxies generated by _get_proxies
     '''
     uri = 'https://api.github.com/repos/4intelligence/pyfaas4i/releases/latest'
-    git_response = requests.get(uri,
-                                proxies=proxies)
+    git_response = _send("GET", uri, "github_release",
+                         proxies=proxies)
 
     if git_response.ok:
         latest_version = git_response.json()["tag_name"]
@@ -83,12 +189,12 @@ def _get_auth_data() -> str:
     auth_data: Authentication data for the specified domain.
     """
 
-    config_file = pyfaas4i.__path__[0] + "/config.json"
+    config_file = _config_file()
 
     if path.isfile(config_file):
         with open(config_file, "r") as config_:
             config_json = json.load(config_)
-            domain = configur.get("authentication", "domain")
+            domain = _get_config().get("authentication", "domain")
     else:
         raise ValueError("You must be authenticated in order to access the API. \n \
         Make sure you ran the pyfaas4i.faas.login function.")
@@ -117,6 +223,8 @@ def _get_access_token() -> str:
     return access_token
 
 
+@profiling.profiled("faas.download_zip")
+@tracing.traced("faas.download_zip")
 def download_zip(
     project_id: str,
     path: str,
@@ -179,13 +287,15 @@ def download_zip(
         raise ValueError("Variable 'filename' must not contain special characters")
 
     access_token = _get_access_token()
-    headers = CaseInsensitiveDict()
+    headers = requests.structures.CaseInsensitiveDict()
     headers["authorization"] = f"Bearer {access_token}"
     headers["user-agent"] = FOURI_USER_AGENT
 
     try:
-        response_check = requests.get(
-            url=f"https://run-prod-4casthub-faas-modelling-api-zdfk3g7cpq-ue.a.run.app/api/v1/projects/{project_id}",
+        response_check = _send(
+            "GET",
+            f"{_modelling_url()}/projects/{project_id}",
+            "project_status",
             timeout=1200,
             headers=headers,
             proxies=proxies
@@ -226,19 +336,21 @@ def download_zip(
     
     Path(path).mkdir(parents=True, exist_ok=True)
 
-    with open(Path(f"{path}/forecast-{filename}.zip"), "wb+") as fi:
-        try:
-            response = requests.get(
-                url=f"https://run-prod-4casthub-faas-modelling-api-zdfk3g7cpq-ue.a.run.app/api/v1/projects/{project_id}/download",
-                timeout=1200,
-                headers=headers,
-                stream=True,
-                proxies=proxies
-            )
-        except Exception as e:
-            print(f"Error: {e}")
+    # The body is read inside _exchange, so the download keeps its slot of the download limits until it ends
+    with open(Path(f"{path}/forecast-{filename}.zip"), "wb+") as fi, _exchange(
+        "GET",
+        f"{_modelling_url()}/projects/{project_id}/download",
+        "download",
+        timeout=1200,
+        headers=headers,
+        stream=True,
+        proxies=proxies
+    ) as response:
+        downloaded = 0
         for chunk in response.iter_content(32 * 1024):
             fi.write(chunk)
+            downloaded += len(chunk)
+        tracing.count("download.bytes", downloaded)
         if verbose:
             print(f"File downloaded to {path}/forecast-{filename}.zip")
 
@@ -248,6 +360,7 @@ def download_zip(
     return response.status_code
 
 
+@tracing.traced("faas.list_projects")
 def list_projects(
         project_id: str = None,
         return_dict: bool = False, **kwargs):
@@ -297,19 +410,21 @@ def list_projects(
 
 
     access_token = _get_access_token()
-    headers = CaseInsensitiveDict()
+    headers = requests.structures.CaseInsensitiveDict()
 
     headers["authorization"] = f"Bearer {access_token}"
     headers["user-agent"] = FOURI_USER_AGENT
 
-    url = "https://run-prod-4casthub-faas-modelling-api-zdfk3g7cpq-ue.a.run.app/api/v1/projects"
+    url = f"{_modelling_url()}/projects"
 
     if project_id:
         url += f"/{project_id}"
     
     try:
-        response = requests.get(
-            url=url,
+        response = _send(
+            "GET",
+            url,
+            "list_projects",
             timeout=1200,
             headers=headers,
             proxies=proxies
@@ -357,3 +472,26 @@ class ForbiddenError(Exception):
     ''' 
     def __init__(self, msg="Status Code: 403. Content: You don't have access rights to this content.", *args, **kwargs):
         super().__init__(msg, *args, **kwargs)
+
+
+class PayloadTooLargeError(ValueError):
+    '''
+    Raised before sending a request whose payload exceeds max_payload_bytes or max_memory_bytes. The sizes
+    attribute holds the estimated payload bytes of each dataset of the data_list.
+    '''
+    def __init__(self, msg, sizes=None, *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+        self.sizes = sizes or {}
+
+
+class PartialSubmissionError(APIError):
+    '''
+    Raised by run_models when some parts of a split data_list were not submitted. The project_ids attribute
+    holds the ids of the projects created (the parts already running), and the parts attribute the outcome
+    of every part: {'status': 'created', 'project_id': ...}, {'status': 'failed', 'error': ...},
+    {'status': 'queued'} (saved to the outbox) or {'status': 'not_sent'}.
+    '''
+    def __init__(self, msg, project_ids=None, parts=None, *args, **kwargs):
+        super().__init__(msg, *args, **kwargs)
+        self.project_ids = project_ids or []
+        self.parts = parts or {}
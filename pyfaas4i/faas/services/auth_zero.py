@@ -1,37 +1,65 @@
-
 import os
-import requests
 import time
 import json
 import sys
 
 import importlib.resources as pkg_resources
 from configparser import ConfigParser
+from functools import lru_cache
 from urllib.parse import urlencode
 
 import pyfaas4i 
-from pyfaas4i import auth_files
-from pyfaas4i.faas._utilities import _get_auth_data
+from pyfaas4i import auth_files, tracing
+from pyfaas4i.faas._utilities import _config_file, _get_auth_data, _send
 from .constants import AUTH0_DEVICE_CODE_URL, AUTH0_TOKEN_REQUEST_URL, FOURI_USER_AGENT
 
+SCHEME = "https://"
+TIMEOUT = 10
+TOKEN_ETA = 90
+HTTP_403 = 403
 
+# Settings read from config.ini (or the file in the CONFIG_INI environment variable) on first use
+_SETTINGS = {"DOMAIN": "domain", "CLIENT_ID": "client_id", "AUDIENCE": "audience"}
 
-CONFIG = ConfigParser()
 
-with pkg_resources.path(auth_files, "config.ini") as ci:
+@lru_cache(maxsize=None)
+def _get_config() -> ConfigParser:
+    '''
+    Reads the authentication configuration, on first use
+    '''
+    config = ConfigParser()
+
+    with pkg_resources.path(auth_files, "config.ini") as ci:
         config_ini = str(ci)
 
-CONFIG.read(os.getenv("CONFIG_INI", config_ini))
+    config.read(os.getenv("CONFIG_INI", config_ini))
+    return config
 
-DOMAIN = CONFIG.get("authentication", "domain")
-CLIENT_ID = CONFIG.get("authentication", "client_id")
-SCHEME = "https://"
-AUDIENCE = CONFIG.get("authentication", "audience")
-TIMEOUT = 10
-TOKEN_ETA = 90
-HTTP_403 = 403
+
+def _setting(name: str) -> str:
+    '''
+    Value of an authentication setting: 'DOMAIN', 'CLIENT_ID' or 'AUDIENCE'
+    '''
+    return _get_config().get("authentication", _SETTINGS[name])
 
 
+def _auth_url() -> str:
+    '''
+    Base URL of the auth0 API, from PYFAAS4I_AUTH_URL if set
+    '''
+    return os.getenv("PYFAAS4I_AUTH_URL", f"{SCHEME}{_setting('DOMAIN')}").rstrip("/")
+
+
+def __getattr__(name: str):
+    # CONFIG, DOMAIN, CLIENT_ID and AUDIENCE are resolved lazily, as module attributes
+    if name == "CONFIG":
+        return _get_config()
+    if name in _SETTINGS:
+        return _setting(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@tracing.traced("auth.device_code")
 def get_device_code(sleep_time,
                     proxies):
     '''
@@ -41,19 +69,19 @@ def get_device_code(sleep_time,
         sleep_time: Maximum waiting for URI authentication
         proxies: The proxies generated by _get_proxies
     '''
-    url = f"{SCHEME}{DOMAIN}{AUTH0_DEVICE_CODE_URL}"
+    url = f"{_auth_url()}{AUTH0_DEVICE_CODE_URL}"
     scope = "offline_access openid profile email"
-    payload = urlencode({"client_id": CLIENT_ID, "scope": scope, "audience": AUDIENCE})
+    payload = urlencode({"client_id": _setting("CLIENT_ID"), "scope": scope, "audience": _setting("AUDIENCE")})
     headers = {
         "content-type": "application/x-www-form-urlencoded",
         "User-Agent": FOURI_USER_AGENT,
     }
 
-    response = requests.post(url,
-                             data=payload,
-                             headers=headers,
-                             proxies=proxies,
-                             timeout=TIMEOUT)
+    response = _send("POST", url, "auth_device_code",
+                     data=payload,
+                     headers=headers,
+                     proxies=proxies,
+                     timeout=TIMEOUT)
     if response.ok:
         print(
             "Please copy and paste the URL below on " +
@@ -81,14 +109,14 @@ def _request_token(device_code_response,
         sleep_time: Maximum waiting for URI authentication
         proxies: The proxies generated by _get_proxies
     '''
-    url = f"{SCHEME}{DOMAIN}{AUTH0_TOKEN_REQUEST_URL}"
+    url = f"{_auth_url()}{AUTH0_TOKEN_REQUEST_URL}"
     device_code = device_code_response["device_code"]
 
     payload = urlencode(
         {
             "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
             "device_code": device_code,
-            "client_id": CLIENT_ID,
+            "client_id": _setting("CLIENT_ID"),
         }
     )
 
@@ -99,11 +127,11 @@ def _request_token(device_code_response,
 
     time.sleep(sleep_time)
 
-    response = requests.post(url,
-                             data=payload,
-                             headers=headers,
-                             proxies=proxies,
-                             timeout=TIMEOUT)
+    response = _send("POST", url, "auth_token",
+                     data=payload,
+                     headers=headers,
+                     proxies=proxies,
+                     timeout=TIMEOUT)
     if response.ok:
         print("Login successful!")
         _append_config_file(response.json())
@@ -115,6 +143,7 @@ def _request_token(device_code_response,
 
     return
 
+@tracing.traced("auth.refresh_token")
 def request_refresh_token(proxies):
     '''
         This function accesses the Auth0 API to refresh the access token
@@ -131,12 +160,12 @@ def request_refresh_token(proxies):
 
     refresh_token_value = auth_data["refresh_token"]
 
-    url = f"{SCHEME}{DOMAIN}{AUTH0_TOKEN_REQUEST_URL}"
+    url = f"{_auth_url()}{AUTH0_TOKEN_REQUEST_URL}"
 
     payload = urlencode(
         {
             "grant_type": "refresh_token",
-            "client_id": CLIENT_ID,
+            "client_id": _setting("CLIENT_ID"),
             "refresh_token": refresh_token_value
         }
     )
@@ -147,11 +176,11 @@ def request_refresh_token(proxies):
     }
 
 
-    response = requests.post(url,
-                             data=payload,
-                             headers=headers,
-                             proxies=proxies,
-                             timeout=TIMEOUT)
+    response = _send("POST", url, "auth_refresh_token",
+                     data=payload,
+                     headers=headers,
+                     proxies=proxies,
+                     timeout=TIMEOUT)
     if response.ok:
         print("Token refreshed successfully!")
         _append_config_file(response.json())
@@ -179,25 +208,27 @@ def _write_config_file(json_) -> None:
     Args:
         json_: JSON provided by the auth0 device login API
     '''
-    with open(pyfaas4i.__path__[0] + "/config.json", "w") as config_:
-        config_dict = {"auths": {DOMAIN: json_}}
+    with open(_config_file(), "w") as config_:
+        config_dict = {"auths": {_setting("DOMAIN"): json_}}
         json.dump(config_dict, config_, indent=4)
     return
 
 
-def _append_config_file(json_, filename= pyfaas4i.__path__[0] + "/config.json") -> None:
+def _append_config_file(json_, filename=None) -> None:
     '''
     Appends authentication info to the config.json file
     Args:
     json_: JSON provided by the auth0 authentication API
-    filename: Path to the initial config.json file
+    filename: Path to the initial config.json file (Default is the config.json of the package or PYFAAS4I_CONFIG_JSON)
     '''
-    
+    filename = filename or _config_file()
+
     with open(filename, "r+") as config_:
         file_data = json.load(config_)
-        file_data["auths"][DOMAIN].update(json_)
+        file_data["auths"][_setting("DOMAIN")].update(json_)
         config_.seek(0)
         json.dump(file_data, config_, indent=4)
+        config_.truncate()
     return
 
 
@@ -1,11 +1,373 @@
+from __future__ import annotations
+
 import json
-from pyfaas4i import R_tools
-import numpy as np
-import pandas as pd
+from typing import List, Union
+from pyfaas4i import R_tools, profiling, tracing
+from pyfaas4i._checkimports import _LazyImport
+from pyfaas4i._packcache import _cached, _cached_many, _materialize, clear_cache
+from pyfaas4i.ensemble import ForecastMatrix
 import os
-import subprocess
 from sys import platform
 
+# Heavy dependencies are imported on first use, keeping `import pyfaas4i.forecastpack` fast
+np = _LazyImport("numpy")
+pd = _LazyImport("pandas")
+subprocess = _LazyImport("subprocess")
+
+
+def _to_frame(table) -> pd.DataFrame:
+    """
+    Converts a table from the forecastpack (records or a cached Arrow slice) into a dataframe
+    """
+    if hasattr(table, "to_pandas"):
+        return table.to_pandas()
+    return pd.DataFrame(table)
+
+
+def _table_columns(table, names: List[str]) -> dict:
+    """
+    Extracts the requested columns from a forecastpack table without building a dataframe
+
+    Args:
+        table: records, a cached Arrow slice or a compact table
+        names: names of the columns
+    Returns:
+        columns: dictionary of numpy arrays (missing columns are filled with NaN)
+    """
+    if hasattr(table, "columns") and isinstance(table.columns, dict):
+        n_rows = len(next(iter(table.columns.values()))) if table.columns else 0
+        return {
+            name: np.asarray(table.columns[name]) if name in table.columns else np.full(n_rows, np.nan)
+            for name in names
+        }
+
+    if hasattr(table, "to_arrow"):
+        arrow_table = table.to_arrow()
+        return {
+            name: arrow_table.column(name).to_numpy(zero_copy_only=False)
+            if name in arrow_table.column_names else np.full(arrow_table.num_rows, np.nan)
+            for name in names
+        }
+
+    return {
+        name: np.array([row.get(name, np.nan) for row in table], dtype=object)
+        for name in names
+    }
+
+
+class _CompactTable:
+    """
+    Column-oriented, typed version of a forecastpack table, used by the compact mode of the forecast() loaders.
+
+    Dates are stored as datetime64, numeric columns as float arrays and text columns as categoricals,
+    instead of one Python dictionary per row.
+    """
+
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: dict):
+        self.columns = columns
+
+    def to_pandas(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns, copy=False)
+
+    def to_records(self) -> list:
+        frame = self.to_pandas()
+        for col in frame.columns:
+            if pd.api.types.is_datetime64_any_dtype(frame[col]):
+                frame[col] = frame[col].dt.strftime("%Y-%m-%d")
+        frame = frame.astype(object)
+        # Drops missing values, as done by jsonlite when writing the forecastpack
+        return [
+            {key: value for key, value in row.items() if not pd.isna(value)}
+            for row in frame.to_dict(orient="records")
+        ]
+
+
+def _compact_table(table, float_dtype: str) -> _CompactTable:
+    """
+    Converts a forecastpack table into a _CompactTable
+
+    Args:
+        table: records or a cached Arrow slice
+        float_dtype: 'float64' or 'float32', used for the numeric columns
+    """
+    frame = _to_frame(table)
+    columns = {}
+
+    for col in frame.columns:
+        values = frame[col]
+
+        if col == "data_tidy":
+            parsed = pd.to_datetime(values, errors="coerce")
+            if not parsed.isna().any() or values.isna().all():
+                columns[col] = parsed.to_numpy()
+                continue
+
+        numeric = pd.to_numeric(values, errors="coerce")
+        if numeric.notna().sum() == values.notna().sum():
+            columns[col] = numeric.to_numpy(dtype=float_dtype)
+        else:
+            columns[col] = pd.Categorical(values)
+
+    return _CompactTable(columns)
+
+
+def _compact_pack(pack: list, compact: Union[bool, str]) -> list:
+    """
+    Converts the tables of every model in the pack to _CompactTable objects
+
+    Args:
+        pack: parsed forecastpack
+        compact: True (or 'float64') to keep numeric columns as float64, 'float32' to halve their size
+    Raises:
+        ValueError: if compact is not a valid option
+    """
+    float_dtype = "float64" if compact is True else compact
+    if float_dtype not in ["float64", "float32"]:
+        raise ValueError(f"compact must be a boolean, 'float64' or 'float32', provided value was: {compact}.")
+
+    for model in pack:
+        for field in ["forecast", "data", "data_proj"]:
+            if model.get(field) is not None and not isinstance(model[field], _CompactTable):
+                model[field] = _compact_table(model[field], float_dtype)
+
+    return pack
+
+
+def _read_json_pack(path: str) -> list:
+    """
+    Parses a forecastpack json file
+    """
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+_R_PACKAGES_ERROR = "R and(or) the following packages are not installed: dplyr, jsonlite, lmtest, randomForest, glment, caret"
+
+
+def _check_R():
+    """
+    Checks if R is available in the user's PATH
+
+    Raises:
+        SystemError: if R is not installed
+    """
+    from subprocess import Popen, PIPE
+
+    ## Check if the user is using Windows
+    if platform.startswith("win"):
+        proc = Popen(["where", "R"], stdout=PIPE, stderr=PIPE)
+    else:
+        proc = Popen(["which", "R"], stdout=PIPE, stderr=PIPE)
+
+    exit_code = proc.wait()
+    if exit_code != 0:
+        raise SystemError(
+            "R is not installed. Install it through 'https://cran.r-project.org/'"
+        )
+
+
+def _rds_converter() -> str:
+    """
+    Path to the R script that converts forecastpacks from rds to json
+    """
+    import importlib.resources as pkg_resources
+
+    with pkg_resources.path(R_tools, "convert_rds.R") as p:
+        return str(p)
+
+
+def _read_rds_pack(path: str) -> list:
+    """
+    Converts a forecastpack rds file to json through R and parses it
+
+    Raises:
+        SystemError: if R or the required R packages are not installed
+    """
+    _check_R()
+
+    try:
+
+        json_file = subprocess.check_output(["Rscript", _rds_converter(), path])
+
+        return json.loads(json_file)
+
+    except:
+
+        raise SystemError(_R_PACKAGES_ERROR)
+
+
+def _read_rds_packs(paths: List[str]) -> list:
+    """
+    Converts several forecastpack rds files in a single R session
+
+    Args:
+        paths: paths to the rds files
+    Returns:
+        packs: a parsed forecastpack or a SystemError for each path, in the same order
+    """
+    import tempfile
+
+    _check_R()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        outputs = [os.path.join(temp_dir, f"{i}.json") for i in range(len(paths))]
+        arguments = [arg for pair in zip(paths, outputs) for arg in pair]
+
+        proc = subprocess.run(
+            ["Rscript", _rds_converter()] + arguments,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        errors = {}
+        for line in proc.stderr.decode("utf-8", errors="replace").splitlines():
+            if line.startswith("ERROR\t"):
+                _, failed_path, message = (line.split("\t", 2) + [""])[:3]
+                errors[failed_path] = message
+
+        packs = []
+        for path, output in zip(paths, outputs):
+            if os.path.isfile(output):
+                packs.append(_read_json_pack(output))
+            elif path in errors:
+                packs.append(SystemError(f"Could not convert {path}: {errors[path]}"))
+            else:
+                packs.append(SystemError(_R_PACKAGES_ERROR))
+
+    return packs
+
+
+def _select_fields(pack: list, fields: Union[List[str], None]) -> list:
+    """
+    Keeps only the requested fields of each model in the pack (the model type is always kept)
+    """
+    if fields is None:
+        return pack
+
+    keep = set(fields) | {"type"}
+    return [{key: value for key, value in model.items() if key in keep} for model in pack]
+
+
+def _read_many_json(path: str, fields: Union[List[str], None], cache: Union[bool, str]) -> list:
+    """
+    Worker of forecast.read_many() for json forecastpacks
+    """
+    return _select_fields(_cached(path, cache, _read_json_pack), fields)
+
+
+def _read_many_rds(paths: List[str], fields: Union[List[str], None], cache: Union[bool, str]) -> list:
+    """
+    Worker of forecast.read_many() for a chunk of rds forecastpacks, converted in a single R session
+    """
+    packs = _cached_many(paths, cache, _read_rds_packs)
+    return [
+        pack if isinstance(pack, Exception) else _select_fields(pack, fields)
+        for pack in packs
+    ]
+
+
+_MODEL_PROPERTIES = (
+    "type", "sample", "transformation",
+    "RMSE", "RMSE_list", "MPE", "MPE_list", "MAPE", "MAPE_list",
+    "WMAPE", "WMAPE_list", "MASE", "MASE_list", "MASEs", "MASEs_list",
+    "models", "infos", "data", "data_proj", "forecast",
+)
+
+
+def _model_properties(model: dict, simplify: bool = True) -> dict:
+    """
+    Builds the properties of a model of the forecastpack, as exposed by forecast() and ModelView()
+
+    Args:
+        model: dictionary of the model inside the forecastpack
+        simplify: If the forecast property will receive a simplified version of the original table or the whole data. (Default = True)
+    Returns:
+        properties: dictionary with a value for each name in _MODEL_PROPERTIES
+    """
+    properties = {
+        "type": model["type"],
+        "sample": model.get("sample"),
+        "transformation": model.get("transformation"),
+    }
+
+    for cv_metric in ["RMSE", "MPE", "MAPE", "WMAPE", "MASE", "MASEs"]:
+        try:
+            properties[cv_metric] = model[cv_metric]
+        except:
+            properties[cv_metric] = np.nan
+
+        # Fields may be missing when the pack was read with forecast.read_many(fields=...)
+        properties[f"{cv_metric}_list"] = model.get(f"{cv_metric}_list")
+
+    if "models" not in model:
+        properties["models"] = None
+    elif model["type"] == "ARIMA":
+        properties["models"] = dict(
+            (key, pd.DataFrame(model["models"][key]))
+            for key in model["models"].keys()
+        )
+    elif model["type"] == "RandomForest":
+        properties["models"] = pd.DataFrame(model["models"])
+    elif model["type"] in ["Lasso", "Ridge", "ElasticNet"]:
+        properties["models"] = dict(
+            (key, pd.DataFrame(model["models"][key]))
+            for key in ["bestTune", "coef", "varImp"]
+        )
+    else:
+        properties["models"] = model["models"]
+
+    properties["infos"] = model.get("infos")
+    properties["data"] = _to_frame(model["data"]) if "data" in model else None
+    properties["data_proj"] = _to_frame(model["data_proj"]) if "data_proj" in model else None
+
+    if "forecast" not in model:
+        properties["forecast"] = None
+    elif simplify:
+        properties["forecast"] = _to_frame(model["forecast"])[["data_tidy", "y_all", "type"]]
+    else:
+        properties["forecast"] = _to_frame(model["forecast"])
+
+    return properties
+
+
+class ModelView:
+    """
+    Read-only view of a single model of a forecastpack, returned by forecast.model().
+
+    It has the same properties as forecast() (type, metrics, models, infos, data, data_proj and forecast),
+    built for the chosen model only. Unlike set_model(), creating a view does not change the forecast()
+    object, so views can be used concurrently from several threads.
+    """
+
+    __slots__ = ("index",) + _MODEL_PROPERTIES
+
+    def __init__(self, index: int, properties: dict):
+        object.__setattr__(self, "index", index)
+        for name in _MODEL_PROPERTIES:
+            object.__setattr__(self, name, properties[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelView objects are read-only, use forecast.set_model() to change the selected model.")
+
+    def __delattr__(self, name):
+        raise AttributeError("ModelView objects are read-only.")
+
+    def __repr__(self):
+        return f"ModelView(index={self.index}, type={self.type!r})"
+
+
+class PackReadError(Exception):
+    '''
+    Inherits from generic exception to be used when a forecastpack could not be read by forecast.read_many()
+    '''
+    def __init__(self, path: str, error: Exception):
+        self.path = path
+        self.error = error
+        super().__init__(f"Could not read {path}: {error}")
+
+
 class forecast:
     """
     Class defined to store information from the 4intelligence forecast pack.
@@ -72,7 +434,6 @@ class forecast:
         self.data = None
         self.data_proj = None
         self.forecast = None
-        self.model = None
         self._model = 0
 
     def _refresh(self, simplify: bool = True):
@@ -94,49 +455,8 @@ class forecast:
 
         else:
 
-            pack = self.json
-            self.type = pack[self._model]["type"]
-            self.sample = pack[self._model]["sample"]
-            self.transformation = pack[self._model]["transformation"]
-
-            for cv_metric in ["RMSE", "MPE", "MAPE", "WMAPE", "MASE", "MASEs"]:
-                try:
-                    self.__setattr__(cv_metric, pack[self._model][cv_metric])
-                except:
-                    self.__setattr__(cv_metric, np.NaN)
-
-            self.RMSE_list = pack[self._model]["RMSE_list"]
-            self.MPE_list = pack[self._model]["MPE_list"]
-            self.MAPE_list = pack[self._model]["MAPE_list"]
-            self.WMAPE_list = pack[self._model]["WMAPE_list"]
-            self.MASE_list = pack[self._model]["MASE_list"]
-            self.MASEs_list = pack[self._model]["MASEs_list"]
-
-            if pack[self._model]["type"] == "ARIMA":
-                self.models = dict(
-                    (key, pd.DataFrame(pack[self._model]["models"][key]))
-                    for key in pack[self._model]["models"].keys()
-                )
-            elif pack[self._model]["type"] == "RandomForest":
-                self.models = pd.DataFrame(pack[self._model]["models"])
-            elif pack[self._model]["type"] in ["Lasso", "Ridge", "ElasticNet"]:
-                self.models = dict(
-                    (key, pd.DataFrame(pack[self._model]["models"][key]))
-                    for key in ["bestTune", "coef", "varImp"]
-                )
-            else:
-                self.models = pack[self._model]["models"]
-
-            self.infos = pack[self._model]["infos"]
-            self.data = pd.DataFrame(pack[self._model]["data"])
-            self.data_proj = pd.DataFrame(pack[self._model]["data_proj"])
-
-            if simplify:
-                forecast = pd.DataFrame(pack[self._model]["forecast"])
-                self.forecast = forecast[["data_tidy", "y_all", "type"]]
-                del forecast
-            else:
-                self.forecast = pd.DataFrame(pack[self._model]["forecast"])
+            for name, value in _model_properties(self.json[self._model], simplify).items():
+                self.__setattr__(name, value)
 
     def set_model(
         self, model_number: int = 0, simplify: bool = True, verbose: bool = True
@@ -165,7 +485,36 @@ class forecast:
         else:
             Warning("You do not have a forecast pack file loaded")
 
-    def from_json(self, path: str, raw: bool = False, simplify: bool = True):
+    def model(self, model_number: int, simplify: bool = True) -> ModelView:
+        """
+        Returns a read-only view of a model, without changing the model selected in the forecast() object
+
+        Args:
+            model_number: index of the model, starting at 0
+            simplify: If the forecast property will receive a simplified version of the original table or the whole data. (Default = True)
+
+        Returns:
+            view: ModelView with the properties of the model
+
+        Raises:
+            ValueError: if json file was not provided
+            IndexError: if model_number is not a model of the forecastpack
+        """
+        if not self.json:
+            raise ValueError(
+                "JSON source not found, specify a forecastpack using .from_json() or .from_rds()"
+            )
+
+        if not -len(self.json) <= model_number < len(self.json):
+            raise IndexError(f"model_number must be between 0 and {len(self.json) - 1}, provided value was: {model_number}.")
+
+        model_number = model_number % len(self.json)
+        return ModelView(model_number, _model_properties(self.json[model_number], simplify))
+
+    @profiling.profiled("forecastpack.from_json")
+    @tracing.traced("forecastpack.read")
+    def from_json(self, path: str, raw: bool = False, simplify: bool = True, cache: Union[bool, str] = False,
+                  compact: Union[bool, str] = False):
         """
         Fills the forecast() object properties according to data from a forecastpack json file.
 
@@ -173,21 +522,33 @@ class forecast:
             path: The path to the forecastpack.json file.
             raw: Boolean variable, to whether the raw json file is desired of if the information should be used in the class. (Default = False)
             simplify: If the forecast property will receive a simplified version of the original table or the whole data. (Default = True)
+            cache: If the parsed pack should be kept in an on-disk Arrow cache. True uses the default folder
+                   (PYFAAS4I_CACHE_DIR or ~/.cache/pyfaas4i), a string sets the folder. Requires pyarrow. (Default = False)
+            compact: If the tables of the pack should be kept in a compact, typed form: dates as datetime64, text as categoricals and
+                     numbers as float64 arrays ('float32' halves their size). Reduces memory when many packs are kept loaded. (Default = False)
 
         Returns:
             if raw is set to True returns a dictionary of the original json file
         """
-        with open(path) as json_file:
-            pack = json.load(json_file)
+        tracing.current().set(path=str(path), format="json", cache=bool(cache))
+
+        with tracing.span("forecastpack.parse"):
+            pack = _cached(path, cache, _read_json_pack)
 
         if raw:
-            return pack
+            return _materialize(pack)
 
         else:
-            self.json = pack
-            self._refresh(simplify=simplify)
+            with tracing.span("forecastpack.refresh", compact=bool(compact)):
+                if compact:
+                    pack = _compact_pack(pack, compact)
+                self.json = pack
+                self._refresh(simplify=simplify)
 
-    def from_rds(self, path: str, raw: bool = False, simplify: bool = True):
+    @profiling.profiled("forecastpack.from_rds")
+    @tracing.traced("forecastpack.read")
+    def from_rds(self, path: str, raw: bool = False, simplify: bool = True, cache: Union[bool, str] = False,
+                  compact: Union[bool, str] = False):
         """
         Fills the forecast() object properties according to data from a forecastpack rds file.
 
@@ -195,50 +556,32 @@ class forecast:
             path: The path to the forecastpack.json file.
             raw: Boolean variable, to whether the raw json file is desired of if the information should be used in the class. (Default = False)
             simplify: If the forecast property will receive a simplified version of the original table or the whole data. (Default = True)
+            cache: If the converted pack should be kept in an on-disk Arrow cache, skipping R on later loads. True uses the
+                   default folder (PYFAAS4I_CACHE_DIR or ~/.cache/pyfaas4i), a string sets the folder. Requires pyarrow. (Default = False)
+            compact: If the tables of the pack should be kept in a compact, typed form: dates as datetime64, text as categoricals and
+                     numbers as float64 arrays ('float32' halves their size). Reduces memory when many packs are kept loaded. (Default = False)
 
         Returns:
             if raw is set to True returns a dictionary of the original json file
         """
+        tracing.current().set(path=str(path), format="rds", cache=bool(cache))
 
-        import importlib.resources as pkg_resources
-        from subprocess import Popen, PIPE
-
-        ## Check if the user is using Windows
-        if platform.startswith("win"):
-            proc = Popen(["where", "R"], stdout=PIPE, stderr=PIPE)
-        else:
-            proc = Popen(["which", "R"], stdout=PIPE, stderr=PIPE)
-        
-        exit_code = proc.wait()
-        if exit_code != 0:
-            raise SystemError(
-                "R is not installed. Install it through 'https://cran.r-project.org/'"
-            )
-
-        try:
-
-            with pkg_resources.path(R_tools, "convert_rds.R") as p:
-                converter = str(p)
-
-            json_file = subprocess.check_output(["Rscript", converter, path])
-
-            pack = json.loads(json_file)
+        with tracing.span("forecastpack.parse"):
+            pack = _cached(path, cache, _read_rds_pack)
 
-            if raw:
-                return pack
+        if raw:
+            return _materialize(pack)
 
-            else:
+        else:
+            with tracing.span("forecastpack.refresh", compact=bool(compact)):
+                if compact:
+                    pack = _compact_pack(pack, compact)
                 self.json = pack
                 self._refresh(simplify=simplify)
 
-        except:
-
-            raise SystemError(
-                "R and(or) the following packages are not installed: dplyr, jsonlite, lmtest, randomForest, glment, caret"
-            )
-
     @staticmethod
-    def readRDS(path: str, raw: bool = False, simplify: bool = True):
+    def readRDS(path: str, raw: bool = False, simplify: bool = True, cache: Union[bool, str] = False,
+                 compact: Union[bool, str] = False):
         """
         Creates a forecast() object with the properties according to data from a forecastpack rds file.
 
@@ -246,16 +589,19 @@ class forecast:
             path: The path to the forecastpack.json file.
             raw: Boolean variable, to whether the raw json file is desired of if the information should be used in the class. (Default = False)
             simplify: If the forecast property will receive a simplified version of the original table or the whole data. (Default = True)
+            cache: If the pack should be kept in an on-disk Arrow cache, see from_json() and from_rds(). (Default = False)
+            compact: If the tables of the pack should be kept in a compact, typed form, see from_json(). (Default = False)
 
         Returns:
             if raw is set to True returns a dictionary of the original json file
         """
         forecastpack = forecast()
-        forecastpack.from_rds(path=path, raw=raw, simplify=simplify)
+        forecastpack.from_rds(path=path, raw=raw, simplify=simplify, cache=cache, compact=compact)
         return forecastpack
 
     @staticmethod
-    def readJSON(path: str, raw: bool = False, simplify: bool = True):
+    def readJSON(path: str, raw: bool = False, simplify: bool = True, cache: Union[bool, str] = False,
+                 compact: Union[bool, str] = False):
         """
 
         Creates a forecast() object with the properties according to data from a forecastpack JSON file.
@@ -264,14 +610,121 @@ class forecast:
             path: The path to the forecastpack.json file.
             raw: Boolean variable, to whether the raw json file is desired of if the information should be used in the class. (Default = False)
             simplify: If the forecast property will receive a simplified version of the original table or the whole data. (Default = True)
+            cache: If the pack should be kept in an on-disk Arrow cache, see from_json() and from_rds(). (Default = False)
+            compact: If the tables of the pack should be kept in a compact, typed form, see from_json(). (Default = False)
 
         Returns:
             if raw is set to True returns a dictionary of the original json file
         """
         forecastpack = forecast()
-        forecastpack.from_json(path=path, raw=raw, simplify=simplify)
+        forecastpack.from_json(path=path, raw=raw, simplify=simplify, cache=cache, compact=compact)
         return forecastpack
 
+    @staticmethod
+    @tracing.traced("forecastpack.read_many")
+    def read_many(
+        paths: List[str],
+        workers: int = None,
+        fields: List[str] = None,
+        executor: str = "process",
+        raw: bool = False,
+        simplify: bool = True,
+        cache: Union[bool, str] = False,
+        compact: Union[bool, str] = False,
+    ) -> list:
+        """
+        Reads several forecastpacks concurrently. JSON packs are parsed in a pool of workers,
+        while RDS packs are split in chunks, each one converted in a single R session.
+
+        Args:
+            paths: The paths to the forecastpack files (.json or .rds).
+            workers: Number of parallel workers. (Default = number of CPUs)
+            fields: If provided, only these fields of each model are kept (e.g. ['type', 'MAPE', 'forecast']), reducing memory
+                    and the cost of sending packs between processes. The model type is always kept.
+            executor: 'process' to parse JSON packs in a process pool or 'thread' to use a thread pool. (Default = 'process')
+            raw: If the raw packs should be returned instead of forecast() objects. (Default = False)
+            simplify: If the forecast property will receive a simplified version of the original table or the whole data. (Default = True)
+            cache: If the packs should be kept in an on-disk Arrow cache, see from_json() and from_rds(). (Default = False)
+            compact: If the tables of the packs should be kept in a compact, typed form, see from_json(). (Default = False)
+
+        Returns:
+            packs: forecast() objects (or raw packs) in the same order as paths. Files that could not be read
+                   are returned as PackReadError, holding the path and the original error.
+
+        Raises:
+            ValueError: if executor is not 'process' or 'thread'
+        """
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        if executor not in ["process", "thread"]:
+            raise ValueError(f"executor must be 'process' or 'thread', provided value was: {executor}.")
+
+        paths = [str(path) for path in paths]
+        workers = workers or os.cpu_count() or 1
+        results = [None] * len(paths)
+
+        is_rds = [path.lower().endswith(".rds") for path in paths]
+        rds_positions = [i for i in range(len(paths)) if is_rds[i]]
+        json_positions = [i for i in range(len(paths)) if not is_rds[i]]
+
+        # Each R session converts a chunk of files, avoiding one Rscript start per pack
+        n_chunks = min(len(rds_positions), max(workers, -(-len(rds_positions) // 50)))
+        rds_chunks = [rds_positions[i::n_chunks] for i in range(n_chunks)]
+
+        pool_class = ProcessPoolExecutor if executor == "process" and json_positions else ThreadPoolExecutor
+
+        tracing.current().set(
+            n_json=len(json_positions), n_rds=len(rds_positions), workers=workers,
+            executor=executor, cache=bool(cache),
+        )
+
+        with pool_class(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=max(n_chunks, 1)) as r_pool:
+            json_futures = {
+                i: pool.submit(_read_many_json, paths[i], fields, cache) for i in json_positions
+            }
+            rds_futures = [
+                (chunk, r_pool.submit(_read_many_rds, [paths[i] for i in chunk], fields, cache))
+                for chunk in rds_chunks
+            ]
+
+            for i, future in json_futures.items():
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    results[i] = PackReadError(paths[i], e)
+
+            for chunk, future in rds_futures:
+                try:
+                    packs = future.result()
+                except Exception as e:
+                    packs = [e] * len(chunk)
+
+                for i, pack in zip(chunk, packs):
+                    results[i] = PackReadError(paths[i], pack) if isinstance(pack, Exception) else pack
+
+        for i, pack in enumerate(results):
+            if isinstance(pack, PackReadError):
+                continue
+
+            if raw:
+                results[i] = _materialize(pack)
+                continue
+
+            try:
+                forecastpack = forecast()
+                forecastpack.json = _compact_pack(pack, compact) if compact else pack
+                forecastpack._refresh(simplify=simplify)
+                results[i] = forecastpack
+            except Exception as e:
+                results[i] = PackReadError(paths[i], e)
+
+        n_failed = sum(isinstance(pack, PackReadError) for pack in results)
+        tracing.current().set(failed=n_failed)
+        tracing.count("forecastpack.packs_read", len(results) - n_failed)
+        tracing.count("forecastpack.read_errors", n_failed)
+
+        return results
+
     def describe(self, summarise=True) -> pd.DataFrame:
         """
         Creates a summary dataframe with data from all the models inside the forecastpack
@@ -305,7 +758,7 @@ class forecast:
                     try:
                         metrics_list.append(self.json[i][cv_metrics])
                     except:
-                        metrics_list.append(np.NaN)
+                        metrics_list.append(np.nan)
 
             desc_df = pd.DataFrame(
                 {"Model Type": models, "MAPE": mapes, "WMAPE": wmapes, 
@@ -365,7 +818,7 @@ class forecast:
                     try:
                         metrics_list.append(self.json[i][cv_metrics])
                     except:
-                        metrics_list.append(np.NaN)
+                        metrics_list.append(np.nan)
             
             m_list = pd.DataFrame(
                 {
@@ -387,6 +840,56 @@ class forecast:
 
             return m_list
 
+    def forecast_matrix(self, dtype: str = "float64") -> ForecastMatrix:
+        """
+        Extracts the out-of-sample forecasts of all models into a single models x horizon array,
+        aligned on the forecast dates, with the cross-validation metrics of each model alongside
+
+        Args:
+            dtype: 'float64' or 'float32', type of the forecast array (Default is 'float64')
+
+        Returns:
+            matrix: ForecastMatrix, whose combine() method builds ensembles of any subset of models
+
+        Raises:
+            ValueError: if json file was not provided
+        """
+        if not self.json:
+            raise ValueError(
+                "JSON source not found, specify a forecastpack using .from_json()"
+            )
+
+        dates, values, model_rows = [], [], []
+        for i, model in enumerate(self.json):
+            if model.get("forecast") is None:
+                continue
+            columns = _table_columns(model["forecast"], ["data_tidy", "y_all", "type"])
+            out_sample = np.asarray(columns["type"] == "out_sample", dtype=bool)
+            dates.append(columns["data_tidy"][out_sample])
+            values.append(columns["y_all"][out_sample])
+            model_rows.append(np.full(out_sample.sum(), i))
+
+        if dates:
+            all_dates = pd.to_datetime(np.concatenate(dates))
+            all_values = np.concatenate(values).astype(dtype)
+            all_rows = np.concatenate(model_rows)
+        else:
+            all_dates = pd.DatetimeIndex([])
+            all_values = np.array([], dtype=dtype)
+            all_rows = np.array([], dtype=int)
+
+        horizon = pd.DatetimeIndex(np.unique(all_dates), name="data_tidy")
+        matrix = np.full((len(self.json), len(horizon)), np.nan, dtype=dtype)
+        matrix[all_rows, horizon.get_indexer(all_dates)] = all_values
+
+        metrics = {
+            cv_metric: np.array([model.get(cv_metric, np.nan) for model in self.json], dtype="float64")
+            for cv_metric in ["MAPE", "WMAPE", "MPE", "RMSE", "MASE", "MASEs"]
+        }
+        model_types = np.array([model["type"] for model in self.json], dtype=object)
+
+        return ForecastMatrix(horizon, matrix, model_types, metrics)
+
     def steps_and_windows(self):
         if not self.json:
             raise ValueError(
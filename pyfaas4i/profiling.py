@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import io
+import itertools
+import os
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, List
+
+from pyfaas4i import tracing
+from pyfaas4i._checkimports import _LazyImport
+
+# The profilers import pickle, dataclasses and pathlib, so they are only loaded when a call is profiled
+cProfile = _LazyImport("cProfile")
+pstats = _LazyImport("pstats")
+tracemalloc = _LazyImport("tracemalloc")
+
+DEFAULT_DIRECTORY = "./pyfaas4i_profiles"
+
+_settings = None
+_settings_lock = threading.Lock()
+
+# tracemalloc is process-wide, so it is started by the first profiled call and stopped by the last one
+_memory_users = 0
+_memory_lock = threading.Lock()
+
+_sequence = itertools.count(1)
+
+_active_call = contextvars.ContextVar("pyfaas4i_profiled_call", default=None)
+
+
+class ProfileSettings:
+    """
+    Options of the profiling of the pyfaas4i entry points, see profile()
+
+    Attributes:
+        directory: folder where the reports are written
+        cpu: whether the calls are profiled with cProfile
+        memory: whether the allocations of the calls are traced with tracemalloc
+        top: number of functions and allocation sites listed in each report
+        frames: number of frames kept in each allocation traceback (more frames give the callers of each allocation)
+        names: if provided, only the entry points with these names are profiled (e.g. ['faas.run_models'])
+        reports: paths of the reports written so far
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, cpu: bool = True, memory: bool = True, top: int = 30,
+                 frames: int = 1, names: List[str] = None):
+        self.directory = directory
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.frames = frames
+        self.names = None if names is None else set(names)
+        self.reports = []
+        self._lock = threading.Lock()
+
+    def wants(self, name: str) -> bool:
+        return self.names is None or name in self.names
+
+    def __repr__(self):
+        return f"ProfileSettings(directory={self.directory!r}, cpu={self.cpu}, memory={self.memory}, top={self.top})"
+
+
+def enable(directory: str = DEFAULT_DIRECTORY, **options) -> ProfileSettings:
+    """
+    Profiles every later call of the entry points (run_models, validate_models, download_zip,
+    forecast.from_json, forecast.from_rds and get_dashboard), writing one report per call to a folder
+
+    Args:
+        directory: folder where the reports are written, created if it does not exist
+        options: cpu, memory, top, frames and names, see ProfileSettings
+    Returns:
+        settings: the active ProfileSettings, whose reports attribute lists the written reports
+    """
+    global _settings
+    settings = ProfileSettings(directory, **options)
+    with _settings_lock:
+        _settings = settings
+    return settings
+
+
+def disable():
+    """
+    Stops profiling the entry points. Calls already being profiled still write their reports.
+    """
+    global _settings
+    with _settings_lock:
+        _settings = None
+
+
+def enabled() -> bool:
+    """
+    Whether the entry points are being profiled
+    """
+    return _settings is not None
+
+
+@contextmanager
+def profile(directory: str = DEFAULT_DIRECTORY, **options):
+    """
+    Profiles the entry points called inside a with block
+
+    Args:
+        directory: folder where the reports are written, created if it does not exist
+        options: cpu, memory, top, frames and names, see ProfileSettings
+
+    Example:
+    ::
+    >>> from pyfaas4i import profiling
+    >>> with profiling.profile("./profiles") as session:
+    ...     run_models(data_list, date_variable, date_format, model_spec, project_name)
+    >>> session.reports
+    ['./profiles/20240101-120000_4242_001_faas.run_models.txt']
+    """
+    global _settings
+    with _settings_lock:
+        previous = _settings
+    settings = enable(directory, **options)
+    try:
+        yield settings
+    finally:
+        with _settings_lock:
+            _settings = previous
+
+
+def _start_memory(frames: int):
+    global _memory_users
+    with _memory_lock:
+        if _memory_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            _memory_users = 1
+        elif _memory_users > 0:
+            _memory_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_memory():
+    global _memory_users
+    with _memory_lock:
+        if _memory_users == 0:
+            # tracemalloc was already running before profiling, so it is left running
+            return
+        _memory_users -= 1
+        if _memory_users == 0:
+            tracemalloc.stop()
+
+
+def _format_size(n_bytes: float) -> str:
+    for unit in ["B", "KiB", "MiB"]:
+        if abs(n_bytes) < 1024:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} GiB"
+
+
+def _format_phases(spans: list) -> List[str]:
+    """
+    Tree of the tracing spans recorded during a call, in the order they started
+    """
+    depths = {}
+    lines = []
+    for span in sorted(spans, key=lambda span: span._start):
+        depth = depths.get(span.parent_id, -1) + 1
+        depths[span.span_id] = depth
+        details = " ".join(f"{key}={value}" for key, value in {**span.attributes, **span.counters}.items())
+        lines.append(f"{'  ' * depth}{span.name:<{40 - 2 * depth}}{span.duration * 1000:>12.2f} ms  {details}".rstrip())
+    return lines
+
+
+@lru_cache(maxsize=None)
+def _memory_filters() -> tuple:
+    """
+    Filters removing the allocations made by the profilers themselves from the reports
+    """
+    return (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, pstats.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+
+def _format_memory(before, after, peak: int, top: int) -> List[str]:
+    lines = [f"Peak traced memory: {_format_size(peak)}"]
+    filters = _memory_filters()
+    differences = after.filter_traces(filters).compare_to(before.filter_traces(filters), "traceback")
+    allocated = sum(difference.size_diff for difference in differences)
+    lines.append(f"Net allocated (still held at the end of the call): {_format_size(allocated)}")
+    lines.append("")
+    lines.append(f"Top {top} allocation sites (net size, blocks):")
+    for difference in differences[:top]:
+        frames = difference.traceback.format()
+        lines.append(f"{_format_size(difference.size_diff):>12} {difference.count_diff:>9}  {frames[0].strip()}")
+        for frame in frames[1:]:
+            lines.append(f"{'':>24}{frame.strip()}")
+    return lines
+
+
+def _format_cpu(profiler: cProfile.Profile, top: int) -> List[str]:
+    lines = []
+    for order, title in [("cumulative", "cumulative time"), ("tottime", "own time")]:
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.strip_dirs().sort_stats(order).print_stats(top)
+        lines.append(f"Top {top} functions by {title}:")
+        lines.extend(line for line in stream.getvalue().splitlines() if line.strip())
+        lines.append("")
+    return lines
+
+
+def _write_report(settings: ProfileSettings, name: str, started: float, duration: float, error: str,
+                  spans: list, profiler, memory) -> str:
+    os.makedirs(settings.directory, exist_ok=True)
+    stem = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}_{os.getpid()}_{next(_sequence):03d}_{name}"
+    path = os.path.join(settings.directory, f"{stem}.txt")
+
+    lines = [
+        f"pyfaas4i profile of {name}",
+        f"Started: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}",
+        f"Duration: {duration:.3f} s",
+        f"Status: {'OK' if error is None else 'ERROR ' + error}",
+        "",
+    ]
+    if spans:
+        lines += ["== Phases ==", *_format_phases(spans), ""]
+    if memory is not None:
+        lines += ["== Memory ==", *_format_memory(*memory, settings.top), ""]
+    if profiler is not None:
+        lines += ["== CPU ==", *_format_cpu(profiler, settings.top)]
+        # Binary stats, for pstats, snakeviz or gprof2dot
+        profiler.dump_stats(os.path.join(settings.directory, f"{stem}.prof"))
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+
+    with settings._lock:
+        settings.reports.append(path)
+    return path
+
+
+def _run_profiled(settings: ProfileSettings, name: str, function: Callable, args, kwargs):
+    spans = []
+    token = _active_call.set(spans)
+
+    def collect(span):
+        # Only spans of this call: worker threads and other calls have their own context
+        if _active_call.get() is spans:
+            spans.append(span)
+
+    tracing.add_sink(collect)
+    # Created before tracemalloc starts, so loading the profiler is not part of the memory report
+    profiler = cProfile.Profile() if settings.cpu else None
+    before = None
+    if settings.memory:
+        _start_memory(settings.frames)
+        before = tracemalloc.take_snapshot()
+
+    error = None
+    started = time.time()
+    start = time.perf_counter()
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this thread (e.g. a nested profiled call or an outer
+            # cProfile run): the call is run without the CPU section
+            profiler = None
+
+    try:
+        return function(*args, **kwargs)
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        duration = time.perf_counter() - start
+        memory = None
+        if settings.memory:
+            memory = (before, tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+            _stop_memory()
+        tracing.remove_sink(collect)
+        _active_call.reset(token)
+        try:
+            _write_report(settings, name, started, duration, error, spans, profiler, memory)
+        except Exception as e:
+            # The report never replaces the result or the exception of the call
+            warnings.warn(f"Could not write the profile of {name}: {type(e).__name__}: {e}")
+
+
+def profiled(name: str = None):
+    """
+    Decorator that profiles each call of an entry point while profiling is enabled. Calls made
+    inside another profiled call (e.g. from_json inside get_dashboard) are part of the outer report.
+
+    Args:
+        name: name of the entry point in the reports (Default is the module and name of the function)
+    """
+    def decorator(function):
+        entry_point = name or f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            settings = _settings
+            if settings is None or _active_call.get() is not None or not settings.wants(entry_point):
+                return function(*args, **kwargs)
+            return _run_profiled(settings, entry_point, function, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _settings_from_env(value: str):
+    """
+    Settings configured by the PYFAAS4I_PROFILE environment variable: '1' for the default folder or the folder of the reports
+    """
+    if not value or value.lower() in ("0", "false"):
+        return None
+    if value.lower() in ("1", "true"):
+        return ProfileSettings()
+    return ProfileSettings(value)
+
+
+_settings = _settings_from_env(os.getenv("PYFAAS4I_PROFILE", ""))
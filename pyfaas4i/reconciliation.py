@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import warnings
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Union
+
+from pyfaas4i._checkimports import _LazyImport, try_import
+from pyfaas4i.forecastpack import forecast, _table_columns
+
+np = _LazyImport("numpy")
+pd = _LazyImport("pandas")
+sp = _LazyImport("scipy.sparse")
+sparse_linalg = _LazyImport("scipy.sparse.linalg")
+
+
+@lru_cache(maxsize=None)
+def _scipy_imports():
+    """
+    Checks import availability of the sparse matrices used by the reconciliation, on first use
+    """
+    with try_import() as imports:
+        import scipy.sparse  # noqa: F401
+        import scipy.sparse.linalg  # noqa: F401
+    return imports
+
+METHODS = ["bottom_up", "top_down", "ols", "mint"]
+
+
+class Hierarchy:
+    """
+    Hierarchy of series, where every aggregate is the sum of its children.
+
+    Args:
+        structure: dictionary of each aggregate series and the list of its children, e.g.
+                   {"Total": ["North", "South"], "North": ["A", "B"], "South": ["C", "D"]}.
+                   Series that are not keys of the dictionary are the leaves (bottom level).
+
+    Attributes:
+        aggregates: aggregate series, from the top of the hierarchy down
+        leaves: bottom level series
+        nodes: all series, aggregates followed by leaves (the rows of S)
+        S: sparse summing matrix (nodes x leaves), mapping leaf values into the values of every series
+
+    Raises:
+        ValueError: if a series has more than one parent or the structure has cycles
+    """
+
+    def __init__(self, structure: Dict[str, List[str]]):
+        _scipy_imports().check()
+
+        parents = {}
+        for parent, children in structure.items():
+            for child in children:
+                if child in parents:
+                    raise ValueError(f"The series {child} has more than one parent: {parents[child]} and {parent}.")
+                parents[child] = parent
+
+        roots = [node for node in structure if node not in parents]
+        if not roots:
+            raise ValueError("The hierarchy has no top level series, check for cycles in the structure.")
+
+        # Breadth-first order, so every aggregate comes before its children
+        aggregates, leaves = [], []
+        queue = deque(roots)
+        while queue:
+            node = queue.popleft()
+            if node in structure:
+                aggregates.append(node)
+                queue.extend(structure[node])
+            else:
+                leaves.append(node)
+
+        if len(aggregates) + len(leaves) != len(set(structure) | set(parents)):
+            raise ValueError("The structure has cycles, every series must be reachable from a top level series.")
+
+        self.structure = structure
+        self.roots = roots
+        self.aggregates = aggregates
+        self.leaves = leaves
+        self.nodes = aggregates + leaves
+
+        # Each leaf adds a one in its own row and in the rows of all of its ancestors
+        position = {node: i for i, node in enumerate(self.nodes)}
+        rows, cols = [], []
+        for j, leaf in enumerate(leaves):
+            node = leaf
+            while True:
+                rows.append(position[node])
+                cols.append(j)
+                if node not in parents:
+                    break
+                node = parents[node]
+
+        self.S = sp.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(self.nodes), len(leaves))
+        )
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def _selected_table(pack: Union[forecast, list]):
+    """
+    Forecast table and cross-validation RMSE of the selected model of a pack (the first model of raw packs)
+    """
+    if isinstance(pack, forecast):
+        model = pack.json[pack._model]
+    else:
+        model = pack[0]
+    return model["forecast"], model.get("RMSE", np.nan)
+
+
+def _stack_forecasts(packs: Dict[str, Union[forecast, list]], names: List[str], sample: str = "out_sample"):
+    """
+    Stacks the forecasts (or the in-sample values) of the selected model of each series into a series x dates matrix
+
+    Args:
+        packs: dictionary of series names and packs
+        names: series to be stacked, in the order of the rows
+        sample: 'out_sample' for the forecasts, 'in_sample' for the historical values
+    Returns:
+        dates, values, rmse: the dates (columns), the series x dates matrix (NaN where missing)
+                             and the cross-validation RMSE of each series
+    """
+    dates, values, rows = [], [], []
+    rmse = np.full(len(names), np.nan)
+
+    for i, name in enumerate(names):
+        table, rmse[i] = _selected_table(packs[name])
+        columns = _table_columns(table, ["data_tidy", "y_all", "type"])
+        selected = np.asarray(columns["type"] == sample, dtype=bool)
+        dates.append(columns["data_tidy"][selected])
+        values.append(columns["y_all"][selected])
+        rows.append(np.full(selected.sum(), i))
+
+    all_dates = pd.to_datetime(np.concatenate(dates)) if dates else pd.DatetimeIndex([])
+    horizon = pd.DatetimeIndex(np.unique(all_dates), name="data_tidy")
+
+    matrix = np.full((len(names), len(horizon)), np.nan)
+    if dates:
+        matrix[np.concatenate(rows), horizon.get_indexer(all_dates)] = np.concatenate(values).astype("float64")
+
+    return horizon, matrix, rmse
+
+
+def _historical_proportions(packs: Dict[str, Union[forecast, list]], hierarchy: Hierarchy) -> np.ndarray:
+    """
+    Share of each leaf in the historical sum of all leaves, over the dates every leaf has data
+
+    The shares add up to one, so the top level forecast is kept even when the history is not coherent.
+    """
+    _, history, _ = _stack_forecasts(packs, hierarchy.leaves, sample="in_sample")
+
+    common = ~np.isnan(history).any(axis=0)
+    if not common.any():
+        raise ValueError("The leaves have no historical dates in common.")
+
+    totals = history[:, common].sum(axis=1)
+    return totals / totals.sum()
+
+
+def _constrained_projection(base: np.ndarray, hierarchy: Hierarchy, variances: np.ndarray) -> np.ndarray:
+    """
+    Reconciles the base forecasts of all series with a diagonal covariance of the errors
+
+    Uses the projection form y - W C' (C W C')^-1 C y, where C = [I, -S_agg] holds one aggregation
+    constraint per aggregate series. Only a system of the size of the aggregates is solved, so the
+    cost grows with the number of aggregates rather than the number of leaves.
+    """
+    n_aggregates = len(hierarchy.aggregates)
+    constraints = sp.hstack(
+        [sp.identity(n_aggregates, format="csr"), -hierarchy.S[:n_aggregates]], format="csr"
+    )
+
+    weighted = constraints.multiply(variances[None, :]).tocsr()
+    system = (weighted @ constraints.T).tocsc()
+
+    correction = sparse_linalg.splu(system).solve(constraints @ base)
+    return base - weighted.T @ correction
+
+
+def reconcile(
+    packs: Dict[str, Union[forecast, list]],
+    hierarchy: Union[Hierarchy, Dict[str, List[str]]],
+    method: str = "mint",
+) -> pd.DataFrame:
+    """
+    Reconciles the forecasts of the selected model of each series, so that every aggregate equals the sum of its children
+
+    Methods:
+    - bottom_up: the aggregates are the sums of the leaf forecasts;
+    - top_down: the top level forecast is split among the leaves with their historical proportions;
+    - ols: forecasts of all series are combined with equal weights (W = I);
+    - mint: forecasts of all series are combined with a diagonal W, the squared cross-validation RMSE of each series.
+
+    Args:
+        packs: dictionary of series names and forecast objects (their selected model is used) or raw packs (their first model)
+        hierarchy: Hierarchy, or the dictionary of each aggregate series and its children
+        method: 'bottom_up', 'top_down', 'ols' or 'mint' (Default is 'mint')
+    Returns:
+        reconciled: dataframe with one row per series of the hierarchy and one column per forecast date
+    Raises:
+        ValueError: if method is not a valid option or packs are missing for the series the method needs
+    """
+    _scipy_imports().check()
+
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}, provided value was: {method}.")
+
+    if not isinstance(hierarchy, Hierarchy):
+        hierarchy = Hierarchy(hierarchy)
+
+    if method == "bottom_up":
+        required = hierarchy.leaves
+    elif method == "top_down":
+        if len(hierarchy.roots) > 1:
+            raise ValueError(f"top_down requires a single top level series, found: {', '.join(hierarchy.roots)}.")
+        required = hierarchy.roots + hierarchy.leaves
+    else:
+        required = hierarchy.nodes
+
+    missing = [name for name in required if name not in packs]
+    if missing:
+        shown = ", ".join(missing[:5]) + (", ..." if len(missing) > 5 else "")
+        raise ValueError(f"The {method} method requires packs for {len(missing)} missing series: {shown}.")
+
+    names = hierarchy.roots[:1] if method == "top_down" else required
+    dates, base, rmse = _stack_forecasts(packs, names)
+
+    # Only the dates forecasted by every series can be reconciled
+    complete = ~np.isnan(base).any(axis=0)
+    if not complete.all():
+        warnings.warn(f"{(~complete).sum()} forecast dates are not available for every series and were dropped.")
+    dates, base = dates[complete], base[:, complete]
+
+    if method == "bottom_up":
+        reconciled = hierarchy.S @ base
+    elif method == "top_down":
+        proportions = _historical_proportions(packs, hierarchy)
+        reconciled = hierarchy.S @ (proportions[:, None] * base)
+    else:
+        variances = np.ones(len(hierarchy)) if method == "ols" else rmse ** 2
+        if np.isnan(variances).any() or (variances <= 0).any():
+            raise ValueError("mint requires a positive cross-validation RMSE for every series.")
+        reconciled = _constrained_projection(base, hierarchy, variances)
+
+    return pd.DataFrame(np.asarray(reconciled), index=pd.Index(hierarchy.nodes, name="series"), columns=dates)
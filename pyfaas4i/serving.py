@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Union
+from urllib.parse import parse_qs, urlparse
+
+from pyfaas4i._checkimports import _LazyImport
+from pyfaas4i.collection import ForecastCollection
+from pyfaas4i.ensemble import ForecastMatrix
+from pyfaas4i.forecastpack import forecast
+
+np = _LazyImport("numpy")
+pd = _LazyImport("pandas")
+
+SERVING_METRICS = ["MAPE", "WMAPE", "MPE", "RMSE", "MASE", "MASEs"]
+
+
+class _SeriesEntry:
+    """
+    Precomputed arrays of a series: forecast dates as strings, forecasts, model types, metrics and best models
+    """
+
+    __slots__ = ("dates", "values", "model_types", "metrics", "best")
+
+    def __init__(self, matrix: ForecastMatrix):
+        self.dates = [date.strftime("%Y-%m-%d") for date in matrix.dates]
+        # Read-only view, leaving the array of the caller's matrix writable
+        self.values = matrix.values.view()
+        self.values.setflags(write=False)
+        self.model_types = [str(x) for x in matrix.model_types]
+        self.metrics = matrix.metrics
+        self.best = {}
+        for metric in SERVING_METRICS:
+            models = matrix.select(k=1, metric=metric)
+            self.best[metric] = int(models[0]) if len(models) else None
+
+
+def _pack_matrix(pack: Union[forecast, list]) -> ForecastMatrix:
+    """
+    ForecastMatrix of a forecast() object or of a raw forecastpack
+    """
+    if not isinstance(pack, forecast):
+        raw, pack = pack, forecast()
+        pack.json = raw
+    return pack.forecast_matrix()
+
+
+def _collection_matrices(collection: ForecastCollection) -> Dict[str, ForecastMatrix]:
+    """
+    ForecastMatrix of the latest vintage of each series of a collection
+    """
+    metrics = collection.metrics
+    latest = metrics.groupby("series", observed=True)["vintage"].transform("max")
+    metrics = metrics.loc[metrics["vintage"] == latest]
+
+    forecasts = collection.forecasts_table.merge(
+        metrics[["series", "vintage"]].drop_duplicates(), on=["series", "vintage"], how="inner"
+    )
+    forecast_groups = dict(iter(forecasts.groupby("series", observed=True, sort=False)))
+
+    matrices = {}
+    for series, series_metrics in metrics.groupby("series", observed=True, sort=False):
+        series_metrics = series_metrics.sort_values("model")
+        n_models = int(series_metrics["model"].max()) + 1
+
+        rows = forecast_groups.get(series, forecasts.iloc[:0])
+        dates = pd.DatetimeIndex(np.unique(rows["data_tidy"].to_numpy()), name="data_tidy")
+        values = np.full((n_models, len(dates)), np.nan)
+        values[rows["model"].to_numpy(), dates.get_indexer(rows["data_tidy"])] = rows["y_all"].to_numpy(dtype=float)
+
+        model_types = np.full(n_models, None, dtype=object)
+        model_types[series_metrics["model"].to_numpy()] = series_metrics["model_type"].astype(object).to_numpy()
+
+        metric_values = {}
+        for metric in SERVING_METRICS:
+            metric_values[metric] = np.full(n_models, np.nan)
+            metric_values[metric][series_metrics["model"].to_numpy()] = series_metrics[metric].to_numpy(dtype=float)
+
+        matrices[str(series)] = ForecastMatrix(dates, values, model_types, metric_values)
+
+    return matrices
+
+
+def _clean(value: float):
+    """
+    Converts missing values to None, so responses are valid JSON
+    """
+    return None if value is None or math.isnan(value) else value
+
+
+class ForecastServer:
+    """
+    Read-only forecast service over preloaded forecastpacks.
+
+    All forecasts, metrics and best models are computed when the server is created, and are never
+    changed afterwards, so queries are answered from precomputed arrays and the server can be used
+    from many threads at once. The forecasts can be queried directly with query() or through a local
+    HTTP API started with start() or serve().
+
+    Args:
+        packs: dictionary of series names and forecast() objects (or raw packs), or a ForecastCollection
+               (the latest vintage of each series is served)
+        metric: metric used to choose the best model when no model is requested (Default is 'MAPE')
+
+    Example:
+    ::
+    >>> from pyfaas4i.serving import ForecastServer
+
+    >>> server = ForecastServer({"sales": forecast.readJSON("./sales.json")})
+
+    >>> # Best model according to WMAPE
+    >>> server.query("sales", metric="WMAPE")
+
+    >>> # HTTP API, e.g. GET http://127.0.0.1:8000/forecast?series=sales&model=3
+    >>> server.serve(port=8000)
+    """
+
+    def __init__(self, packs: Union[ForecastCollection, Dict[str, Union[forecast, list]]], metric: str = "MAPE"):
+        if metric not in SERVING_METRICS:
+            raise ValueError(f"metric must be one of {', '.join(SERVING_METRICS)}, provided value was: {metric}.")
+
+        if isinstance(packs, ForecastCollection):
+            matrices = _collection_matrices(packs)
+        else:
+            matrices = {str(series): _pack_matrix(pack) for series, pack in packs.items()}
+
+        self.metric = metric
+        self._entries = {series: _SeriesEntry(matrix) for series, matrix in matrices.items()}
+
+    @property
+    def series(self) -> list:
+        """
+        Names of the series being served
+        """
+        return list(self._entries)
+
+    def query(self, series: str, model: int = None, metric: str = None) -> dict:
+        """
+        Forecast of a series, for a given model or for the best model according to a metric
+
+        Args:
+            series: name of the series
+            model: index of the model in the forecastpack. If None, the best model according to metric is used.
+            metric: metric used to choose the best model (Default is the metric of the server)
+        Returns:
+            response: dictionary with the series, model, model type, cross-validation metrics, dates and forecasts
+        Raises:
+            KeyError: if the series is not being served
+            ValueError: if the model or the metric are not valid
+        """
+        entry = self._entries.get(series)
+        if entry is None:
+            raise KeyError(f"Series not found: {series}.")
+
+        if model is None:
+            metric = metric or self.metric
+            if metric not in SERVING_METRICS:
+                raise ValueError(f"metric must be one of {', '.join(SERVING_METRICS)}, provided value was: {metric}.")
+            model = entry.best[metric]
+            if model is None:
+                raise ValueError(f"No model of series {series} has the metric {metric}.")
+        elif not 0 <= model < len(entry.model_types):
+            raise ValueError(f"model must be between 0 and {len(entry.model_types) - 1}, provided value was: {model}.")
+
+        return {
+            "series": series,
+            "model": model,
+            "model_type": entry.model_types[model],
+            "metrics": {name: _clean(float(values[model])) for name, values in entry.metrics.items()},
+            "dates": entry.dates,
+            "forecast": [_clean(x) for x in entry.values[model].tolist()],
+        }
+
+    def _make_server(self, host: str, port: int, verbose: bool) -> ThreadingHTTPServer:
+        httpd = ThreadingHTTPServer((host, port), _ForecastHandler)
+        httpd.daemon_threads = True
+        httpd.forecast_server = self
+        httpd.verbose = verbose
+        return httpd
+
+    def start(self, host: str = "127.0.0.1", port: int = 8000, verbose: bool = False) -> ThreadingHTTPServer:
+        """
+        Starts the HTTP API in a background thread
+
+        Args:
+            host: address to listen on (Default is '127.0.0.1')
+            port: port to listen on, 0 to choose a free port (Default is 8000)
+            verbose: whether each request is logged (Default is False)
+        Returns:
+            httpd: the running server, stopped with httpd.shutdown(). Its address is in httpd.server_address.
+        """
+        httpd = self._make_server(host, port, verbose)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8000, verbose: bool = True):
+        """
+        Runs the HTTP API until interrupted. Endpoints:
+
+        - GET /forecast?series=<name>[&model=<index>][&metric=<metric>]: as query()
+        - GET /series: names of the series being served
+        - GET /health: status of the server
+
+        Args:
+            host: address to listen on (Default is '127.0.0.1')
+            port: port to listen on (Default is 8000)
+            verbose: whether each request is logged (Default is True)
+        """
+        httpd = self._make_server(host, port, verbose)
+        if verbose:
+            print(f"Serving {len(self._entries)} series on http://{host}:{httpd.server_address[1]}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+
+
+class _ForecastHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of ForecastServer, with keep-alive connections
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, Nagle's algorithm would delay the body of keep-alive responses
+    disable_nagle_algorithm = True
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server.forecast_server
+        url = urlparse(self.path)
+
+        if url.path == "/health":
+            return self._send(200, {"status": "ok", "series": len(server.series)})
+        if url.path == "/series":
+            return self._send(200, server.series)
+        if url.path != "/forecast":
+            return self._send(404, {"error": f"Unknown endpoint: {url.path}."})
+
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if "series" not in params:
+            return self._send(400, {"error": "The series parameter is required."})
+
+        try:
+            model = int(params["model"]) if "model" in params else None
+            return self._send(200, server.query(params["series"], model=model, metric=params.get("metric")))
+        except KeyError as e:
+            return self._send(404, {"error": str(e.args[0])})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
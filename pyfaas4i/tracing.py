@@ -0,0 +1,361 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Union
+
+_logger = logging.getLogger("pyfaas4i.tracing")
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+_current_span = contextvars.ContextVar("pyfaas4i_current_span", default=None)
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+class Span:
+    """
+    Timed phase of a pyfaas4i call, with its attributes and the counters recorded while it was active.
+
+    Spans are created with span(), nested spans share the trace_id of their root span, and each
+    finished span is sent to every registered sink. The identifiers follow the OpenTelemetry format
+    (32 hex digits for trace ids and 16 for span ids), so spans can be exported to OpenTelemetry
+    through a CallbackSink.
+
+    Attributes:
+        name: name of the phase, e.g. 'faas.compress'
+        trace_id: identifier shared by all spans of the same root call
+        span_id: identifier of the span
+        parent_id: span_id of the parent span, None for root spans
+        attributes: dictionary of attributes (e.g. endpoint, status_code, bytes)
+        counters: totals of the counters recorded while the span was the current span
+        start_time: start of the span, as seconds since the epoch
+        duration: duration of the span in seconds (None while running)
+        error: representation of the exception raised inside the span, if any
+    """
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes", "counters",
+        "start_time", "duration", "error", "_start",
+    )
+
+    def __init__(self, name: str, attributes: dict, parent: "Span" = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.counters = {}
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes) -> "Span":
+        """
+        Adds or replaces attributes of the span
+        """
+        self.attributes.update(attributes)
+        return self
+
+    @property
+    def status(self) -> str:
+        return "ERROR" if self.error is not None else "OK"
+
+    def to_dict(self) -> dict:
+        """
+        Dictionary with the span, using the field names of the OpenTelemetry data model
+        """
+        end_time = self.start_time + (self.duration or 0.0)
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": int(self.start_time * 1e9),
+            "end_time_unix_nano": int(end_time * 1e9),
+            "duration_s": self.duration,
+            "attributes": dict(self.attributes),
+            "counters": dict(self.counters),
+            "status": self.status,
+            "error": self.error,
+        }
+
+    def __repr__(self):
+        duration = "running" if self.duration is None else f"{self.duration * 1000:.2f} ms"
+        return f"Span({self.name}, {duration}, {self.attributes})"
+
+
+class _NoopSpan:
+    """
+    Span returned when tracing is disabled, accepting attributes without recording them
+    """
+
+    __slots__ = ()
+
+    def set(self, **attributes) -> "_NoopSpan":
+        return self
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class LoggingSink:
+    """
+    Sends each finished span to a logger, as a single line with its duration, attributes and counters
+
+    Args:
+        logger: logger to be used (Default is the 'pyfaas4i.tracing' logger)
+        level: logging level of the messages (Default is logging.INFO)
+    """
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.INFO):
+        self.logger = logger or _logger
+        self.level = level
+
+    def __call__(self, span: Span):
+        details = {**span.attributes, **span.counters}
+        text = " ".join(
+            f"{key}={value:.6g}" if isinstance(value, float) else f"{key}={value}" for key, value in details.items()
+        )
+        status = "" if span.error is None else f" error={span.error}"
+        self.logger.log(self.level, "%s %.2fms %s%s", span.name, span.duration * 1000, text, status)
+
+
+class JSONLinesSink:
+    """
+    Appends each finished span to a file, one JSON object per line (see Span.to_dict())
+
+    Args:
+        path: path of the file, created if it does not exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line)
+
+
+class CallbackSink:
+    """
+    Calls a function with each finished span, e.g. to export the spans to OpenTelemetry or to a metrics system
+
+    Args:
+        callback: function receiving the Span, or its dictionary if as_dict is True
+        as_dict: whether the callback receives Span.to_dict() instead of the Span (Default is False)
+
+    Example:
+    ::
+    >>> from opentelemetry import trace
+    >>> tracer = trace.get_tracer("pyfaas4i")
+
+    >>> def export(span):
+    ...     otel_span = tracer.start_span(span.name, start_time=int(span.start_time * 1e9), attributes=span.attributes)
+    ...     otel_span.set_attributes(span.counters)
+    ...     otel_span.end(end_time=int((span.start_time + span.duration) * 1e9))
+
+    >>> tracing.add_sink(tracing.CallbackSink(export))
+    """
+
+    def __init__(self, callback: Callable, as_dict: bool = False):
+        self.callback = callback
+        self.as_dict = as_dict
+
+    def __call__(self, span: Span):
+        self.callback(span.to_dict() if self.as_dict else span)
+
+
+def add_sink(sink: Callable) -> Callable:
+    """
+    Registers a sink, enabling tracing. A sink is any callable receiving each finished Span.
+
+    Returns:
+        sink: the registered sink, to be removed later with remove_sink()
+    """
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Callable):
+    """
+    Removes a registered sink. Tracing is disabled when no sink is left.
+    """
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def enabled() -> bool:
+    """
+    Whether any sink is registered
+    """
+    return bool(_sinks)
+
+
+@contextmanager
+def capture(*sinks: Callable):
+    """
+    Registers sinks only inside a with block
+
+    Example:
+    ::
+    >>> spans = []
+    >>> with tracing.capture(spans.append):
+    ...     forecast.readJSON("./pack.json")
+    """
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+
+
+def _emit(span: Span):
+    for sink in list(_sinks):
+        try:
+            sink(span)
+        except Exception:
+            # A failing sink must never break the call being traced
+            _logger.exception("Tracing sink %r failed", sink)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times a phase of a call as a span, nested in the current span. When no sink is registered
+    nothing is recorded and a no-op span is returned.
+
+    Args:
+        name: name of the phase
+        attributes: initial attributes of the span, more can be added with span.set()
+
+    Example:
+    ::
+    >>> with tracing.span("faas.compress") as current:
+    ...     body = gzip.compress(payload)
+    ...     current.set(bytes_in=len(payload), bytes_out=len(body))
+    """
+    if not _sinks:
+        yield _NOOP_SPAN
+        return
+
+    current = Span(name, attributes, _current_span.get())
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start
+        _current_span.reset(token)
+        _emit(current)
+
+
+def current() -> Span:
+    """
+    Span of the phase being run, or a no-op span when tracing is disabled or no span is active
+    """
+    return _current_span.get() or _NOOP_SPAN
+
+
+def traced(name: str = None):
+    """
+    Decorator that runs each call of a function inside a span
+
+    Args:
+        name: name of the span (Default is the module and name of the function)
+    """
+    def decorator(function):
+        span_name = name or f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, value: Union[int, float] = 1, **attributes):
+    """
+    Adds a value to a counter, e.g. the number of retries or the bytes sent to an endpoint.
+
+    The process-wide totals are kept by counter name and attributes (see counters()), and the value
+    is also added to the counters of the current span.
+
+    Args:
+        name: name of the counter
+        value: value to be added (Default is 1)
+        attributes: attributes identifying the series of the counter, e.g. endpoint='validate'
+    """
+    key = (name, tuple(sorted(attributes.items())))
+    with _counters_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+    current = _current_span.get()
+    if current is not None:
+        current.counters[name] = current.counters.get(name, 0) + value
+
+
+def counters(name: str = None) -> List[Dict]:
+    """
+    Process-wide totals of the counters
+
+    Args:
+        name: if provided, only this counter is returned
+    Returns:
+        counters: list of dictionaries with the name, attributes and value of each counter series
+    """
+    with _counters_lock:
+        items = list(_counters.items())
+    return [
+        {"name": counter, "attributes": dict(attributes), "value": value}
+        for (counter, attributes), value in sorted(items, key=lambda item: str(item[0]))
+        if name is None or counter == name
+    ]
+
+
+def reset_counters():
+    """
+    Sets every counter back to zero
+    """
+    with _counters_lock:
+        _counters.clear()
+
+
+def _sink_from_env(value: str):
+    """
+    Sink configured by the PYFAAS4I_TRACE environment variable: 'log' or the path of a JSON lines file
+    """
+    if not value:
+        return None
+    if value.lower() in ("1", "true", "log", "logging"):
+        return LoggingSink()
+    return JSONLinesSink(value)
+
+
+_env_sink = _sink_from_env(os.getenv("PYFAAS4I_TRACE", ""))
+if _env_sink is not None:
+    add_sink(_env_sink)
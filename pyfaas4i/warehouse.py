@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple, Union
+
+from pyfaas4i._checkimports import _LazyImport, try_import
+from pyfaas4i.collection import ForecastCollection, _pack_vintage
+from pyfaas4i.forecastpack import forecast
+
+pd = _LazyImport("pandas")
+pa = _LazyImport("pyarrow")
+ds = _LazyImport("pyarrow.dataset")
+
+
+@lru_cache(maxsize=None)
+def _arrow_imports():
+    """
+    Checks import availability of the Arrow components used by the warehouse, on first use
+    """
+    with try_import() as imports:
+        import pyarrow  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+    return imports
+
+TABLES = ["metrics", "forecasts", "models"]
+
+
+def _partitioning():
+    """
+    Hive partitioning used by every table of the warehouse: vintage=YYYY-MM-DD/series=<name>
+    """
+    return ds.partitioning(
+        pa.schema([("vintage", pa.date32()), ("series", pa.string())]), flavor="hive"
+    )
+
+
+def _to_arrow(frame: pd.DataFrame):
+    """
+    Converts a warehouse dataframe to Arrow, with the partition columns in the partitioning types
+    """
+    frame = frame.copy()
+    frame["series"] = frame["series"].astype(str)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    return table.set_column(
+        table.schema.get_field_index("vintage"),
+        "vintage",
+        table.column("vintage").cast(pa.timestamp("ns")).cast(pa.date32()),
+    )
+
+
+def _write_table(frame: pd.DataFrame, path: str, sort_by: List[str]):
+    """
+    Writes one table of the warehouse, replacing the partitions (vintage and series) being written
+    """
+    if frame.empty:
+        return
+
+    frame = frame.sort_values(sort_by, kind="stable")
+    ds.write_dataset(
+        _to_arrow(frame),
+        path,
+        format="parquet",
+        partitioning=_partitioning(),
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="delete_matching",
+        max_rows_per_group=65536,
+    )
+
+
+def _model_metadata(packs: Iterable[Tuple]) -> pd.DataFrame:
+    """
+    Builds the models table, with the type, transformation, sample and infos of each model
+    """
+    rows = []
+    for item in packs:
+        series, pack = item[0], item[1]
+        if isinstance(pack, forecast):
+            pack = pack.json
+
+        vintage = item[2] if len(item) > 2 and item[2] is not None else _pack_vintage(pack)
+        for i, model in enumerate(pack):
+            rows.append(
+                {
+                    "series": series,
+                    "vintage": vintage,
+                    "model": i,
+                    "model_type": model.get("type"),
+                    "transformation": str(model.get("transformation")),
+                    "sample": str(model.get("sample")),
+                    "infos": json.dumps(model.get("infos"), default=str),
+                }
+            )
+
+    return pd.DataFrame(rows)
+
+
+def write_warehouse(
+    packs: Union[ForecastCollection, Dict[str, Union[forecast, list]], Iterable[Tuple]],
+    root: str,
+):
+    """
+    Writes forecastpacks into a Parquet dataset partitioned by vintage and series
+
+    The warehouse has three tables, each one in a subfolder of root:
+    - metrics: model type and cross-validation metrics of each model;
+    - forecasts: out-of-sample forecasts of each model (type 'out_sample') and the observed values
+      of each pack, stored once with model -1 (type 'in_sample');
+    - models: type, transformation, sample and infos of each model (not available when a
+      ForecastCollection is provided, as it does not keep them).
+
+    Writing a series and vintage that already exist in the warehouse replaces them.
+
+    Args:
+        packs: ForecastCollection, dictionary of series names and packs, or iterable of (series, pack) or
+               (series, pack, vintage) tuples, as in ForecastCollection.from_packs()
+        root: folder of the warehouse
+    Raises:
+        ValueError: if the vintage of any pack could not be found
+    """
+    _arrow_imports().check()
+
+    if isinstance(packs, ForecastCollection):
+        collection = packs
+        models = pd.DataFrame()
+    else:
+        items = list(packs.items()) if isinstance(packs, dict) else list(packs)
+        collection = ForecastCollection.from_packs(items)
+        models = _model_metadata(items)
+
+    metrics = collection.metrics
+    if metrics["vintage"].isna().any():
+        raise ValueError("The vintage of some packs could not be found, provide it explicitly.")
+
+    if not models.empty:
+        models["vintage"] = pd.to_datetime(models["vintage"])
+
+    model_types = metrics[["series", "vintage", "model", "model_type"]]
+    out_sample = collection.forecasts_table.merge(model_types, on=["series", "vintage", "model"], how="left")
+    out_sample["type"] = "out_sample"
+
+    in_sample = collection.actuals.copy()
+    in_sample["model"] = -1
+    in_sample["step"] = 0
+    in_sample["type"] = "in_sample"
+
+    forecasts = pd.concat([in_sample, out_sample], ignore_index=True)
+    forecasts["model_type"] = forecasts["model_type"].astype(object)
+    forecasts["model"] = forecasts["model"].astype("int32")
+    forecasts["step"] = forecasts["step"].astype("int16")
+
+    _write_table(metrics, os.path.join(root, "metrics"), ["model_type", "model"])
+    _write_table(forecasts, os.path.join(root, "forecasts"), ["type", "model_type", "model", "step"])
+    _write_table(models, os.path.join(root, "models"), ["model_type", "model"])
+
+
+def read_warehouse(
+    root: str,
+    table: str = "forecasts",
+    series: Union[str, List[str]] = None,
+    vintage_from: str = None,
+    vintage_to: str = None,
+    model_type: Union[str, List[str]] = None,
+    type: str = None,
+    model: Union[int, List[int]] = None,
+    date_from: str = None,
+    date_to: str = None,
+    columns: List[str] = None,
+) -> pd.DataFrame:
+    """
+    Reads a table from a warehouse written by write_warehouse(), pushing the filters down to the file scan,
+    so that only the partitions and row groups that match them are read
+
+    Args:
+        root: folder of the warehouse
+        table: 'forecasts', 'metrics' or 'models' (Default is 'forecasts')
+        series: series (or list of series) to be read
+        vintage_from: first vintage to be read (e.g. '2023-01-01')
+        vintage_to: last vintage to be read
+        model_type: model type (or list of model types) to be read
+        type: 'in_sample' or 'out_sample', only for the forecasts table
+        model: model index (or list of indexes) to be read
+        date_from: first forecast date to be read, only for the forecasts table
+        date_to: last forecast date to be read, only for the forecasts table
+        columns: columns to be read, all if None
+    Returns:
+        frame: dataframe with the rows that match all filters
+    Raises:
+        ValueError: if table is not a valid option
+    """
+    _arrow_imports().check()
+
+    if table not in TABLES:
+        raise ValueError(f"table must be one of {', '.join(TABLES)}, provided value was: {table}.")
+
+    path = os.path.join(root, table)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns)
+
+    dataset = ds.dataset(path, format="parquet", partitioning=_partitioning())
+
+    def is_in(field, values, cast=None):
+        values = [values] if isinstance(values, (str, int)) else list(values)
+        if cast is not None:
+            values = [cast(v) for v in values]
+        return ds.field(field).isin(values)
+
+    def to_date(value):
+        return pd.Timestamp(value).date()
+
+    filters = []
+    if series is not None:
+        filters.append(is_in("series", series, str))
+    if vintage_from is not None:
+        filters.append(ds.field("vintage") >= to_date(vintage_from))
+    if vintage_to is not None:
+        filters.append(ds.field("vintage") <= to_date(vintage_to))
+    if model_type is not None:
+        filters.append(is_in("model_type", model_type))
+    if model is not None:
+        filters.append(is_in("model", model, int))
+    if type is not None:
+        filters.append(ds.field("type") == type)
+    if date_from is not None:
+        filters.append(ds.field("data_tidy") >= pd.Timestamp(date_from))
+    if date_to is not None:
+        filters.append(ds.field("data_tidy") <= pd.Timestamp(date_to))
+
+    expression = None
+    for condition in filters:
+        expression = condition if expression is None else expression & condition
+
+    frame = dataset.to_table(filter=expression, columns=columns).to_pandas()
+
+    if "vintage" in frame.columns:
+        frame["vintage"] = pd.to_datetime(frame["vintage"])
+
+    return frame
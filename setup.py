@@ -11,5 +11,6 @@ setuptools.setup(
     description='Using FaaS in Python',
     install_requires=required,
     package_data={'':['*.R', '*.ini']},
-    include_package_data=True
+    include_package_data=True,
+    entry_points={'console_scripts': ['pyfaas4i=pyfaas4i.cli:main']}
 )
@@ -0,0 +1,106 @@
+import base64
+import gzip
+import json
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfaas4i import cli
+from pyfaas4i.faas import PartialSubmissionError, _modellingcalls
+
+
+class _Service:
+    """
+    Projects created by the fake modelling API, failing the creation of the names in fail
+    """
+
+    def __init__(self, fail=()):
+        self.projects = {"old": "project"}
+        self.sent = []
+        self.fail = set(fail)
+
+    def send(self, zipped_body, extension, skip_validation, headers, proxies):
+        name = json.loads(gzip.decompress(base64.b64decode(zipped_body)))["project_id"][0]
+        self.sent.append(name)
+        if name in self.fail:
+            raise ConnectionError(f"{name} was not sent")
+        project_id = f"id-{name}-{len(self.sent)}"
+        self.projects[project_id] = name
+        return [{"status": 200, "info": {}}, {"status": "created", "id": project_id, "api_status_code": 201}]
+
+    def list_projects(self, return_dict=False, **kwargs):
+        return [{"id": project_id, "name": name} for project_id, name in self.projects.items()]
+
+
+@pytest.fixture
+def job(tmp_path):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2015-01-01", periods=60, freq="MS").strftime("%Y-%m-%d")
+    data = {}
+    for i in range(6):
+        path = tmp_path / f"y_{i}.csv"
+        pd.DataFrame({"Data": dates, f"y_{i}": rng.normal(100, 10, 60), "x": rng.normal(50, 5, 60)}).to_csv(path, index=False)
+        data[f"y_{i}"] = str(path)
+    job = {"name": "job", "data": data, "date_variable": "Data", "date_format": "%Y-%m-%d",
+           "model_spec": {"n_steps": 3, "n_windows": 6}, "project_name": "project", "user_model": {},
+           "options": {"version_check": False, "split": True}}
+    sizes = _modellingcalls._estimate_payload_sizes(cli._read_data_list(job), "Data")
+    job["options"]["max_payload_bytes"] = sum(sizes.values()) // 2
+    return job
+
+
+def _runner(job, journal):
+    manifest = {"output_dir": str(journal.path) + ".results", "jobs": [job]}
+    return cli._Runner(manifest, journal, {}, 0.0, None, True, log=lambda message: None)
+
+
+def _submit(service, job, journal):
+    with mock.patch.object(_modellingcalls, "_get_access_token", lambda: "token"), \
+            mock.patch.object(_modellingcalls, "_send_payload", service.send), \
+            mock.patch("pyfaas4i.faas.list_projects", service.list_projects):
+        runner = _runner(job, journal)
+        return runner.submit(job, runner.states.get("job", {}))
+
+
+def test_resume_after_a_partial_submission_sends_only_the_missing_parts(job, tmp_path):
+    journal = cli.Journal(str(tmp_path / "journal.jsonl"))
+    parts = list(cli._plan_parts(job, cli._read_data_list(job)))
+    assert len(parts) > 2
+
+    service = _Service(fail=[parts[1]])
+    with pytest.raises(PartialSubmissionError):
+        _submit(service, job, journal)
+    journal.write("job", "failed", stage="submit", error="PartialSubmissionError")
+    created = journal.states()["job"]["created_parts"]
+    assert sorted(created) == sorted(parts[:1] + parts[2:])
+
+    service.fail.clear()
+    service.sent.clear()
+    result = _submit(service, job, journal)
+
+    assert service.sent == [parts[1]]
+    assert len(result["project_ids"]) == len(parts)
+    assert [service.projects[project_id] for project_id in result["project_ids"]] == parts
+    assert [created[name] for name in parts if name != parts[1]] == \
+        [project_id for project_id, name in zip(result["project_ids"], parts) if name != parts[1]]
+
+
+def test_resume_after_stopping_while_submitting_matches_the_created_projects(job, tmp_path):
+    journal = cli.Journal(str(tmp_path / "journal.jsonl"))
+    parts = list(cli._plan_parts(job, cli._read_data_list(job)))
+    service = _Service()
+    # A project of an earlier run with the same name is not taken as created by this one
+    service.projects["earlier"] = parts[0]
+
+    # The run stops after the service created the first part, before the journal recorded it
+    journal.write("job", "submitting", existing_ids=["old", "earlier"], created_parts={})
+    service.projects["id-first"] = parts[0]
+    assert cli._next_stage(journal.states()["job"], retry_failed=False) == "submit"
+
+    result = _submit(service, job, journal)
+
+    assert service.sent == parts[1:]
+    assert result["project_ids"][0] == "id-first"
+    assert [service.projects[project_id] for project_id in result["project_ids"]] == parts
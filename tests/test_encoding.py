@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfaas4i.faas import _encoding
+from pyfaas4i.faas._encoding import _encode_records
+
+
+def _records(df: pd.DataFrame, decimals: int) -> list:
+    """
+    Rows of a dataframe as sent without compact_numbers, following _build_call
+    """
+    rows = df.round(decimals).fillna("NA").T.to_dict()
+    return json.loads(json.dumps([
+        {column: value for column, value in row.items() if not (isinstance(value, str) and value == "NA")}
+        for row in rows.values()
+    ]))
+
+
+def _assert_same_rows(df: pd.DataFrame, decimals: int = 6):
+    expected = _records(df, decimals)
+    encoded = json.loads(_encode_records(df, decimals))
+    assert len(encoded) == len(expected)
+    for got, want in zip(encoded, expected):
+        assert list(got) == list(want)
+        for column in want:
+            # 100 and 100.0 parse as equal numbers, but large integers must keep every digit
+            assert got[column] == want[column], (column, got[column], want[column])
+            if isinstance(want[column], int):
+                assert isinstance(got[column], int)
+
+
+def _frame(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "data": pd.date_range("2020-01-01", periods=n_rows, freq="MS").astype(str),
+        "y": rng.normal(100, 30, n_rows),
+        "x": rng.integers(-1000, 1000, n_rows),
+    })
+
+
+def test_floats_missing_values_and_negative_zero():
+    df = _frame(8)
+    df.loc[[1, 4], "y"] = np.nan
+    df.loc[2, "y"] = -0.0
+    df.loc[3, "y"] = -0.0000001
+    df.loc[5, "y"] = 123.4000000001
+    df.loc[6, "y"] = 1e10 + 0.5
+    df.loc[7, "y"] = -2.5e-6
+    _assert_same_rows(df)
+    _assert_same_rows(df, decimals=2)
+    _assert_same_rows(df, decimals=0)
+
+
+def test_large_integers_keep_every_digit():
+    # With the date column, the records path keeps the integers of the rows exact too
+    df = pd.DataFrame({
+        "data": ["2020-01-01", "2020-02-01", "2020-03-01", "2020-04-01", "2020-05-01"],
+        "big": np.array([2 ** 53 + 1, -(2 ** 53) - 1, np.iinfo(np.int64).max, np.iinfo(np.int64).min, 0]),
+        "unsigned": np.array([2 ** 64 - 1, 2 ** 63, 2 ** 63 - 1, 2 ** 53 + 1, 0], dtype=np.uint64),
+        "small": np.array([1, -1, 0, 7, -7], dtype=np.int8),
+    })
+    _assert_same_rows(df)
+    assert b'"unsigned":18446744073709551615' in _encode_records(df)
+
+
+def test_bools_and_na_strings():
+    df = _frame(4)
+    df["flag"] = [True, False, True, False]
+    df["label"] = ["a", "NA", None, 'quote " and ç']
+    _assert_same_rows(df)
+
+
+def test_rows_without_values():
+    df = pd.DataFrame({"a": [np.nan, 1.5], "b": ["NA", "x"]})
+    _assert_same_rows(df)
+    assert json.loads(_encode_records(df))[0] == {}
+
+
+@pytest.mark.parametrize("n_rows", [1, 3, 7, 9])
+def test_chunk_boundaries(monkeypatch, n_rows):
+    monkeypatch.setattr(_encoding, "_CHUNK_ROWS", 3)
+    df = _frame(n_rows)
+    df.loc[0, "y"] = np.nan
+    _assert_same_rows(df)
+
+
+def test_empty_dataframe():
+    assert _encode_records(_frame(0)) == b"[]"
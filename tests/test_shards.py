@@ -0,0 +1,84 @@
+import base64
+import copy
+import gzip
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyfaas4i.faas import _modellingcalls
+
+
+def _data_list(n_series: int = 6, n_periods: int = 60) -> dict:
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2015-01-01", periods=n_periods, freq="MS").strftime("%Y-%m-%d")
+    return {
+        f"y_{i}": pd.DataFrame({
+            "Data": dates,
+            f"y_{i}": rng.normal(100, 10, n_periods),
+            **{f"Variável {j}": rng.normal(50, 5, n_periods) for j in range(5)},
+        })
+        for i in range(n_series)
+    }
+
+
+_MODEL_SPEC = {
+    "log": True,
+    "seas.d": True,
+    "n_steps": 12,
+    "n_windows": 6,
+    "n_best": 20,
+    "accuracy_crit": "MAPE",
+    "exclusions": [["Variável 1", "Variável 2"]],
+    "lags": {"all": [1, 2]},
+}
+
+
+def _sent_payloads(data_list: dict, limit: int, user_model: dict, compact_numbers: bool) -> list:
+    """
+    Sizes of the payloads of the parts of run_models with split=True, failing on any PayloadTooLargeError
+    """
+    sizes = []
+
+    def send(zipped_body, extension, skip_validation, headers, proxies):
+        sizes.append(len(gzip.decompress(base64.b64decode(zipped_body))))
+        return [{"status": 200, "info": {}}, {"status": "created", "id": f"id{len(sizes)}", "api_status_code": 201}]
+
+    with mock.patch.object(_modellingcalls, "_get_access_token", lambda: "token"), \
+            mock.patch.object(_modellingcalls, "_send_payload", send):
+        _modellingcalls.run_models(data_list, "Data", "%Y-%m-%d", copy.deepcopy(_MODEL_SPEC), "project",
+                                   copy.deepcopy(user_model), get_project_id=True, version_check=False,
+                                   max_payload_bytes=limit, split=True, compact_numbers=compact_numbers)
+    return sizes
+
+
+@pytest.mark.parametrize("compact_numbers", [False, True])
+@pytest.mark.parametrize("divisor", [2, 3, 4])
+@pytest.mark.parametrize("with_user_model", [False, True])
+def test_split_shards_fit_the_limit_with_the_rest_of_the_body(compact_numbers, divisor, with_user_model):
+    data_list = _data_list()
+    user_model = {"y_0": [{"model": "ARIMA", "vars": ["Variável 3", "Variável 4"], "order": [1, None, 1]}]} \
+        if with_user_model else {}
+    # The records alone of a part fill the limit almost entirely, the rest of the body must be accounted for
+    records = sum(_modellingcalls._estimate_payload_sizes(data_list, "Data", compact_numbers).values())
+    limit = records // divisor
+
+    sizes = _sent_payloads(data_list, limit, user_model, compact_numbers)
+
+    assert len(sizes) > 1
+    assert all(size <= limit for size in sizes)
+
+
+def test_plan_counts_the_body_overhead():
+    data_list = _data_list()
+    sizes = _modellingcalls._estimate_payload_sizes(data_list, "Data")
+    fixed, per_key = _modellingcalls._body_overhead(data_list, "Data", "%Y-%m-%d", _MODEL_SPEC, "project", {})
+
+    # Exactly the estimated records: fits without the body, does not fit with it
+    limit = sum(sizes.values())
+    shards = _modellingcalls._plan_shards(data_list, "Data", "%Y-%m-%d", _MODEL_SPEC, "project", {},
+                                          limit, None, True)
+    assert fixed > 0 and all(size > 0 for size in per_key.values())
+    assert len(shards) == 2
+    assert [key for shard in shards for key in shard] == list(data_list)